@@ -0,0 +1,51 @@
+"""Helpers shared by the benchmarks: a synthetic embedding corpus and latency summaries."""
+
+import numpy as np
+
+
+class SyntheticCorpus:
+    """Seeded unit vectors drawn around random cluster centres, generated in chunks."""
+
+    def __init__(self, size, dim=384, clusters=None, spread=0.35, seed=0):
+        self.size = size
+        self.dim = dim
+        self.spread = spread
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self.centres = self._unit(
+            rng.normal(size=(clusters or max(16, size // 1000), dim))
+        )
+
+    def chunks(self, chunk_size=65536):
+        """Yield (first row id, vectors) in chunks so 5M-row corpora never need a second copy."""
+        rng = np.random.default_rng(self.seed + 1)
+        for start in range(0, self.size, chunk_size):
+            count = min(chunk_size, self.size - start)
+            yield start, self._sample(rng, count)
+
+    def queries(self, count):
+        # Fresh draws from the same clusters, not copies of indexed rows
+        return self._sample(np.random.default_rng(self.seed + 2), count)
+
+    def _sample(self, rng, count):
+        centres = self.centres[rng.integers(len(self.centres), size=count)]
+        noise = rng.normal(scale=self.spread / np.sqrt(self.dim), size=centres.shape)
+        return self._unit(centres + noise)
+
+    @staticmethod
+    def _unit(vectors):
+        vectors = vectors.astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return {}
+    ms = np.asarray(seconds) * 1000
+    return {
+        "count": len(seconds),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
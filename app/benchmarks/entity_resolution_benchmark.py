@@ -0,0 +1,437 @@
+"""
+Entity resolution benchmark for PresidioEngine on synthetic PII sessions.
+
+For every session size a registry is preloaded with that many ground-truth
+entities, then a stream of detections (alias variants, typos and brand new
+entities) is resolved through add_entity. Reports per-detection latency,
+anonymise/de-anonymise throughput, registry memory and resolution accuracy
+against the ground-truth clusters. The run exits with status 1 when any
+session misses an accuracy threshold, so changes made for speed cannot
+silently break merging. The thresholds default to floors calibrated per
+encoder (ACCURACY_FLOORS, overridden by the --min-* options); with
+--baseline each session is instead compared with the same session size in
+a results file written earlier with --output.
+
+Run from the repository root:
+
+    python -m app.benchmarks.entity_resolution_benchmark --sizes 100,1000,10000
+    python -m app.benchmarks.entity_resolution_benchmark --encoder hashing  # no model download
+    python -m app.benchmarks.entity_resolution_benchmark --baseline before.json
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+
+from app.benchmarks.common import latency_summary
+from app.components.presidio.presidio_engine import PresidioEngine
+
+FIRST_NAMES = """
+Alice Amara Ben Carlos Chen Dana Elena Farah Gustav Hana Ivan Jia Kofi Lena
+Marco Nadia Omar Priya Quinn Rosa Sven Tariq Uma Victor Wei Ximena Yusuf Zara
+""".split()
+SYLLABLES = """
+ka vo rin del mas que tor bel an shi lo mur pen dra quin zel far ost lem nar
+bri cas dun eth gor hal isk jor kel mon nev orr pla rus sef tam ulv ven wyn
+""".split()
+ORG_SUFFIXES = ["Systems", "Holdings", "Labs", "Logistics", "Partners", "Capital"]
+# Accuracy floors per encoder. Trigram hashing cannot tell a new name from a
+# known one with shared syllables, so it merges most new entities: measured
+# with seed 0 at 100/1000/10000 entities it gave new entity rates of
+# 0.19/0.02/0.00 and pairwise precision of 0.69/0.77/0.81. Its floors only
+# catch breakage; use --baseline to catch regressions.
+ACCURACY_FLOORS = {
+    "hashing": {
+        "variant_resolution_rate": 0.8,
+        "new_entity_rate": 0.0,
+        "pairwise precision": 0.6,
+        "pairwise recall": 0.8,
+    },
+    "model": {
+        "variant_resolution_rate": 0.85,
+        "new_entity_rate": 0.8,
+        "pairwise precision": 0.9,
+        "pairwise recall": 0.85,
+    },
+}
+SENTENCES = [
+    "{0} asked {1} to review the contract before Friday.",
+    "Please forward the invoice from {0} to {1}.",
+    "{0} and {1} both attended the quarterly planning meeting.",
+    "The account owned by {0} was transferred to {1} last month.",
+]
+
+
+@dataclass
+class Entity:
+    cluster: int
+    entity_type: str
+    canonical: str
+    variants: List[str]
+
+
+@dataclass
+class Detection:
+    cluster: int
+    entity_type: str
+    text: str
+    is_new: bool
+
+
+class HashingEncoder:
+    """Character-trigram hashing embedder, for runs without a sentence-transformer model."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        padded = f"  {text.lower()} "
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i : i + 3].encode("utf-8")) % self.dim] += 1.0
+        return vector
+
+
+class EntityCorpus:
+    """Seeded PERSON / ORGANIZATION / EMAIL_ADDRESS entities with realistic variants."""
+
+    def __init__(self, size, seed=0):
+        self.rng = random.Random(seed)
+        self._used = set()
+        self.entities = [self._entity(cluster) for cluster in range(size)]
+        self._next_cluster = size
+
+    def new_entity(self):
+        entity = self._entity(self._next_cluster)
+        self._next_cluster += 1
+        return entity
+
+    def detections(self, count, new_ratio):
+        """Detections of known entities (as variants) mixed with new entities."""
+        detections = []
+        for _ in range(count):
+            if self.rng.random() < new_ratio:
+                entity = self.new_entity()
+                detections.append(
+                    Detection(
+                        entity.cluster, entity.entity_type, entity.canonical, True
+                    )
+                )
+            else:
+                entity = self.rng.choice(self.entities)
+                text = self.rng.choice(entity.variants)
+                detections.append(
+                    Detection(entity.cluster, entity.entity_type, text, False)
+                )
+        return detections
+
+    def documents(self, count, detections):
+        texts = [d.text for d in detections] or [e.canonical for e in self.entities]
+        return [
+            self.rng.choice(SENTENCES).format(
+                self.rng.choice(texts), self.rng.choice(texts)
+            )
+            for _ in range(count)
+        ]
+
+    def _entity(self, cluster):
+        entity_type = ("PERSON", "ORGANIZATION", "EMAIL_ADDRESS")[cluster % 3]
+        word = self._unique_word()
+        if entity_type == "PERSON":
+            first = self.rng.choice(FIRST_NAMES)
+            canonical = f"{first} {word}"
+            variants = [
+                word,
+                f"{first[0]}. {word}",
+                self._typo(canonical),
+                canonical.lower(),
+            ]
+        elif entity_type == "ORGANIZATION":
+            canonical = f"{word} {self.rng.choice(ORG_SUFFIXES)}"
+            variants = [word, self._typo(canonical), canonical.upper()]
+        else:
+            canonical = (
+                f"{self.rng.choice(FIRST_NAMES).lower()}.{word.lower()}@example.com"
+            )
+            variants = [canonical.upper(), canonical.capitalize()]
+        return Entity(cluster, entity_type, canonical, variants)
+
+    def _unique_word(self):
+        while True:
+            word = "".join(
+                self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(2, 3))
+            ).capitalize()
+            if word not in self._used:
+                self._used.add(word)
+                return word
+
+    def _typo(self, text):
+        chars = list(text)
+        # Never touch the first character of the string
+        i = self.rng.randrange(1, len(chars) - 1)
+        op = self.rng.choice(("swap", "drop", "replace", "insert"))
+        if op == "swap":
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+        elif op == "drop":
+            del chars[i]
+        elif op == "replace":
+            chars[i] = self.rng.choice("aeiounrst")
+        else:
+            chars.insert(i, self.rng.choice("aeiounrst"))
+        return "".join(chars)
+
+
+def preload(engine, entities, encoder):
+    """Load ground-truth entities directly; returns cluster -> key and bytes allocated."""
+    embeddings = [encoder.encode(entity.canonical) for entity in entities]
+    keys = {}
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for entity, embedding in zip(entities, embeddings):
+        for key in engine.key_generator.candidates(
+            entity.entity_type, entity.canonical
+        ):
+            record = engine.registry.create(key, entity.entity_type, entity.canonical)
+            if record.aliases[0] == entity.canonical:
+                break
+        engine.embeddings.set(key, entity.canonical, embedding)
+        keys[entity.cluster] = key
+    allocated = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return keys, allocated
+
+
+def pairwise_scores(truth, predicted):
+    """Pairwise precision/recall/F1 of predicted clusters against true clusters."""
+
+    def pairs(counts):
+        return sum(n * (n - 1) // 2 for n in counts.values())
+
+    true_pairs = pairs(Counter(truth))
+    predicted_pairs = pairs(Counter(predicted))
+    shared_pairs = pairs(Counter(zip(truth, predicted)))
+    precision = shared_pairs / predicted_pairs if predicted_pairs else 1.0
+    recall = shared_pairs / true_pairs if true_pairs else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def run_session(size, args, encoder):
+    corpus = EntityCorpus(size, seed=args.seed)
+    # Detection is not measured, so the AnalyzerEngine (spaCy) is never built
+    engine = PresidioEngine(encoder)
+    cluster_keys, registry_bytes = preload(engine, corpus.entities, encoder)
+    detections = corpus.detections(args.detections, args.new_ratio)
+
+    latencies: Dict[bool, List[float]] = {True: [], False: []}
+    outcomes = Counter()
+    truth, predicted = list(cluster_keys), list(cluster_keys.values())
+    known_keys = set(predicted)
+    for detection in detections:
+        start = time.perf_counter()
+        key = engine.add_entity(detection.text, detection.entity_type)
+        latencies[detection.is_new].append(time.perf_counter() - start)
+
+        if detection.is_new:
+            # A new entity must get its own key, not be merged into a known one
+            outcomes["new_merged" if key in known_keys else "new_created"] += 1
+            cluster_keys[detection.cluster] = key
+        else:
+            resolved = key == cluster_keys[detection.cluster]
+            outcomes["variant_resolved" if resolved else "variant_missed"] += 1
+        truth.append(detection.cluster)
+        predicted.append(key)
+        known_keys.add(key)
+
+    documents = corpus.documents(args.documents, detections)
+    start = time.perf_counter()
+    engine.anonymise_text(documents[0])
+    index_build = time.perf_counter() - start
+    start = time.perf_counter()
+    anonymised = [engine.anonymise_text(document) for document in documents]
+    anonymise_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for document in anonymised:
+        engine.de_anonymise_text(document)
+    de_anonymise_seconds = time.perf_counter() - start
+    megabytes = sum(len(d) for d in documents) / 1e6
+
+    variants = outcomes["variant_resolved"] + outcomes["variant_missed"]
+    new = outcomes["new_created"] + outcomes["new_merged"]
+    return {
+        "entities": size,
+        "detections": len(detections),
+        "add_entity_variant": latency_summary(latencies[False]),
+        "add_entity_new": latency_summary(latencies[True]),
+        "anonymise_index_build_ms": index_build * 1000,
+        "anonymise_docs_per_s": len(documents) / anonymise_seconds,
+        "anonymise_mb_per_s": megabytes / anonymise_seconds,
+        "de_anonymise_docs_per_s": len(documents) / de_anonymise_seconds,
+        "de_anonymise_mb_per_s": megabytes / de_anonymise_seconds,
+        "registry_bytes": registry_bytes,
+        "registry_bytes_per_entity": registry_bytes / size if size else 0,
+        "embedding_block_bytes": engine.embeddings.nbytes,
+        "accuracy": {
+            "variant_resolution_rate": (
+                outcomes["variant_resolved"] / variants if variants else 1.0
+            ),
+            "new_entity_rate": outcomes["new_created"] / new if new else 1.0,
+            "pairwise": pairwise_scores(truth, predicted),
+        },
+    }
+
+
+def accuracy_metrics(result):
+    accuracy = result["accuracy"]
+    return {
+        "variant_resolution_rate": accuracy["variant_resolution_rate"],
+        "new_entity_rate": accuracy["new_entity_rate"],
+        "pairwise precision": accuracy["pairwise"]["precision"],
+        "pairwise recall": accuracy["pairwise"]["recall"],
+    }
+
+
+def accuracy_failures(result, minimums):
+    """Accuracy thresholds ({metric: minimum}) a session missed, as readable messages."""
+    return [
+        f"{result['entities']} entities: {name} {value:.3f} < {minimums[name]:.3f}"
+        for name, value in accuracy_metrics(result).items()
+        if value < minimums[name]
+    ]
+
+
+def baseline_minimums(baseline, size, tolerance):
+    """Thresholds for a session: its baseline metrics less tolerance, or None if absent."""
+    for session in baseline["sessions"]:
+        if session["entities"] == size:
+            return {
+                name: value - tolerance
+                for name, value in accuracy_metrics(session).items()
+            }
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", default="100,1000,10000", help="comma-separated entity counts"
+    )
+    parser.add_argument(
+        "--detections", type=int, default=500, help="timed detections per session"
+    )
+    parser.add_argument(
+        "--new-ratio",
+        type=float,
+        default=0.2,
+        help="share of detections that are new entities",
+    )
+    parser.add_argument(
+        "--documents",
+        type=int,
+        default=100,
+        help="documents for (de)anonymise throughput",
+    )
+    parser.add_argument(
+        "--encoder", choices=("mini-lm", "distilbert", "hashing"), default="mini-lm"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument(
+        "--min-variant-resolution",
+        type=float,
+        help="fail below this share of variants resolved to their entity (default: encoder floor)",
+    )
+    parser.add_argument(
+        "--min-new-entity-rate",
+        type=float,
+        help="fail below this share of new entities given their own key (default: encoder floor)",
+    )
+    parser.add_argument(
+        "--min-pairwise-precision",
+        type=float,
+        help="fail below this pairwise precision (over-merging) (default: encoder floor)",
+    )
+    parser.add_argument(
+        "--min-pairwise-recall",
+        type=float,
+        help="fail below this pairwise recall (under-merging) (default: encoder floor)",
+    )
+    parser.add_argument(
+        "--baseline",
+        help="results JSON (from --output) to compare accuracy with instead of floors",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.02,
+        help="accuracy drop below the baseline that still passes",
+    )
+    args = parser.parse_args()
+
+    floors = dict(ACCURACY_FLOORS["hashing" if args.encoder == "hashing" else "model"])
+    overrides = {
+        "variant_resolution_rate": args.min_variant_resolution,
+        "new_entity_rate": args.min_new_entity_rate,
+        "pairwise precision": args.min_pairwise_precision,
+        "pairwise recall": args.min_pairwise_recall,
+    }
+    floors.update(
+        {name: value for name, value in overrides.items() if value is not None}
+    )
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        run = {"encoder": args.encoder, "seed": args.seed, "new_ratio": args.new_ratio}
+        if any(baseline.get(option) != value for option, value in run.items()):
+            parser.error(
+                f"--baseline was run with {[baseline.get(option) for option in run]} "
+                f"for {list(run)}; rerun it with the same options"
+            )
+
+    if args.encoder == "hashing":
+        encoder = HashingEncoder()
+    else:
+        from app.components.embedding_model.embedding_model import EmbeddingModel
+
+        encoder = EmbeddingModel(backend=args.encoder)
+
+    results = []
+    failures = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = run_session(size, args, encoder)
+        print(json.dumps(result, indent=2))
+        results.append(result)
+        minimums = baseline and baseline_minimums(baseline, size, args.tolerance)
+        failures.extend(accuracy_failures(result, minimums or floors))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "encoder": args.encoder,
+                    "seed": args.seed,
+                    "new_ratio": args.new_ratio,
+                    "sessions": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if failures:
+        for failure in failures:
+            print(f"Accuracy check failed: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Retrieval benchmark for the RAG vector index backends on synthetic corpora.
+
+For every corpus size and backend an index is built from clustered random
+unit vectors (chunk embeddings are far from uniform, so clusters make the
+approximate indexes work for their recall). Reports insert throughput,
+single-query latency, batched query throughput, resident memory growth
+while building (approximate: memory freed by an earlier index may be
+reused) and recall@k against exact brute force. For HNSW and IVF-PQ the query-time
+knobs (ef_search, nprobe) are swept on the same built index, so their
+recall/latency trade-off can be read off one run.
+
+Run from the repository root:
+
+    python -m app.benchmarks.retrieval_benchmark --sizes 10000,100000,1000000
+    python -m app.benchmarks.retrieval_benchmark --backends numpy,hnsw --ef-search 16,64,256
+"""
+
+import argparse
+import gc
+import json
+import os
+import time
+
+import numpy as np
+
+from app.benchmarks.common import SyntheticCorpus, latency_summary
+from app.components.rag.vector_index import create_vector_index
+
+
+def exact_top_k(corpus, queries, k):
+    """Brute-force top-k row ids per query, streamed over the corpus chunks."""
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start, vectors in corpus.chunks():
+        scores = np.concatenate([best_scores, queries @ vectors.T], axis=1)
+        chunk_ids = np.broadcast_to(
+            start + np.arange(len(vectors)), (len(queries), len(vectors))
+        )
+        ids = np.concatenate([best_ids, chunk_ids], axis=1)
+        # Order within the top-k does not matter for recall
+        keep = np.argpartition(-scores, min(k, scores.shape[1]) - 1, axis=1)[:, :k]
+        best_ids = np.take_along_axis(ids, keep, axis=1)
+        best_scores = np.take_along_axis(scores, keep, axis=1)
+    return best_ids
+
+
+def recall_at_k(results, truth):
+    hits = sum(
+        len({doc_id for doc_id, _ in result} & set(expected.tolist()))
+        for result, expected in zip(results, truth)
+    )
+    return hits / truth.size if truth.size else 1.0
+
+
+def resident_bytes():
+    # Current RSS on Linux; None where /proc is not available
+    try:
+        with open("/proc/self/statm", encoding="utf-8") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def measure_queries(index, queries, truth, k, batch_size):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, k))
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        index.search_batch(queries[i : i + batch_size], k)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "query": latency_summary(latencies),
+        "batch_queries_per_s": len(queries) / batch_seconds,
+        f"recall@{k}": recall_at_k(results, truth),
+    }
+
+
+def run_backend(backend, corpus, queries, truth, args):
+    gc.collect()
+    rss_before = resident_bytes()
+    # "numpy-int8" is the numpy store with int8 codes and float rescoring
+    index = create_vector_index(
+        backend.replace("-int8", ""),
+        quantize=backend.endswith("-int8"),
+        rescore_factor=args.rescore_factor,
+        ef_search=args.ef_search[0],
+        nlist=args.nlist,
+        nprobe=args.nprobe[0],
+    )
+    start = time.perf_counter()
+    for first, vectors in corpus.chunks():
+        for offset, vector in enumerate(vectors):
+            index.add_embedding(vector, first + offset)
+    insert_seconds = time.perf_counter() - start
+    rss_after = resident_bytes()
+
+    result = {
+        "backend": backend,
+        "vectors": corpus.size,
+        "dim": corpus.dim,
+        "insert_vectors_per_s": corpus.size / insert_seconds,
+        "rss_delta_bytes": rss_after - rss_before if rss_before is not None else None,
+        "raw_vector_bytes": corpus.size * corpus.dim * 4,
+    }
+    # Query-time parameters are swept on the same index
+    if backend == "hnsw":
+        sweep = [("ef_search", value) for value in args.ef_search]
+    elif backend == "ivfpq":
+        sweep = [("nprobe", value) for value in args.nprobe]
+    else:
+        sweep = [(None, None)]
+    result["runs"] = []
+    for name, value in sweep:
+        if name:
+            setattr(index, name, value)
+        run = measure_queries(index, queries, truth, args.k, args.batch_size)
+        if name:
+            run[name] = value
+        result["runs"].append(run)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes", default="10000,100000,1000000", help="comma-separated corpus sizes"
+    )
+    parser.add_argument(
+        "--backends",
+        default="numpy,flat,hnsw,ivfpq",
+        help="comma-separated vector index backends (also numpy-int8)",
+    )
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument(
+        "--queries", type=int, default=200, help="timed queries per index"
+    )
+    parser.add_argument("-k", type=int, default=10, help="results per query")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument(
+        "--ef-search", default="64", help="comma-separated HNSW ef_search values"
+    )
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument(
+        "--rescore-factor", type=int, default=4, help="numpy-int8 rescored candidates"
+    )
+    parser.add_argument(
+        "--nprobe", default="16", help="comma-separated IVF-PQ nprobe values"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    args.ef_search = [int(v) for v in args.ef_search.split(",")]
+    args.nprobe = [int(v) for v in args.nprobe.split(",")]
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        corpus = SyntheticCorpus(size, dim=args.dim, seed=args.seed)
+        queries = corpus.queries(args.queries)
+        truth = exact_top_k(corpus, queries, args.k)
+        for backend in args.backends.split(","):
+            result = run_backend(backend, corpus, queries, truth, args)
+            print(json.dumps(result, indent=2))
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"seed": args.seed, "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
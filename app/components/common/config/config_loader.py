@@ -26,6 +26,37 @@ class AppConfig:
     redis_host: str
     redis_port: int
 
+    # Entity Registry Configuration
+    entity_registry_backend: str
+    entity_registry_ttl: Optional[int]
+    placeholder_secret: Optional[str]
+    placeholder_format: str
+    analysis_mode: str
+    session_cache_size: int
+
+    # Retrieval Configuration
+    retrieval_top_k: int
+    retrieval_min_score: Optional[float]
+    vector_index_backend: str
+    hnsw_ef_search: int
+    ivf_nlist: int
+    ivf_nprobe: int
+    vector_store_path: Optional[str]
+    vector_ttl: Optional[int]
+    vector_compaction_interval: Optional[int]
+    vector_search_shards: Optional[int]
+    vector_quantize: bool
+    vector_rescore_factor: int
+    retrieval_mode: str
+    hybrid_alpha: float
+    hybrid_candidates: int
+    ingest_batch_size: int
+    ingest_queue_size: int
+    ingest_workers: int
+    ingest_wait_timeout: float
+    query_cache_size: int
+    context_token_budget: int
+
     # Security
     secret_key: str
 
@@ -51,6 +82,66 @@ class ConfigLoader:
             # Redis Configuration
             redis_host=os.getenv("REDIS_HOST", "redis"),
             redis_port=int(os.getenv("REDIS_PORT", "6379")),
+            # Entity Registry Configuration ("memory" or "redis")
+            entity_registry_backend=os.getenv("ENTITY_REGISTRY_BACKEND", "memory"),
+            entity_registry_ttl=(
+                int(os.getenv("ENTITY_REGISTRY_TTL"))
+                if os.getenv("ENTITY_REGISTRY_TTL")
+                else None
+            ),
+            # Shared by all workers so they derive identical placeholder keys
+            placeholder_secret=os.getenv("PLACEHOLDER_SECRET"),
+            # "verbose" (PERSON_3fa9) or "compact" (P_123, fewer LLM tokens)
+            placeholder_format=os.getenv("PLACEHOLDER_FORMAT", "verbose"),
+            # "full" (NER on every request) or "tiered" (pattern pre-filter first)
+            analysis_mode=os.getenv("ANALYSIS_MODE", "full"),
+            # Sessions whose anonymisation engine (and registry cache) is kept per worker
+            session_cache_size=int(os.getenv("SESSION_CACHE_SIZE", "1024")),
+            # Retrieval Configuration
+            retrieval_top_k=int(os.getenv("RETRIEVAL_TOP_K", "2")),
+            retrieval_min_score=(
+                float(os.getenv("RETRIEVAL_MIN_SCORE"))
+                if os.getenv("RETRIEVAL_MIN_SCORE")
+                else None
+            ),
+            # "numpy" (exact), or FAISS "flat" (exact), "hnsw" or "ivfpq" (approximate)
+            vector_index_backend=os.getenv("VECTOR_INDEX_BACKEND", "numpy"),
+            hnsw_ef_search=int(os.getenv("HNSW_EF_SEARCH", "64")),
+            ivf_nlist=int(os.getenv("IVF_NLIST", "256")),
+            ivf_nprobe=int(os.getenv("IVF_NPROBE", "16")),
+            # Directory for the persistent (memory-mapped) numpy store; unset = in memory
+            vector_store_path=os.getenv("VECTOR_STORE_PATH") or None,
+            # Seconds before stored chunks expire, and between background compactions
+            vector_ttl=int(os.getenv("VECTOR_TTL")) if os.getenv("VECTOR_TTL") else None,
+            vector_compaction_interval=(
+                int(os.getenv("VECTOR_COMPACTION_INTERVAL"))
+                if os.getenv("VECTOR_COMPACTION_INTERVAL")
+                else None
+            ),
+            # Threads a numpy search is split across (unset = one per core, 1 = no sharding)
+            vector_search_shards=(
+                int(os.getenv("VECTOR_SEARCH_SHARDS"))
+                if os.getenv("VECTOR_SEARCH_SHARDS")
+                else None
+            ),
+            # int8 codes for a coarse search, rescoring top_k * factor on float rows
+            vector_quantize=os.getenv("VECTOR_QUANTIZE", "false").lower() == "true",
+            vector_rescore_factor=int(os.getenv("VECTOR_RESCORE_FACTOR", "4")),
+            # "vector" or "hybrid" (BM25 shortlist rescored by vector, scores fused)
+            retrieval_mode=os.getenv("RETRIEVAL_MODE", "vector"),
+            hybrid_alpha=float(os.getenv("HYBRID_ALPHA", "0.5")),
+            hybrid_candidates=int(os.getenv("HYBRID_CANDIDATES", "50")),
+            # Chunks per embedding call, and batches buffered between ingestion stages
+            ingest_batch_size=int(os.getenv("INGEST_BATCH_SIZE", "32")),
+            ingest_queue_size=int(os.getenv("INGEST_QUEUE_SIZE", "4")),
+            # Background ingestion threads (0 = ingest in the request thread)
+            ingest_workers=int(os.getenv("INGEST_WORKERS", "1")),
+            # Longest a query waits in seconds for the upload it must see
+            ingest_wait_timeout=float(os.getenv("INGEST_WAIT_TIMEOUT", "30")),
+            # Cached query embeddings and retrieval results (0 = no caching)
+            query_cache_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            # Tokens of retrieved context sent to the LLM per query
+            context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000")),
             # Security
             secret_key=os.getenv("SECRET_KEY", "dev-secret-key"),
         )
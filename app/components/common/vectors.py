@@ -0,0 +1,30 @@
+"""Helpers for float32 embedding blocks shared by the entity and chunk indexes."""
+
+import numpy as np
+
+
+def normalise(embedding) -> np.ndarray:
+    """Flat float32 copy of embedding scaled to unit L2 norm (zero vectors unchanged)."""
+    # Accept torch tensors (sentence-transformers) as well as array-likes
+    if hasattr(embedding, "detach"):
+        embedding = embedding.detach().cpu().numpy()
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def grown_capacity(capacity: int, size: int, minimum: int = 0) -> int:
+    """
+    Rows to allocate so that size rows fit, at least doubling capacity.
+
+    Doubling makes growth amortised: appending n rows one at a time copies
+    O(n) rows in total.
+    """
+    return max(size, minimum, 2 * capacity)
+
+
+def resized(array: np.ndarray, rows: int, used: int) -> np.ndarray:
+    """Zero-filled copy of array with rows rows, keeping its first used rows."""
+    grown = np.zeros((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:used] = array[:used]
+    return grown
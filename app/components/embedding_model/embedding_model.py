@@ -20,16 +20,31 @@ class EmbeddingModel:
         if self.backend == "mini-lm":
             return self.model.encode(text, convert_to_tensor=True)
         elif self.backend == "distilbert":
-            inputs = self.tokenizer(
-                text, return_tensors="pt", truncation=True, padding=True
-            )
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-            # Mean pooling over token embeddings
-            last_hidden = outputs.last_hidden_state  # [1, seq_len, hidden_dim]
-            mask = inputs["attention_mask"].unsqueeze(-1)
-            pooled = (last_hidden * mask).sum(1) / mask.sum(1)
-            return pooled.squeeze().cpu()  # return 1D tensor
+            return self._mean_pool(text).squeeze().cpu()  # return 1D tensor
+
+    # Embed many texts in batched forward passes; returns a [len(texts), dim] float32 array
+    def encode_batch(self, texts, batch_size=32):
+        if self.backend == "mini-lm":
+            return self.model.encode(
+                texts, batch_size=batch_size, convert_to_numpy=True
+            ).astype(np.float32)
+        return np.concatenate(
+            [
+                self._mean_pool(texts[i : i + batch_size]).cpu().numpy()
+                for i in range(0, len(texts), batch_size)
+            ]
+        ).astype(np.float32)
+
+    def _mean_pool(self, text):
+        inputs = self.tokenizer(
+            text, return_tensors="pt", truncation=True, padding=True
+        )
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+        # Mean pooling over token embeddings
+        last_hidden = outputs.last_hidden_state  # [batch, seq_len, hidden_dim]
+        mask = inputs["attention_mask"].unsqueeze(-1)
+        return (last_hidden * mask).sum(1) / mask.sum(1)
 
     # Embed list of documents. Compatbility function for langchain's InMemoryVectorStore
     def embed_documents(self, texts):
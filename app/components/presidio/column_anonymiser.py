@@ -0,0 +1,172 @@
+"""Column-aware anonymisation for tabular (CSV) and JSON data."""
+
+from collections import Counter
+
+# Column classifications
+PII_COLUMN = "pii"  # every value is one entity of a single type
+FREE_TEXT_COLUMN = "free_text"  # values contain entities mixed with other text
+PLAIN_COLUMN = "plain"  # no entities found in the sample
+
+
+class ColumnAnonymiser:
+    """
+    Anonymise structured data one column at a time instead of one cell at a time.
+
+    A sample of each column (or JSON key path) is run through the analyzer once
+    to decide its PII type. Values of a PII column are then mapped to keys in
+    bulk, each distinct value resolved once, without running NER on every cell.
+    Every other value is analysed as free text, once per distinct value; in a
+    plain column only the values the sample did not cover. Nothing is passed
+    through without analysis: CSV headers, cells past the header width, JSON
+    keys and numeric JSON leaves are anonymised as free text too.
+    """
+
+    def __init__(self, presidio_engine, sample_size=20, min_coverage=0.6):
+        self.presidio_engine = presidio_engine
+        self.sample_size = sample_size
+        # Fraction of sampled values that must be a whole-value entity of one type
+        self.min_coverage = min_coverage
+
+    def anonymise_table(self, header, rows, max_rows=None):
+        """
+        Anonymise CSV rows (lists of cells) and their header; returns (header, rows).
+
+        Only the first max_rows rows are anonymised and returned, so a caller
+        rendering a preview only pays for the rows it shows.
+        """
+        if max_rows is not None:
+            rows = rows[:max_rows]
+        width = len(header)
+        columns = [[row[i] if i < len(row) else "" for row in rows] for i in range(width)]
+        anonymised_columns = [self.anonymise_column(column) for column in columns]
+        anonymised_rows = [
+            [anonymised_columns[i][r] for i in range(width)]
+            # Cells of ragged rows have no column to classify them by
+            + self.anonymise_free_text(row[width:])
+            for r, row in enumerate(rows)
+        ]
+        return self.anonymise_free_text(header), anonymised_rows
+
+    def anonymise_json(self, data):
+        """Anonymise the keys and scalar leaves of a JSON document grouped by key path."""
+        columns = {}
+        keys = {}
+        self._collect_leaves(data, "$", columns, keys)
+        replacements = {}
+        for path, values in columns.items():
+            replacements[path] = iter(self.anonymise_column(values))
+        renamed = dict(zip(keys, self.anonymise_free_text(list(keys))))
+        return self._replace_leaves(data, "$", replacements, renamed)
+
+    def anonymise_column(self, values):
+        """Classify a column from a sample and anonymise all of its values."""
+        kind, entity_type, sample = self._classify(values)
+
+        if kind == PII_COLUMN:
+            # Resolve each distinct value to its key exactly once
+            engine = self.presidio_engine
+            keys = {}
+            for value in values:
+                stripped = value.strip()
+                if stripped and stripped not in keys:
+                    keys[stripped] = engine.add_entity(stripped, entity_type)
+            return [keys[value.strip()] if value.strip() else value for value in values]
+
+        # The sample of a plain column was analysed and held no entities
+        return self.anonymise_free_text(
+            values, analysed=set(sample) if kind == PLAIN_COLUMN else ()
+        )
+
+    def anonymise_free_text(self, values, analysed=()):
+        """
+        Analyse each distinct value (except those in analysed) and anonymise all values.
+
+        Every value is analysed before any is anonymised, so an entity found in
+        one value is also replaced where it appears in the others.
+        """
+        engine = self.presidio_engine
+        distinct = list(dict.fromkeys(values))
+        for value in distinct:
+            if value.strip() and value.strip() not in analysed:
+                engine.analyze_text(value)
+        anonymised = {
+            value: engine.anonymise_text(value) if value.strip() else value
+            for value in distinct
+        }
+        return [anonymised[value] for value in values]
+
+    def classify(self, values):
+        """Return (column kind, entity type) from a sample of the column's values."""
+        kind, entity_type, _ = self._classify(values)
+        return kind, entity_type
+
+    def _classify(self, values):
+        # Also returns the sample, whose values have been analysed
+        sample = self._sample(values)
+        if not sample:
+            return PLAIN_COLUMN, None, sample
+
+        whole_value_types = Counter()
+        found_entities = False
+        for value in sample:
+            results = self.presidio_engine.analyze(value)
+            if not results:
+                continue
+            found_entities = True
+            best = max(results, key=lambda r: (r.end - r.start, r.score))
+            if best.start == 0 and best.end >= len(value):
+                whole_value_types[best.entity_type] += 1
+
+        if whole_value_types:
+            entity_type, count = whole_value_types.most_common(1)[0]
+            if count >= self.min_coverage * len(sample):
+                return PII_COLUMN, entity_type, sample
+        if found_entities:
+            return FREE_TEXT_COLUMN, None, sample
+        return PLAIN_COLUMN, None, sample
+
+    def _sample(self, values):
+        # Evenly spaced distinct non-empty values across the whole column
+        distinct = list(dict.fromkeys(v.strip() for v in values if v.strip()))
+        if len(distinct) <= self.sample_size:
+            return distinct
+        step = len(distinct) / self.sample_size
+        return [distinct[int(i * step)] for i in range(self.sample_size)]
+
+    @staticmethod
+    def _is_number(node):
+        # Numeric leaves can hold PII too (phone or account numbers)
+        return isinstance(node, (int, float)) and not isinstance(node, bool)
+
+    def _collect_leaves(self, node, path, columns, keys):
+        if isinstance(node, dict):
+            for key, child in node.items():
+                keys[key] = None
+                self._collect_leaves(child, f"{path}.{key}", columns, keys)
+        elif isinstance(node, list):
+            for child in node:
+                self._collect_leaves(child, f"{path}[]", columns, keys)
+        elif isinstance(node, str) or self._is_number(node):
+            columns.setdefault(path, []).append(str(node))
+
+    def _replace_leaves(self, node, path, replacements, renamed):
+        # Leaves are visited in the same order as _collect_leaves
+        if isinstance(node, dict):
+            return {
+                renamed[key]: self._replace_leaves(
+                    child, f"{path}.{key}", replacements, renamed
+                )
+                for key, child in node.items()
+            }
+        if isinstance(node, list):
+            return [
+                self._replace_leaves(child, f"{path}[]", replacements, renamed)
+                for child in node
+            ]
+        if isinstance(node, str):
+            return next(replacements[path])
+        if self._is_number(node):
+            # Numbers stay numbers unless something in them was replaced
+            value = next(replacements[path])
+            return node if value == str(node) else value
+        return node
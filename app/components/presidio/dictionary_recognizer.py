@@ -0,0 +1,208 @@
+"""Deny-list recognizer for large term dictionaries, matched with Aho-Corasick."""
+
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+from presidio_analyzer import EntityRecognizer, RecognizerResult
+
+try:
+    import ahocorasick  # pyahocorasick
+
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+class DictionaryRecognizer(EntityRecognizer):
+    """
+    Recognise terms from (possibly very large) deny-lists in linear time.
+
+    All terms are compiled into one Aho-Corasick automaton instead of a regex
+    alternation. The automaton can be persisted to cache_path and is rebuilt
+    only when the term lists change. The cache holds no pickled objects
+    (values are JSON) and is only loaded when its content hash matches the
+    one recorded next to it.
+    """
+
+    def __init__(
+        self,
+        terms: Dict[str, Iterable[str]],
+        cache_path: Optional[str] = None,
+        case_sensitive: bool = False,
+        score: float = 1.0,
+        name: str = "DictionaryRecognizer",
+    ):
+        if not AHOCORASICK_AVAILABLE:
+            raise ImportError(
+                "DictionaryRecognizer requires pyahocorasick - pip install pyahocorasick"
+            )
+        self.logger = logging.getLogger(__name__)
+        # entity_type -> sorted unique terms
+        self.terms = {
+            entity_type: sorted({term.strip() for term in entity_terms if term.strip()})
+            for entity_type, entity_terms in terms.items()
+        }
+        self.cache_path = cache_path
+        self.case_sensitive = case_sensitive
+        self.score = score
+        self.automaton = None
+        super().__init__(supported_entities=list(self.terms), name=name)
+
+    @classmethod
+    def from_files(cls, paths: Dict[str, str], **kwargs) -> "DictionaryRecognizer":
+        """Build from entity_type -> file path with one term per line."""
+        terms = {}
+        for entity_type, path in paths.items():
+            with open(path, encoding="utf-8") as f:
+                terms[entity_type] = [line.rstrip("\n") for line in f]
+        return cls(terms, **kwargs)
+
+    def load(self) -> None:
+        """Load the automaton from cache_path, or build (and persist) it."""
+        digest = self._digest()
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                self.automaton = self._load_cache(digest)
+            except Exception as e:
+                self.logger.warning(
+                    f"Ignoring unreadable automaton cache {self.cache_path}: {e}"
+                )
+            if self.automaton is not None:
+                return
+
+        automaton = ahocorasick.Automaton()
+        for entity_type, entity_terms in self.terms.items():
+            for term in entity_terms:
+                key = self._fold(term)[0]
+                automaton.add_word(key, (len(key), entity_type))
+        automaton.make_automaton()
+        self.automaton = automaton
+
+        if self.cache_path:
+            self._save_cache(automaton, digest)
+
+    def _load_cache(self, digest: str):
+        # None when the terms changed or the file is not the one we wrote
+        with open(self._meta_path(), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("digest") != digest:
+            return None
+        if meta.get("sha256") != self._file_sha256(self.cache_path):
+            self.logger.warning(
+                f"Automaton cache {self.cache_path} does not match its content hash"
+            )
+            return None
+        return ahocorasick.load(self.cache_path, self._decode_value)
+
+    def _save_cache(self, automaton, digest: str) -> None:
+        # Write to temporary files first so readers never see a partial cache;
+        # a crash between the two renames leaves a hash mismatch, i.e. a rebuild
+        tmp_path = f"{self.cache_path}.tmp"
+        automaton.save(tmp_path, self._encode_value)
+        meta = {"digest": digest, "sha256": self._file_sha256(tmp_path)}
+        os.replace(tmp_path, self.cache_path)
+        meta_tmp_path = f"{self._meta_path()}.tmp"
+        with open(meta_tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(meta_tmp_path, self._meta_path())
+
+    def _meta_path(self) -> str:
+        return f"{self.cache_path}.meta.json"
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        return sha.hexdigest()
+
+    @staticmethod
+    def _encode_value(value) -> bytes:
+        return json.dumps(value).encode("utf-8")
+
+    @staticmethod
+    def _decode_value(raw: bytes):
+        length, entity_type = json.loads(raw)
+        return length, entity_type
+
+    def analyze(
+        self, text: str, entities: List[str], nlp_artifacts=None
+    ) -> List[RecognizerResult]:
+        """Return leftmost-longest, non-overlapping dictionary matches."""
+        if self.automaton is None:
+            self.load()
+        wanted = set(entities) if entities else None
+
+        haystack, offsets = self._fold(text)
+
+        matches = []
+        for end_index, (length, entity_type) in self.automaton.iter(haystack):
+            if wanted is not None and entity_type not in wanted:
+                continue
+            start, end = end_index - length + 1, end_index + 1
+            if offsets is not None:
+                start, end = offsets[start], offsets[end - 1] + 1
+            if self._on_word_boundary(text, start, end):
+                matches.append((start, end, entity_type))
+
+        # Prefer the leftmost, then longest match among overlapping candidates
+        matches.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        results, last_end = [], 0
+        for start, end, entity_type in matches:
+            if start < last_end:
+                continue
+            results.append(
+                RecognizerResult(
+                    entity_type=entity_type,
+                    start=start,
+                    end=end,
+                    score=self.score,
+                    recognition_metadata={
+                        RecognizerResult.RECOGNIZER_NAME_KEY: self.name,
+                        RecognizerResult.RECOGNIZER_IDENTIFIER_KEY: self.id,
+                    },
+                )
+            )
+            last_end = end
+        return results
+
+    def _fold(self, text: str):
+        """
+        Return text as matched against the automaton keys, plus the index in
+        text of every folded character (None when offsets are unchanged).
+        """
+        if self.case_sensitive:
+            return text, None
+        folded = text.lower()
+        if len(folded) == len(text):
+            return folded, None
+        # Lower-casing changed the length (e.g. "İ" -> "i̇"): fold per
+        # character and map match offsets back onto the original text
+        pieces, offsets = [], []
+        for i, char in enumerate(text):
+            lowered = char.lower()
+            pieces.append(lowered)
+            offsets.extend([i] * len(lowered))
+        return "".join(pieces), offsets
+
+    def _digest(self) -> str:
+        sha = hashlib.sha256(f"case_sensitive={self.case_sensitive}\n".encode())
+        for entity_type, entity_terms in sorted(self.terms.items()):
+            for term in entity_terms:
+                sha.update(f"{entity_type}\t{term}\n".encode())
+        return sha.hexdigest()
+
+    @staticmethod
+    def _on_word_boundary(text: str, start: int, end: int) -> bool:
+        def is_word(char):
+            return char.isalnum() or char == "_"
+
+        if start > 0 and is_word(text[start]) and is_word(text[start - 1]):
+            return False
+        if end < len(text) and is_word(text[end - 1]) and is_word(text[end]):
+            return False
+        return True
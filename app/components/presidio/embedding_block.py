@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+
+from ..common.vectors import grown_capacity, normalise, resized
+
+
+class EmbeddingBlock:
+    """
+    Entity embeddings stored as rows of one contiguous float32 matrix.
+
+    Rows are L2-normalised on insert, so cosine similarity against any set of
+    entities is a single matrix-vector product. Each row remembers the
+    canonical name it was computed from and is recomputed when that changes.
+    """
+
+    def __init__(self, initial_capacity=64):
+        self._initial_capacity = initial_capacity
+        self._matrix = None
+        self._rows = {}  # entity key -> row index
+        self._canonicals = []  # row index -> canonical the row was encoded from
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._canonicals)
+
+    @property
+    def nbytes(self):
+        return 0 if self._matrix is None else self._matrix.nbytes
+
+    def set(self, key, canonical, embedding):
+        """Store (or overwrite) the embedding of key; returns its row index."""
+        vector = self.normalise(embedding)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                row = len(self._canonicals)
+                self._ensure_capacity(row + 1, vector.shape[0])
+                self._rows[key] = row
+                self._canonicals.append(canonical)
+            else:
+                self._canonicals[row] = canonical
+            self._matrix[row] = vector
+        return row
+
+    def similarities(self, entries, query, encode):
+        """
+        Cosine similarity of query against each (key, canonical) in entries.
+
+        Missing or stale rows are (re)computed with encode(canonical) first.
+        """
+        rows = []
+        for key, canonical in entries:
+            row = self._rows.get(key)
+            if row is None or self._canonicals[row] != canonical:
+                row = self.set(key, canonical, encode(canonical))
+            rows.append(row)
+        if not rows:
+            return np.empty(0, dtype=np.float32)
+        return self._matrix[rows] @ self.normalise(query)
+
+    @staticmethod
+    def normalise(embedding):
+        return normalise(embedding)
+
+    def _ensure_capacity(self, size, dim):
+        if self._matrix is None:
+            self._matrix = np.zeros((0, dim), dtype=np.float32)
+        capacity = self._matrix.shape[0]
+        if size > capacity:
+            self._matrix = resized(
+                self._matrix,
+                grown_capacity(capacity, size, self._initial_capacity),
+                len(self._canonicals),
+            )
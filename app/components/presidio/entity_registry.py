@@ -0,0 +1,289 @@
+"""Entity registries backing the alias -> placeholder key mappings of PresidioEngine."""
+
+import contextlib
+import json
+import logging
+import sys
+import threading
+from typing import Dict, Optional
+
+# Atomically merge a mention into an entity record stored in a session hash.
+# KEYS[1] = session hash, KEYS[2] = session version counter
+# ARGV[1] = entity key, ARGV[2] = mention text, ARGV[3] = entity type, ARGV[4] = ttl,
+# ARGV[5] = "1" to only create: an existing record is returned unchanged
+# Returns {record, session version, "1" if the record was written else "0"}; a
+# merge that changes nothing only restarts the TTL and leaves the version alone
+MERGE_ENTITY_SCRIPT = r"""
+-- Length in characters like Python's len(); string.len counts UTF-8 bytes
+local function char_len(s)
+    local _, count = string.gsub(s, '[^\128-\191]', '')
+    return count
+end
+local function touch()
+    local ttl = tonumber(ARGV[4])
+    if ttl and ttl > 0 then
+        redis.call('EXPIRE', KEYS[1], ttl)
+        redis.call('EXPIRE', KEYS[2], ttl)
+    end
+end
+local raw = redis.call('HGET', KEYS[1], ARGV[1])
+local entity
+local found = false
+if raw then
+    entity = cjson.decode(raw)
+    for _, alias in ipairs(entity.aliases) do
+        if alias == ARGV[2] then
+            found = true
+            break
+        end
+    end
+    if ARGV[5] == '1' or (found and char_len(ARGV[2]) <= char_len(entity.canonical)) then
+        touch()
+        return {raw, tostring(redis.call('GET', KEYS[2]) or 0), '0'}
+    end
+else
+    entity = {canonical = ARGV[2], aliases = {}, type = ARGV[3]}
+end
+if not found then
+    table.insert(entity.aliases, ARGV[2])
+end
+if char_len(ARGV[2]) > char_len(entity.canonical) then
+    entity.canonical = ARGV[2]
+end
+local encoded = cjson.encode(entity)
+redis.call('HSET', KEYS[1], ARGV[1], encoded)
+local version = redis.call('INCR', KEYS[2])
+touch()
+return {encoded, tostring(version), '1'}
+"""
+
+
+class StripedLock:
+    """Fixed pool of locks selected by hashing a blocking key (e.g. entity type)."""
+
+    def __init__(self, stripes: int = 16):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __call__(self, blocking_key: str) -> threading.Lock:
+        return self._locks[hash(blocking_key) % len(self._locks)]
+
+
+class EntityRecord:
+    """
+    Compact entity entry. Records are immutable: a merge publishes a new one.
+
+    Alias, canonical and type strings are interned so repeated mentions across
+    entities and sessions share one string object. Records have no integer id:
+    placeholders, Redis hash fields and EmbeddingBlock rows are all looked up
+    by key, and an id would add about 44 bytes per entity (a slot, an int
+    object and a key list entry) with nothing reading it.
+    """
+
+    __slots__ = ("key", "type", "canonical", "aliases")
+
+    def __init__(self, key: str, entity_type: str, canonical: str, aliases):
+        self.key = key
+        self.type = sys.intern(entity_type)
+        self.canonical = sys.intern(canonical)
+        self.aliases = tuple(sys.intern(alias) for alias in aliases)
+
+    def merged(self, text: str) -> "EntityRecord":
+        """Return a copy with text added as alias (and canonical if longer)."""
+        # Nothing to add: the record itself, so no-op merges publish nothing
+        if text in self.aliases and len(text) <= len(self.canonical):
+            return self
+        aliases = self.aliases if text in self.aliases else self.aliases + (text,)
+        canonical = text if len(text) > len(self.canonical) else self.canonical
+        return EntityRecord(self.key, self.type, canonical, aliases)
+
+    def to_dict(self) -> dict:
+        return {"canonical": self.canonical, "aliases": list(self.aliases), "type": self.type}
+
+    def __repr__(self) -> str:
+        return f"EntityRecord({self.key!r}, canonical={self.canonical!r}, aliases={list(self.aliases)!r})"
+
+
+class InMemoryEntityRegistry:
+    """
+    Process-local registry. Mappings are only visible to the current worker.
+
+    Safe to share between threads: writers serialise on a lock striped by
+    blocking key and publish a fresh copy of the mapping, so readers take a
+    snapshot with a plain attribute read and never observe a partial update.
+    """
+
+    def __init__(self, stripes: int = 16, session_id: str = "default"):
+        self.session_id = session_id
+        self._entities: Dict[str, EntityRecord] = {}
+        self._publish_lock = threading.Lock()
+        self.lock_for = StripedLock(stripes)
+
+    def entities(self) -> Dict[str, EntityRecord]:
+        """Return an immutable snapshot of key -> EntityRecord."""
+        return self._entities
+
+    def create(self, key: str, entity_type: str, text: str) -> EntityRecord:
+        """
+        Register a new entity under key with text as its first alias.
+
+        If key is already taken the existing entity is returned unchanged;
+        callers compare its first alias to tell a duplicate from a collision.
+        """
+        with self._publish_lock:
+            existing = self._entities.get(key)
+            if existing is not None:
+                return existing
+            entity = EntityRecord(key, entity_type, text, (text,))
+            self._publish(key, entity)
+        return entity
+
+    def merge(self, key: str, text: str) -> EntityRecord:
+        """Add text as an alias of key, promoting it to canonical if longer."""
+        with self._publish_lock:
+            current = self._entities[key]
+            entity = current.merged(text)
+            # A known alias changes nothing: keep the snapshot readers already hold
+            if entity is not current:
+                self._publish(key, entity)
+        return entity
+
+    @contextlib.contextmanager
+    def request(self):
+        """Scope of one request; snapshots are always current, so nothing to pin."""
+        yield self
+
+    def _publish(self, key: str, entity: EntityRecord) -> None:
+        # Copy-on-write so that snapshots handed out earlier stay consistent
+        entities = dict(self._entities)
+        entities[key] = entity
+        self._entities = entities
+
+
+class RedisEntityRegistry:
+    """
+    Registry shared between workers through Redis.
+
+    Each session is stored as one hash (entity key -> JSON record) plus a
+    version counter. Writes go through a Lua script so concurrent merges from
+    different workers never lose aliases, and reads are served from a local
+    cache that is only reloaded when the session version moves. Inside
+    request() the version is read from Redis once, by the first entities()
+    call, rather than on every access.
+    """
+
+    def __init__(self, redis_engine, session_id: str = "default", ttl: Optional[int] = None):
+        self.logger = logging.getLogger(__name__)
+        self.redis_engine = redis_engine
+        self.session_id = session_id
+        self.ttl = ttl
+        self.hash_key = redis_engine.get_entity_registry_key(session_id)
+        self.version_key = f"{self.hash_key}:version"
+        self._cache: Dict[str, EntityRecord] = {}
+        self._cache_version: Optional[str] = None
+        self._publish_lock = threading.Lock()
+        self.lock_for = StripedLock()
+        self._request = threading.local()  # per thread: request depth, version checked
+
+    @contextlib.contextmanager
+    def request(self):
+        """Check the session version at most once until the outermost request ends."""
+        depth = getattr(self._request, "depth", 0)
+        if not depth:
+            self._request.checked = False
+        self._request.depth = depth + 1
+        try:
+            yield self
+        finally:
+            self._request.depth = depth
+
+    def entities(self) -> Dict[str, EntityRecord]:
+        """Return the session mapping, reloading it only if another worker changed it."""
+        if getattr(self._request, "depth", 0):
+            if self._request.checked:
+                return self._cache
+            self._request.checked = True
+        version = self.redis_engine.get(self.version_key)
+        if version is None and self._cache_version is None:
+            # Nothing loaded from Redis yet (new session, or Redis unavailable)
+            return self._cache
+        if version != self._cache_version:
+            # A missing version means the session expired (TTL) or was deleted,
+            # unless Redis is unreachable, in which case hgetall returns None
+            raw_entities = self.redis_engine.hgetall(self.hash_key)
+            if raw_entities is not None:
+                with self._publish_lock:
+                    self._cache = {
+                        key: self._decode(key, raw) for key, raw in raw_entities.items()
+                    }
+                    self._cache_version = version
+        return self._cache
+
+    def create(self, key: str, entity_type: str, text: str) -> EntityRecord:
+        """
+        Register a new entity under key with text as its first alias.
+
+        If key is already taken (possibly by another worker) the existing entity
+        is returned unchanged; callers compare its first alias to tell a
+        duplicate from a collision.
+        """
+        return self._merge(key, text, entity_type, create_only=True)
+
+    def merge(self, key: str, text: str) -> EntityRecord:
+        """Add text as an alias of key, promoting it to canonical if longer."""
+        entity = self._cache.get(key)
+        return self._merge(key, text, entity.type if entity else "")
+
+    def _merge(
+        self, key: str, text: str, entity_type: str, create_only: bool = False
+    ) -> EntityRecord:
+        result = self.redis_engine.run_script(
+            MERGE_ENTITY_SCRIPT,
+            keys=[self.hash_key, self.version_key],
+            args=[key, text, entity_type, self.ttl or 0, "1" if create_only else "0"],
+        )
+        with self._publish_lock:
+            if result is None:
+                # Redis unavailable - keep serving this worker from its local cache
+                self.logger.warning(
+                    f"Entity registry merge for {key} not persisted - using local cache"
+                )
+                entity = self._cache.get(key)
+                if entity is None:
+                    entity = EntityRecord(key, entity_type, text, (text,))
+                elif create_only:
+                    return entity
+                else:
+                    entity = entity.merged(text)
+                self._publish(key, entity)
+                return entity
+
+            encoded, version, written = result
+            entity = self._decode(key, encoded)
+            cached = self._cache.get(key)
+            if (
+                written == "0"
+                and cached is not None
+                and (cached.canonical, cached.aliases)
+                == (entity.canonical, entity.aliases)
+            ):
+                # Nothing changed: keep the cache (and snapshots of it) as they are
+                return cached
+            self._publish(key, entity, version if written == "1" else None)
+            return entity
+
+    def _publish(self, key: str, entity: EntityRecord, version: Optional[str] = None) -> None:
+        # Called with _publish_lock held
+        cache = dict(self._cache)
+        cache[key] = entity
+        self._cache = cache
+        # Our own write is the only change since the last load - no reload needed
+        if version is not None and int(version) == int(self._cache_version or 0) + 1:
+            self._cache_version = version
+
+    def _decode(self, key: str, raw: str) -> EntityRecord:
+        entity = json.loads(raw)
+        # cjson encodes an empty Lua table as an object rather than a list
+        aliases = entity.get("aliases")
+        if not isinstance(aliases, list):
+            aliases = list(aliases or [])
+        return EntityRecord(key, entity.get("type", ""), entity["canonical"], aliases)
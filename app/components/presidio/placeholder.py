@@ -0,0 +1,174 @@
+"""Deterministic placeholder keys for detected entities."""
+
+import hashlib
+import hmac
+import logging
+import os
+import unicodedata
+from typing import Dict, Iterator, Optional
+
+try:
+    import tiktoken
+
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Short codes for Presidio's built-in entity types (unknown types keep their full name)
+TYPE_CODES: Dict[str, str] = {
+    "PERSON": "P",
+    "EMAIL_ADDRESS": "E",
+    "PHONE_NUMBER": "T",
+    "LOCATION": "L",
+    "DATE_TIME": "D",
+    "NRP": "N",
+    "ORGANIZATION": "O",
+    "URL": "U",
+    "IP_ADDRESS": "IP",
+    "CREDIT_CARD": "CC",
+    "CRYPTO": "CR",
+    "IBAN_CODE": "IB",
+    "MEDICAL_LICENSE": "ML",
+    "US_SSN": "SSN",
+    "US_ITIN": "ITIN",
+    "US_PASSPORT": "PP",
+    "US_DRIVER_LICENSE": "DL",
+    "US_BANK_NUMBER": "BN",
+}
+
+
+class PlaceholderFormat:
+    """
+    How a placeholder key is spelled: type label and id alphabet.
+
+    Ids are taken from the entity's HMAC digest, starting at length characters
+    and growing by step on every collision. Keys must stay word characters so
+    that anonymisation and de-anonymisation can match them on word boundaries.
+    """
+
+    def __init__(
+        self,
+        type_codes: Optional[Dict[str, str]] = None,
+        alphabet: str = "hex",
+        length: int = 4,
+        step: int = 2,
+    ):
+        if alphabet not in ("hex", "decimal"):
+            raise ValueError(f"Unsupported placeholder alphabet: {alphabet}")
+        self.type_codes = type_codes or {}
+        self.alphabet = alphabet
+        self.length = length
+        self.step = step
+
+    def keys(self, entity_type: str, digest: str) -> Iterator[str]:
+        label = self.type_codes.get(entity_type, entity_type)
+        if self.alphabet == "hex":
+            for length in range(self.length, len(digest) + 1, self.step):
+                yield f"{label}_{digest[:length]}"
+            return
+        # Leading decimal digits of the digest value are not uniform, its
+        # trailing ones are: use the value modulo 10**length, zero-padded
+        value = int(digest, 16)
+        digits = len(str(16 ** len(digest) - 1))
+        for length in range(self.length, digits + 1, self.step):
+            yield f"{label}_{value % 10**length:0{length}d}"
+
+
+PLACEHOLDER_FORMATS: Dict[str, PlaceholderFormat] = {
+    # PERSON_3fa9 - readable, but several tokens per placeholder
+    "verbose": PlaceholderFormat(),
+    # P_123 - short type code plus a decimal id (cl100k keeps 3 digits in one token)
+    "compact": PlaceholderFormat(type_codes=TYPE_CODES, alphabet="decimal", length=3, step=1),
+}
+
+
+def get_placeholder_format(name: str) -> PlaceholderFormat:
+    """Look up a format in PLACEHOLDER_FORMATS by name."""
+    try:
+        return PLACEHOLDER_FORMATS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unsupported placeholder format: {name} "
+            f"(expected one of: {', '.join(PLACEHOLDER_FORMATS)})"
+        ) from None
+
+
+class PlaceholderKeyGenerator:
+    """
+    Derive placeholder keys from an HMAC of the entity's normalised name.
+
+    The HMAC secret is derived per session from a shared master secret, so any
+    worker holding the secret regenerates the same key for the same entity
+    without a round-trip to shared state, while keys stay unlinkable across
+    sessions. Keys start short and are lengthened only on collision; their
+    spelling is controlled by placeholder_format.
+    """
+
+    def __init__(
+        self,
+        secret: Optional[bytes] = None,
+        session_id: str = "default",
+        placeholder_format: Optional[PlaceholderFormat] = None,
+    ):
+        # Without a configured secret keys are only deterministic within this process
+        master = secret if secret is not None else os.urandom(32)
+        self.session_secret = hmac.new(
+            master, session_id.encode("utf-8"), hashlib.sha256
+        ).digest()
+        self.placeholder_format = placeholder_format or PLACEHOLDER_FORMATS["verbose"]
+
+    @staticmethod
+    def normalise(text: str) -> str:
+        """Case-fold and collapse whitespace so trivial variants share a key."""
+        return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+    def digest(self, text: str) -> str:
+        return hmac.new(
+            self.session_secret, self.normalise(text).encode("utf-8"), hashlib.sha256
+        ).hexdigest()
+
+    def candidates(self, entity_type: str, text: str) -> Iterator[str]:
+        """Yield keys of increasing length; callers take the first one that is free."""
+        return self.placeholder_format.keys(entity_type, self.digest(text))
+
+
+class PlaceholderTokenReport:
+    """
+    Count the LLM tokens anonymisation adds to a request.
+
+    Uses a tiktoken encoding as a proxy for the model tokenizer (Gemini's own
+    tokenizer is not available offline), which is enough to compare formats.
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.logger = logging.getLogger(__name__)
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._available = TIKTOKEN_AVAILABLE
+
+    def report(self, original: str, anonymised: str) -> Optional[Dict[str, float]]:
+        """Return token counts before/after anonymisation, or None if unavailable."""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return None
+        original_tokens = len(encoding.encode(original, disallowed_special=()))
+        anonymised_tokens = len(encoding.encode(anonymised, disallowed_special=()))
+        overhead = anonymised_tokens - original_tokens
+        return {
+            "original_tokens": original_tokens,
+            "anonymised_tokens": anonymised_tokens,
+            "overhead_tokens": overhead,
+            "overhead_pct": (
+                round(100 * overhead / original_tokens, 2) if original_tokens else 0.0
+            ),
+        }
+
+    def _get_encoding(self):
+        if self._encoding is None and self._available:
+            try:
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                # Don't retry (and re-download) on every request
+                self._available = False
+                self.logger.warning(f"tiktoken encoding {self.encoding_name} unavailable: {e}")
+        return self._encoding
@@ -1,55 +1,166 @@
 import re
-import uuid
+import threading
 
 from presidio_analyzer import AnalyzerEngine
 from rapidfuzz import fuzz
-from sentence_transformers import util
+
+from .dictionary_recognizer import DictionaryRecognizer
+from .embedding_block import EmbeddingBlock
+from .entity_registry import InMemoryEntityRegistry
+from .placeholder import PlaceholderKeyGenerator, PlaceholderTokenReport
+from .streaming_deanonymiser import StreamingDeanonymiser
+from .tiered_analyzer import TieredAnalyzer
 
 
 class PresidioEngine:
-    def __init__(self, model=None):
+    def __init__(
+        self,
+        model=None,
+        registry=None,
+        key_secret=None,
+        placeholder_format=None,
+        analysis_mode="full",
+        analyzer=None,
+    ):
         self.model = model
-        self.analyzer = AnalyzerEngine()
-        self.entity_map = {}
-        self.embeddings = {}  # store embeddings for fast similarity checks
+        # Loading the spaCy model is expensive: engines may share one AnalyzerEngine,
+        # and without one it is only built when text is first analysed
+        self._analyzer = analyzer
+        if analysis_mode not in ("full", "tiered"):
+            raise ValueError(f"Unsupported analysis mode: {analysis_mode}")
+        # "tiered" runs pattern recognizers first and NER only on sentences that need it
+        self.analysis_mode = analysis_mode
+        self._tiered_analyzer = None
+        self._analyzer_lock = threading.RLock()
+        # Registry holds key -> EntityRecord; may be shared via Redis
+        self.registry = registry if registry is not None else InMemoryEntityRegistry()
+        # Keys are an HMAC of the entity name, so every worker sharing key_secret agrees
+        self.key_generator = PlaceholderKeyGenerator(
+            key_secret,
+            session_id=self.registry.session_id,
+            placeholder_format=placeholder_format,
+        )
+        self.token_report = PlaceholderTokenReport()
+        # Local embeddings of entity canonicals in one float32 block for fast similarity checks
+        self.embeddings = EmbeddingBlock()
+        # (entity snapshot, compiled alias pattern, alias -> key) reused until the registry changes
+        self._alias_index = (None, None, {})
+
+    @property
+    def entity_map(self):
+        return self.registry.entities()
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            with self._analyzer_lock:
+                if self._analyzer is None:
+                    self._analyzer = AnalyzerEngine()
+        return self._analyzer
+
+    @property
+    def tiered_analyzer(self):
+        if self.analysis_mode != "tiered":
+            return None
+        if self._tiered_analyzer is None:
+            with self._analyzer_lock:
+                if self._tiered_analyzer is None:
+                    self._tiered_analyzer = TieredAnalyzer(self.analyzer)
+        return self._tiered_analyzer
+
+    def add_dictionary(self, terms, cache_path=None, case_sensitive=False):
+        # Register org-specific deny-lists (entity_type -> terms); matches flow
+        # through analyze_text into the same entity resolution as NER results
+        recognizer = DictionaryRecognizer(
+            terms, cache_path=cache_path, case_sensitive=case_sensitive
+        )
+        self.analyzer.registry.add_recognizer(recognizer)
+        return recognizer
+
+    def analyze(self, text):
+        # Raw Presidio results, through the tiered pre-filter when enabled
+        if self.tiered_analyzer is not None:
+            return self.tiered_analyzer.analyze(text)
+        return self.analyzer.analyze(text=text, language="en")
+
+    def analysis_stats(self):
+        # How often each analysis tier triggered (empty in "full" mode)
+        return self._tiered_analyzer.stats() if self._tiered_analyzer is not None else {}
 
     def analyze_text(self, text):
         # Analyze text using Presidio
-        results = self.analyzer.analyze(text=text, language="en")
-        # Map result of similar entities to a common entity uid
-        for entity in results:
-            entity_str = text[entity.start : entity.end]
-            entity_type = entity.entity_type
-            key = self.add_entity(entity_str, entity_type)
-            print(
-                f"Detected entity: {entity_str}, Type: {entity_type}. Key mapping: {key}"
-            )
-        print(f"Entity_map: {self.entity_map}")
+        results = self.analyze(text)
+        # One registry version check for all the entities of the text
+        with self.registry.request():
+            # Map result of similar entities to a common entity uid
+            for entity in results:
+                entity_str = text[entity.start : entity.end]
+                entity_type = entity.entity_type
+                key = self.add_entity(entity_str, entity_type)
+                print(
+                    f"Detected entity: {entity_str}, Type: {entity_type}. Key mapping: {key}"
+                )
+            print(f"Entity_map: {self.entity_map}")
         return self
 
     def anonymise_text(self, text):
-        # Build list of (alias, key) pairs
-        alias_key_pairs = []
-        for key, data in self.entity_map.items():
-            for alias in data["aliases"]:
-                alias_key_pairs.append((alias, key))
+        # Lock-free read: the registry snapshot is never mutated in place
+        pattern, alias_to_key = self._get_alias_index(self.entity_map)
+        if pattern is None:
+            return text
+        # Replace aliases with keys in a single pass
+        return pattern.sub(lambda match: alias_to_key[match.group(0)], text)
 
-        # Sort by alias length (longest first to prevent partial overlaps)
-        alias_key_pairs.sort(key=lambda x: len(x[0]), reverse=True)
+    def placeholder_token_overhead(self, text, anonymised_text):
+        # Tokens added (or saved) by replacing entities with placeholder keys
+        return self.token_report.report(text, anonymised_text)
 
-        # Replace aliases with keys
-        for alias, key in alias_key_pairs:
-            pattern = r"\b" + re.escape(alias) + r"\b"
-            text = re.sub(pattern, key, text)
-        return text
+    def _get_alias_index(self, entities):
+        cached_entities, pattern, alias_to_key = self._alias_index
+        if cached_entities is entities:
+            return pattern, alias_to_key
+
+        # Build alias -> key pairs
+        alias_to_key = {}
+        for key, data in entities.items():
+            for alias in data.aliases:
+                alias_to_key[alias] = key
+
+        # Sort by alias length (longest first to prevent partial overlaps)
+        aliases = sorted(alias_to_key, key=len, reverse=True)
+        pattern = (
+            re.compile(r"\b(?:" + "|".join(map(re.escape, aliases)) + r")\b")
+            if aliases
+            else None
+        )
+        self._alias_index = (entities, pattern, alias_to_key)
+        return pattern, alias_to_key
 
     def add_entity(self, text, entity_type, threshold=0.6):
         # new_emb = self.model.encode(text, convert_to_tensor=True)
         new_emb = self.model.encode(text)
 
+        # Matching and merging are serialised per entity type (the blocking key),
+        # so concurrent detections of different types never contend
+        with self.registry.lock_for(entity_type):
+            return self._resolve_entity(text, entity_type, new_emb, threshold)
+
+    def _resolve_entity(self, text, entity_type, new_emb, threshold):
+        # Only compare against entities in the same block
+        candidates = [
+            data for data in self.entity_map.values() if data.type == entity_type
+        ]
+        # Embedding similarity to every candidate in one matrix-vector product
+        # (canonicals may have been created or promoted by another worker)
+        similarities = self.embeddings.similarities(
+            [(data.key, data.canonical) for data in candidates],
+            new_emb,
+            self.model.encode,
+        )
+
         best_key, best_score = None, -1
-        for key, emb in self.embeddings.items():
-            existing = self.entity_map[key]["canonical"]
+        for data, similarity in zip(candidates, similarities):
+            existing = data.canonical
 
             # --- Regex direct search ---
             # direct substring check (regex word boundary)
@@ -64,34 +175,51 @@ class PresidioEngine:
 
             # --- Embeddings similarity search (if fuzzy fails) ---
             if score < (threshold):
-                score = util.cos_sim(new_emb, emb).item()
+                score = float(similarity)
                 # print(f"Embedding score '{text}' and '{existing}': {score:.2f}")
             # track best match
             if score > best_score:
-                best_key, best_score = key, score
+                best_key, best_score = data.key, score
 
         # --- Merge into existing entity ---
         if best_score >= threshold:
-            # Add new alias if not already stored
-            if text not in self.entity_map[best_key]["aliases"]:
-                self.entity_map[best_key]["aliases"].append(text)
-
-            # Update canonical if new mention is longer
-            if len(text) > len(self.entity_map[best_key]["canonical"]):
-                self.entity_map[best_key]["canonical"] = text
-                self.embeddings[best_key] = new_emb
+            # Add new alias and update canonical if new mention is longer
+            entity = self.registry.merge(best_key, text)
+            if entity.canonical == text:
+                self.embeddings.set(best_key, text, new_emb)
             return best_key
 
         # --- Create new entity ---
-        entity_uuid = uuid.uuid4().hex[:4]
-        new_key = f"{entity_type}_{entity_uuid}"
-        self.entity_map[new_key] = {"canonical": text, "aliases": [text]}
-        self.embeddings[new_key] = new_emb
-        return new_key
+        origin = self.key_generator.normalise(text)
+        for new_key in self.key_generator.candidates(entity_type, text):
+            entity = self.registry.create(new_key, entity_type, text)
+            if self.key_generator.normalise(entity.aliases[0]) != origin:
+                # Key taken by a different entity - try a longer key
+                continue
+            if entity.aliases[0] != text:
+                # Same entity already created (e.g. by another worker) - merge into it
+                entity = self.registry.merge(new_key, text)
+            if entity.canonical == text:
+                self.embeddings.set(new_key, text, new_emb)
+            return new_key
+        raise ValueError(f"No free placeholder key for entity of type {entity_type}")
 
     def de_anonymise_text(self, text):
         # Replace keys with canonical entity names
         for key, data in self.entity_map.items():
             pattern = r"\b" + re.escape(key) + r"\b"
-            text = re.sub(pattern, data["canonical"], text)
+            text = re.sub(pattern, data.canonical, text)
         return text
+
+    def de_anonymise_stream(self, fragments):
+        # Replace keys as fragments arrive, holding back only a possible partial key
+        deanonymiser = StreamingDeanonymiser(
+            {key: data.canonical for key, data in self.entity_map.items()}
+        )
+        for fragment in fragments:
+            text = deanonymiser.feed(fragment)
+            if text:
+                yield text
+        tail = deanonymiser.flush()
+        if tail:
+            yield tail
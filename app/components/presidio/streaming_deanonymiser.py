@@ -0,0 +1,77 @@
+import re
+
+
+class StreamingDeanonymiser:
+    """
+    De-anonymise text that arrives fragment by fragment (e.g. LLM token streams).
+
+    Only the shortest suffix that could still grow into a placeholder key is
+    held back; everything before it is de-anonymised and released immediately.
+    """
+
+    def __init__(self, key_to_canonical):
+        self.key_to_canonical = dict(key_to_canonical)
+        keys = sorted(self.key_to_canonical, key=len, reverse=True)
+        self._pattern = (
+            re.compile(r"\b(?:" + "|".join(map(re.escape, keys)) + r")\b")
+            if keys
+            else None
+        )
+        # Every non-empty prefix of every key, including the full key (a complete
+        # key at the end of the buffer may still be extended into a longer one)
+        self._prefixes = {key[:i] for key in keys for i in range(1, len(key) + 1)}
+        self._max_key_len = len(keys[0]) if keys else 0
+        self._buffer = ""
+        self._prev_char = ""
+
+    def feed(self, fragment):
+        """Add a fragment and return the text that is now safe to emit."""
+        self._buffer += fragment
+        return self._release(self._holdback_start())
+
+    def flush(self):
+        """Return everything still buffered once the stream has ended."""
+        return self._release(len(self._buffer))
+
+    def _holdback_start(self):
+        buffer = self._buffer
+        if self._pattern is None:
+            return len(buffer)
+        for i in range(max(0, len(buffer) - self._max_key_len), len(buffer)):
+            before = buffer[i - 1] if i > 0 else self._prev_char
+            # A key can only start on a word boundary
+            if before and self._is_word_char(before):
+                continue
+            if buffer[i:] in self._prefixes:
+                return i
+        return len(buffer)
+
+    def _release(self, cut):
+        if self._pattern is None:
+            ready, self._buffer = self._buffer, ""
+            return ready
+
+        # Prefix the last released character so \b at the start of the buffer
+        # sees the left context, and match against the whole buffer so word
+        # boundaries on the right see the held-back text
+        context = len(self._prev_char)
+        text = self._prev_char + self._buffer
+        cut += context
+        pieces, last = [], context
+        for match in self._pattern.finditer(text, context):
+            if match.end() > cut:
+                cut = min(cut, match.start())
+                break
+            pieces.append(text[last : match.start()])
+            pieces.append(self.key_to_canonical[match.group(0)])
+            last = match.end()
+        pieces.append(text[last:cut])
+
+        if cut > context:
+            self._prev_char = text[cut - 1]
+        self._buffer = text[cut:]
+        return "".join(pieces)
+
+    @staticmethod
+    def _is_word_char(char):
+        return char.isalnum() or char == "_"
@@ -0,0 +1,208 @@
+"""Tiered PII analysis: cheap pattern recognizers first, spaCy NER only where needed."""
+
+import bisect
+import re
+import threading
+from collections import Counter
+from typing import Dict, List
+
+from presidio_analyzer import EntityRecognizer, RecognizerResult
+from presidio_analyzer.nlp_engine import NlpArtifacts
+from presidio_analyzer.predefined_recognizers import SpacyRecognizer
+
+SENTENCE_SPLIT = re.compile(r"[^.!?\n]+[.!?]*")
+# A sentence piece ending in one of these continues into the next ("Mr. Smith")
+ABBREVIATION = re.compile(
+    r"\b(?:Mr|Mrs|Ms|Mx|Dr|Prof|Sr|Jr|St|Mt|Gen|Col|Capt|Lt|Rev|Hon|No|vs|etc|[A-Z])\.$"
+)
+WORD = re.compile(r"[\w'-]+")
+CAPITALISED_TOKEN = re.compile(r"\b[A-Z][\w'-]*")
+DIGIT = re.compile(r"\d")
+# Placeholder keys left by earlier anonymisation, e.g. PERSON_3fa9 or P_123
+PLACEHOLDER_KEY = re.compile(r"\b[A-Z]+(?:_[A-Z]+)*_[0-9a-f]+\b")
+
+# Candidate spans are analysed in one NER call, joined by a paragraph break
+SPAN_SEPARATOR = "\n\n"
+
+# Capitalised sentence openers that do not hint at a named entity
+COMMON_OPENERS = frozenset("""
+    A An And Are As At But Can Could Did Do Does For From Give Hello Hi How I If
+    In Is It List Make My No Of On Please So Tell Thanks Thank The There These
+    This Those To We What When Where Which Who Why Will With Would Yes You Your
+    """.split())
+
+
+class TieredAnalyzer:
+    """
+    Analyse text in three tiers to avoid running full NER on every prompt.
+
+    1. Pattern recognizers (regex, checksum and dictionary based) on the whole
+       text, through the AnalyzerEngine so context words and score thresholds
+       apply as in full mode. Their NLP artifacts come from the tokenizer
+       alone, with lower-cased tokens standing in for lemmas.
+    2. A capitalisation/digit heuristic selects sentences that may hold named entities.
+    3. The NLP (spaCy) recognizers run only on those candidate sentences, in
+       one analyzer call over the candidate spans joined together.
+
+    Counters of how often each tier triggered are kept in stats() so the
+    speed/recall trade-off can be judged against the full analyzer.
+    """
+
+    def __init__(self, analyzer, language: str = "en"):
+        self.analyzer = analyzer
+        self.language = language
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def analyze(self, text: str) -> List[RecognizerResult]:
+        recognizers = self.analyzer.registry.get_recognizers(
+            language=self.language, all_fields=True
+        )
+        pattern_entities = sorted(
+            {
+                entity
+                for r in recognizers
+                if not isinstance(r, SpacyRecognizer)
+                for entity in r.supported_entities
+            }
+        )
+        ner_entities = sorted(
+            {
+                entity
+                for r in recognizers
+                if isinstance(r, SpacyRecognizer)
+                for entity in r.supported_entities
+            }
+        )
+
+        # --- Tier 1: pattern recognizers on tokenizer-only NLP artifacts ---
+        results = []
+        if pattern_entities:
+            results = self.analyzer.analyze(
+                text=text,
+                language=self.language,
+                entities=pattern_entities,
+                nlp_artifacts=self._token_artifacts(text),
+            )
+        pattern_hits = len(results)
+
+        # --- Tier 2: heuristic pick of sentences worth running NER on ---
+        sentences = self._sentences(text)
+        candidates = [
+            (start, end) for start, end in sentences if self._needs_ner(text[start:end])
+        ]
+
+        # --- Tier 3: full NER only on candidate sentences ---
+        if candidates and ner_entities:
+            results.extend(self._analyze_spans(text, candidates, ner_entities))
+
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters["sentences"] += len(sentences)
+            self._counters["ner_sentences"] += len(candidates)
+            if pattern_hits:
+                self._counters["pattern_hits"] += 1
+            if candidates:
+                self._counters["ner_requests"] += 1
+            else:
+                self._counters["ner_skipped"] += 1
+
+        return EntityRecognizer.remove_duplicates(results)
+
+    def stats(self) -> Dict[str, float]:
+        """Return tier counters plus the share of requests and sentences sent to NER."""
+        with self._lock:
+            counters = dict(self._counters)
+        requests = counters.get("requests", 0)
+        sentences = counters.get("sentences", 0)
+        counters["ner_request_rate"] = (
+            counters.get("ner_requests", 0) / requests if requests else 0.0
+        )
+        counters["ner_sentence_rate"] = (
+            counters.get("ner_sentences", 0) / sentences if sentences else 0.0
+        )
+        return counters
+
+    def _token_artifacts(self, text):
+        # Tokens for context-word matching without running the NLP pipeline;
+        # the NLP recognizers find no entities in them
+        nlp_engine = self.analyzer.nlp_engine
+        nlp = (getattr(nlp_engine, "nlp", None) or {}).get(self.language)
+        if nlp is None:
+            # Not a spaCy-based engine: fall back to its full pipeline
+            return nlp_engine.process_text(text, self.language)
+        doc = nlp.make_doc(text)
+        return NlpArtifacts(
+            entities=[],
+            tokens=doc,
+            tokens_indices=[token.idx for token in doc],
+            lemmas=[token.lower_ for token in doc],
+            nlp_engine=nlp_engine,
+            language=self.language,
+            scores=[],
+        )
+
+    def _analyze_spans(self, text, spans, entities):
+        # Adjacent spans are merged, then all are joined into one text so the
+        # NLP pipeline runs once; results are mapped back onto text
+        merged = []
+        for start, end in spans:
+            if merged and text[merged[-1][1] : start].strip() == "":
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        pieces, offsets, joined_start = [], [], 0
+        for start, end in merged:
+            pieces.append(text[start:end])
+            offsets.append(joined_start)
+            joined_start += end - start + len(SPAN_SEPARATOR)
+
+        results = []
+        for result in self.analyzer.analyze(
+            text=SPAN_SEPARATOR.join(pieces),
+            language=self.language,
+            entities=entities,
+        ):
+            i = bisect.bisect_right(offsets, result.start) - 1
+            start, end = merged[i]
+            shift = start - offsets[i]
+            if result.end + shift > end:
+                # Spans the separator between two pieces
+                continue
+            result.start += shift
+            result.end += shift
+            results.append(result)
+        return results
+
+    @staticmethod
+    def _sentences(text: str):
+        # (start, end) of each sentence; pieces ending in an abbreviation are
+        # joined with the piece that directly follows them
+        sentences = []
+        for match in SENTENCE_SPLIT.finditer(text):
+            if (
+                sentences
+                and sentences[-1][1] == match.start()
+                and ABBREVIATION.search(text[sentences[-1][0] : sentences[-1][1]])
+            ):
+                sentences[-1] = (sentences[-1][0], match.end())
+            else:
+                sentences.append((match.start(), match.end()))
+        return sentences
+
+    @staticmethod
+    def _needs_ner(sentence: str) -> bool:
+        sentence = PLACEHOLDER_KEY.sub(" ", sentence).strip()
+        if DIGIT.search(sentence):
+            # Dates, times and addresses usually carry digits
+            return True
+        tokens = CAPITALISED_TOKEN.findall(sentence)
+        if not tokens:
+            return False
+        # Punctuation is not part of the word: "Hello," opens like "Hello"
+        first_word = WORD.search(sentence).group(0)
+        for token in tokens:
+            if token == "I" or (token == first_word and token in COMMON_OPENERS):
+                continue
+            return True
+        return False
@@ -0,0 +1,141 @@
+"""Token-budgeted packing of retrieved chunks into the LLM context."""
+
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken
+
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Characters per token assumed when no tiktoken encoding is available
+CHARS_PER_TOKEN = 4
+
+
+class ContextPacker:
+    """
+    Fit retrieved chunks into a token budget, best chunks first.
+
+    Adjacent chunks from the text splitter share up to chunk_overlap
+    characters, so before a chunk is packed the text it shares with chunks
+    already packed (a head that repeats their tail, a tail that repeats their
+    head, or the whole chunk) is trimmed. Chunks that no longer fit are
+    skipped in favour of smaller ones further down; the first chunk is
+    truncated to the budget rather than dropped. Token counts use a tiktoken
+    encoding as a proxy for the model tokenizer, or a character estimate
+    when tiktoken is unavailable.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 2000,
+        encoding_name: str = "cl100k_base",
+        separator: str = "\n",
+        min_overlap: int = 16,
+        max_overlap: int = 200,
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.token_budget = token_budget
+        self.encoding_name = encoding_name
+        self.separator = separator
+        # Shared text shorter than min_overlap characters is treated as coincidence
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self._encoding = None
+        self._available = TIKTOKEN_AVAILABLE
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def pack(
+        self, chunks: Sequence[str], scores: Optional[Sequence[float]] = None
+    ) -> Tuple[str, Dict[str, int]]:
+        """Return the packed context and a report of the tokens it saved."""
+        order = list(range(len(chunks)))
+        if scores is not None:
+            order.sort(key=lambda i: scores[i], reverse=True)
+        separator_tokens = self.count(self.separator)
+        # What plain concatenation of every chunk would have cost
+        input_tokens = sum(self.count(chunk) for chunk in chunks)
+        input_tokens += separator_tokens * max(len(chunks) - 1, 0)
+
+        packed: List[str] = []
+        used = 0
+        trimmed = skipped = 0
+        truncated = False
+        for i in order:
+            text = self._trim(chunks[i], packed)
+            if not text.strip():
+                # Nothing left that is not already in the context
+                trimmed += 1
+                continue
+            if len(text) < len(chunks[i]):
+                trimmed += 1
+            cost = self.count(text) + (separator_tokens if packed else 0)
+            if used + cost <= self.token_budget:
+                packed.append(text)
+                used += cost
+            elif not packed:
+                # Best chunk alone is over budget: keep as much of it as fits
+                text = self._truncate(text, self.token_budget)
+                packed.append(text)
+                used = self.count(text)
+                truncated = True
+            else:
+                skipped += 1
+
+        context = self.separator.join(packed)
+        return context, {
+            "chunks": len(chunks),
+            "packed_chunks": len(packed),
+            "trimmed_chunks": trimmed,
+            "skipped_chunks": skipped,
+            "truncated": truncated,
+            "input_tokens": input_tokens,
+            "packed_tokens": used,
+            "saved_tokens": input_tokens - used,
+            "token_budget": self.token_budget,
+        }
+
+    def _trim(self, text: str, packed: List[str]) -> str:
+        for other in packed:
+            if text in other:
+                return ""
+            head = self._overlap(other, text)
+            if head:
+                text = text[head:]
+            tail = self._overlap(text, other)
+            if tail:
+                text = text[:-tail]
+        return text
+
+    def _overlap(self, left: str, right: str) -> int:
+        # Length of the longest suffix of left that is also a prefix of right
+        longest = min(len(left), len(right), self.max_overlap)
+        for size in range(longest, self.min_overlap - 1, -1):
+            if left.endswith(right[:size]):
+                return size
+        return 0
+
+    def _truncate(self, text: str, tokens: int) -> str:
+        encoding = self._get_encoding()
+        if encoding is None:
+            return text[: tokens * CHARS_PER_TOKEN]
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
+
+    def _get_encoding(self):
+        if self._encoding is None and self._available:
+            try:
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                # Don't retry (and re-download) on every request
+                self._available = False
+                self.logger.warning(
+                    f"tiktoken encoding {self.encoding_name} unavailable: {e}"
+                )
+        return self._encoding
@@ -0,0 +1,498 @@
+"""FAISS-backed vector indexes: exact inner product, HNSW and IVF-PQ."""
+
+import threading
+import time
+
+import numpy as np
+
+from .vector_index import VectorIndex
+from .vector_store import VectorStore
+
+try:
+    import faiss
+
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Candidates fetched per wanted result when rows must be filtered out
+OVERSAMPLE = 2
+
+
+class FaissIndex(VectorIndex):
+    """
+    Base for FAISS indexes over L2-normalised vectors ranked by inner product.
+
+    FAISS assigns sequential ids and cannot filter, so a side table indexed
+    by FAISS id keeps each vector's doc id, namespace, expiry time, metadata
+    and whether it is live. Re-adding or deleting a doc id tombstones its
+    row (the vector stays in the FAISS index); searches that exclude rows
+    fetch more candidates than asked for and filter them afterwards, and
+    compact() rebuilds the FAISS index without them. The index is created
+    on the first insert, once the embedding dimension is known.
+    """
+
+    def __init__(self):
+        if not FAISS_AVAILABLE:
+            raise ImportError(
+                "FAISS vector indexes require faiss - pip install faiss-cpu"
+            )
+        self.index = None
+        self._doc_ids = []  # faiss id -> doc id
+        self._namespaces = []  # faiss id -> namespace
+        self._expires = []  # faiss id -> expiry time (inf = never)
+        self._metadata = []  # faiss id -> metadata dict or None
+        self._live = []  # faiss id -> not deleted or replaced
+        self._rows = {}  # doc id -> faiss id of its live row
+        self._dead = 0
+        self._expiring = 0  # live rows with a finite expiry time
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()  # one compaction at a time
+        self._generation = 0  # bumped whenever the FAISS ids are renumbered
+        self._compactor = None
+        self._stop_compaction = threading.Event()
+        # Monotonic change counter: the index as a whole and each namespace
+        # remember the clock value of their last insert or removal
+        self._clock = 0
+        self._changed = 0
+        self._namespace_changed = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, doc_id):
+        with self._lock:
+            i = self._rows.get(doc_id)
+            return i is not None and self._expires[i] > time.time()
+
+    def version(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                return self._changed
+            return self._namespace_changed.get(namespace, 0)
+
+    def refresh(self, doc_id, ttl=None):
+        expires_at = time.time() + ttl if ttl else np.inf
+        with self._lock:
+            i = self._rows.get(doc_id)
+            if i is None or self._expires[i] <= time.time():
+                return False
+            self._expiring += int(np.isfinite(expires_at)) - int(
+                np.isfinite(self._expires[i])
+            )
+            # An unexpired row stays in the same results: the version stays too
+            self._expires[i] = expires_at
+            return True
+
+    def add_embedding(self, embedding, doc_id, namespace=None, ttl=None, metadata=None):
+        expires_at = time.time() + ttl if ttl else np.inf
+        vector = self.normalise(embedding)[None, :]
+        with self._lock:
+            if self.index is None:
+                self.index = self._build(vector.shape[1])
+            self._add(vector)
+            old = self._rows.get(doc_id)
+            if old is not None:
+                self._tombstone(old)
+                self._touch([self._namespaces[old]])
+            self._rows[doc_id] = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            self._namespaces.append(namespace)
+            self._expires.append(expires_at)
+            self._metadata.append(dict(metadata) if metadata else None)
+            self._live.append(True)
+            self._expiring += bool(np.isfinite(expires_at))
+            self._touch([namespace])
+
+    def delete(self, doc_id):
+        with self._lock:
+            i = self._rows.get(doc_id)
+            if i is None:
+                return False
+            self._tombstone(i)
+            self._touch([self._namespaces[i]])
+            return True
+
+    def delete_namespace(self, namespace):
+        with self._lock:
+            ids = [i for i in self._rows.values() if self._namespaces[i] == namespace]
+            for i in ids:
+                self._tombstone(i)
+            if ids:
+                self._touch([namespace])
+            return len(ids)
+
+    def expire(self, now=None):
+        """Tombstone rows whose TTL has passed; returns the number of rows removed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._expiring:
+                return 0
+            ids = [i for i in self._rows.values() if self._expires[i] <= now]
+            for i in ids:
+                self._tombstone(i)
+            if ids:
+                self._touch({self._namespaces[i] for i in ids})
+            return len(ids)
+
+    def compact(self):
+        """Rebuild the FAISS index without tombstoned rows; returns the number of rows dropped."""
+        self.expire()
+        with self._compact_lock:
+            with self._lock:
+                if not self._dead:
+                    return 0
+                size = len(self._doc_ids)
+                keep = [i for i in range(size) if self._live[i]]
+                generation = self._generation
+                source = self._compaction_source(keep)
+                # The side tables only grow, and a row's doc id, namespace and
+                # metadata never change, so they can be copied unlocked
+                doc_ids, namespaces, metadata = (
+                    self._doc_ids,
+                    self._namespaces,
+                    self._metadata,
+                )
+            # Building the new index (slow for HNSW) does not block searches
+            rebuilt = self._rebuilt(source)
+            doc_ids = [doc_ids[i] for i in keep]
+            namespaces = [namespaces[i] for i in keep]
+            metadata = [metadata[i] for i in keep]
+            rows = {doc_id: new for new, doc_id in enumerate(doc_ids)}
+            with self._lock:
+                if self._generation != generation:
+                    # Renumbered meanwhile (IVF-PQ training); the rebuild is stale
+                    return 0
+                # Rows added since the copy go after the kept ones; rows
+                # deleted or refreshed since keep their current state
+                old = keep + list(range(size, len(self._doc_ids)))
+                self._install(rebuilt, len(keep), old)
+                live = [self._live[i] for i in old]
+                for new in range(len(keep)):
+                    if not live[new] and rows.get(doc_ids[new]) == new:
+                        del rows[doc_ids[new]]
+                for new in range(len(keep), len(old)):
+                    if live[new]:
+                        rows[self._doc_ids[old[new]]] = new
+                self._doc_ids = doc_ids + self._doc_ids[size:]
+                self._namespaces = namespaces + self._namespaces[size:]
+                self._metadata = metadata + self._metadata[size:]
+                self._expires = [self._expires[i] for i in old]
+                self._live = live
+                self._rows = rows
+                self._dead = len(old) - len(rows)
+                self._generation += 1
+                return size - len(keep)
+
+    def start_compaction(self, interval=60.0, min_dead_ratio=0.2):
+        """Expire and compact in a background thread once enough rows are dead."""
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop_compaction.wait(interval):
+                self.expire()
+                total = len(self._doc_ids)
+                if total and self._dead / total >= min_dead_ratio:
+                    self.compact()
+
+        self._stop_compaction.clear()
+        self._compactor = threading.Thread(
+            target=run, name="faiss-index-compaction", daemon=True
+        )
+        self._compactor.start()
+
+    def stop_compaction(self):
+        if self._compactor is not None:
+            self._stop_compaction.set()
+            self._compactor.join()
+            self._compactor = None
+
+    def search(
+        self, query_embedding, top_k=2, min_score=None, namespace=None, filters=None
+    ):
+        return self.search_batch(
+            [query_embedding], top_k, min_score, namespace, filters
+        )[0]
+
+    def search_batch(self, queries, k=2, min_score=None, namespace=None, filters=None):
+        queries = [self.normalise(query) for query in queries]
+        if not queries:
+            return []
+        queries = np.ascontiguousarray(np.stack(queries))
+        with self._lock:
+            total = len(self._doc_ids)
+            if not total:
+                return [[] for _ in range(len(queries))]
+            now = time.time()
+            constrained = (
+                namespace is not None or filters or self._dead or self._expiring
+            )
+            fetch = min(k * OVERSAMPLE if constrained else k, total)
+            results = [None] * len(queries)
+            pending = list(range(len(queries)))
+            while pending:
+                scores, ids = self._search(
+                    np.ascontiguousarray(queries[pending]), fetch
+                )
+                widen = []
+                for row, row_ids, row_scores in zip(pending, ids, scores):
+                    results[row] = [
+                        (self._doc_ids[i], float(score))
+                        for i, score in zip(row_ids, row_scores)
+                        # FAISS pads with -1 when fewer than fetch results are found
+                        if i >= 0
+                        and (min_score is None or score >= min_score)
+                        and (
+                            not constrained
+                            or self._eligible(i, namespace, filters, now)
+                        )
+                    ][:k]
+                    # Too many candidates were filtered out: search wider, unless
+                    # nothing further down can qualify (padding, or the lowest
+                    # fetched score is already under min_score)
+                    exhausted = (
+                        fetch >= total
+                        or row_ids[-1] < 0
+                        or (min_score is not None and row_scores[-1] < min_score)
+                    )
+                    if len(results[row]) < k and not exhausted:
+                        widen.append(row)
+                pending = widen
+                fetch = min(fetch * 4, total)
+            return results
+
+    def score_ids(self, query_embedding, doc_ids, namespace=None, filters=None):
+        # Exact scores of just these docs (e.g. a lexical shortlist); ineligible ones are left out
+        query = self.normalise(query_embedding)
+        with self._lock:
+            now = time.time()
+            ids = [
+                self._rows[d]
+                for d in doc_ids
+                if d in self._rows
+                and self._eligible(self._rows[d], namespace, filters, now)
+            ]
+            if not ids:
+                return {}
+            scores = self._reconstruct(ids) @ query
+            return {self._doc_ids[i]: float(s) for i, s in zip(ids, scores)}
+
+    def _eligible(self, i, namespace, filters, now):
+        if not self._live[i] or self._expires[i] <= now:
+            return False
+        if namespace is not None and self._namespaces[i] != namespace:
+            return False
+        if filters:
+            metadata = self._metadata[i] or {}
+            for field, wanted in filters.items():
+                value = metadata.get(field)
+                if isinstance(wanted, (list, tuple, set, frozenset)):
+                    if value is None or value not in wanted:
+                        return False
+                elif value is None or value != wanted:
+                    return False
+        return True
+
+    def _tombstone(self, i):
+        self._live[i] = False
+        del self._rows[self._doc_ids[i]]
+        self._dead += 1
+        self._expiring -= bool(np.isfinite(self._expires[i]))
+
+    def _touch(self, namespaces):
+        self._clock += 1
+        self._changed = self._clock
+        for namespace in namespaces:
+            self._namespace_changed[namespace] = self._clock
+
+    def _build(self, dim):
+        raise NotImplementedError
+
+    def _add(self, vectors):
+        self.index.add(vectors)
+
+    def _search(self, queries, k):
+        return self.index.search(queries, k)
+
+    def _reconstruct(self, ids):
+        return self.index.reconstruct_batch(np.asarray(ids, dtype=np.int64))
+
+    def _compaction_source(self, keep):
+        # What _rebuilt needs to index the rows keep under ids 0..; caller holds _lock
+        if not keep:
+            return np.empty((0, self.index.d), dtype=np.float32)
+        return self._reconstruct(keep)
+
+    def _rebuilt(self, vectors):
+        index = self._build(self.index.d)
+        index.add(vectors)
+        return index
+
+    def _install(self, rebuilt, kept, old):
+        # Swap in rebuilt, which holds the first kept rows of old; caller holds _lock
+        if len(old) > kept:
+            rebuilt.add(self._reconstruct(old[kept:]))
+        self.index = rebuilt
+
+
+class FlatIndex(FaissIndex):
+    """Exact inner-product search (IndexFlatIP)."""
+
+    def _build(self, dim):
+        return faiss.IndexFlatIP(dim)
+
+
+class HNSWIndex(FaissIndex):
+    """
+    Approximate search on an HNSW graph (IndexHNSWFlat, inner product).
+
+    m is the number of graph neighbours per node; ef_search is the size of
+    the candidate list at query time and can be changed between searches.
+    """
+
+    def __init__(self, m=32, ef_construction=200, ef_search=64):
+        super().__init__()
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+    def _build(self, dim):
+        index = faiss.IndexHNSWFlat(dim, self.m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = self.ef_construction
+        return index
+
+    def _search(self, queries, k):
+        self.index.hnsw.efSearch = max(self.ef_search, k)
+        return self.index.search(queries, k)
+
+
+class IVFPQIndex(FaissIndex):
+    """
+    Approximate search with an inverted file of product-quantised vectors.
+
+    IVF-PQ must be trained before vectors can be added. Until train_size
+    vectors have arrived they are held in an exact VectorStore; the index
+    is then trained on them and takes over. nprobe is the number of
+    inverted lists searched per query and can be changed between searches.
+    Search scores are approximate (computed on the PQ codes), and so are
+    score_ids() scores once the index is trained.
+    """
+
+    def __init__(self, nlist=256, nprobe=16, pq_m=None, nbits=8, train_size=None):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.nbits = nbits
+        # k-means wants roughly 39 training points per centroid (coarse and PQ)
+        self.train_size = train_size or 39 * max(nlist, 2**nbits)
+        self._pending = VectorStore()
+        self._direct_map = False
+
+    def _build(self, dim):
+        pq_m = self.pq_m or self._subquantizers(dim)
+        quantizer = faiss.IndexFlatIP(dim)
+        return faiss.IndexIVFPQ(
+            quantizer, dim, self.nlist, pq_m, self.nbits, faiss.METRIC_INNER_PRODUCT
+        )
+
+    def _add(self, vectors):
+        if self.index.is_trained:
+            self.index.add(vectors)
+            return
+        # Rows are already normalised; the pending store's row ids match faiss ids
+        self._pending.add_embedding(vectors[0], len(self._doc_ids))
+        if len(self._pending) >= self.train_size:
+            training = np.ascontiguousarray(self._pending.vectors)
+            self.index.train(training)
+            self.index.add(training)
+            self._pending = None
+            self._generation += 1
+
+    def _search(self, queries, k):
+        if not self.index.is_trained:
+            # Exact search over the pending vectors until the index is trained
+            results = self._pending.search_batch(queries, k)
+            scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+            ids = np.full((len(queries), k), -1, dtype=np.int64)
+            for row, result in enumerate(results):
+                for column, (faiss_id, score) in enumerate(result):
+                    ids[row, column] = faiss_id
+                    scores[row, column] = score
+            return scores, ids
+        self.index.nprobe = self.nprobe
+        return self.index.search(queries, k)
+
+    def _reconstruct(self, ids):
+        if not self.index.is_trained:
+            return self._pending.vectors[ids]
+        if not self._direct_map:
+            # IVF lists are not addressable by id until a direct map is built
+            self.index.make_direct_map()
+            self._direct_map = True
+        return super()._reconstruct(ids)
+
+    def _compaction_source(self, keep):
+        if not self.index.is_trained:
+            return self._pending.vectors[keep]
+        # Copy the kept rows' PQ codes: re-encoding their decoded vectors
+        # could move some of them to other inverted lists
+        index = faiss.clone_index(self.index)
+        index.reset()
+        self._copy_codes(index, keep, 0)
+        return index
+
+    def _rebuilt(self, source):
+        if not isinstance(source, np.ndarray):
+            return source
+        pending = VectorStore()
+        for i, vector in enumerate(source):
+            pending.add_embedding(vector, i)
+        return pending
+
+    def _install(self, rebuilt, kept, old):
+        if isinstance(rebuilt, VectorStore):
+            for i in range(kept, len(old)):
+                rebuilt.add_embedding(self._pending.vectors[old[i]], i)
+            self._pending = rebuilt
+            return
+        self._copy_codes(rebuilt, old[kept:], kept)
+        self.index = rebuilt
+        self._direct_map = False
+
+    def _copy_codes(self, target, ids, start):
+        # Append the stored codes of rows ids to target as ids start, start + 1, ...
+        if not len(ids):
+            return
+        lists = self.index.invlists
+        renumbered = np.full(len(self._doc_ids), -1, dtype=np.int64)
+        renumbered[ids] = np.arange(start, start + len(ids))
+        for list_no in range(self.index.nlist):
+            size = lists.list_size(list_no)
+            if not size:
+                continue
+            list_ids = faiss.rev_swig_ptr(lists.get_ids(list_no), size)
+            codes = faiss.rev_swig_ptr(
+                lists.get_codes(list_no), size * lists.code_size
+            ).reshape(size, lists.code_size)
+            new_ids = renumbered[list_ids]
+            wanted = new_ids >= 0
+            if wanted.any():
+                new_ids = np.ascontiguousarray(new_ids[wanted])
+                codes = np.ascontiguousarray(codes[wanted])
+                target.invlists.add_entries(
+                    list_no,
+                    len(new_ids),
+                    faiss.swig_ptr(new_ids),
+                    faiss.swig_ptr(codes),
+                )
+        target.ntotal += len(ids)
+
+    @staticmethod
+    def _subquantizers(dim):
+        # Most sub-quantizers (up to 64) that split dim into chunks of 4+ dimensions
+        for pq_m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+            if dim % pq_m == 0 and dim // pq_m >= 4:
+                return pq_m
+        return 1
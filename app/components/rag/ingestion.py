@@ -0,0 +1,331 @@
+"""Ingestion: a streaming split -> embed -> index pipeline and a background worker queue."""
+
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+_DONE = object()  # end-of-stream marker passed down the queues
+
+
+class StageMetrics:
+    """Items processed, busy time and time blocked on a full downstream queue."""
+
+    __slots__ = ("name", "items", "busy", "blocked")
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+
+    def as_dict(self):
+        return {
+            "items": self.items,
+            "busy_s": self.busy,
+            "blocked_s": self.blocked,
+            "items_per_s": self.items / self.busy if self.busy else 0.0,
+        }
+
+
+class _StageError:
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+
+class IngestionPipeline:
+    """
+    Streaming split -> embed -> index ingestion for a RAGEngine.
+
+    Splitting and embedding each run in their own thread; indexing runs in
+    the consumer of run(), which yields every chunk once it is indexed. The
+    stages are connected by bounded queues, so a slow stage blocks the ones
+    before it (backpressure) and only about queue_size batches of chunks and
+    embeddings are in memory at once, however large the documents are.
+    Chunks the index already holds are passed through without being
+    embedded, and the embedder encodes batch_size chunks per call.
+    """
+
+    def __init__(self, rag_engine, batch_size=32, queue_size=4):
+        self.logger = logging.getLogger(__name__)
+        self.rag_engine = rag_engine
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    def run(self, documents, namespace=None, ttl=None, metadata=None, metrics=None):
+        """
+        Ingest documents, yielding {"id", "content", "known"} for each chunk as it is indexed.
+
+        When the run ends, metrics (a dict, if given) receives this run's
+        per-stage metrics, so concurrent runs do not overwrite each other's.
+        """
+        if hasattr(documents, "page_content"):
+            documents = [documents]
+        stages = {name: StageMetrics(name) for name in ("split", "embed", "index")}
+        stop = threading.Event()
+        chunks = queue.Queue(maxsize=self.batch_size * self.queue_size)
+        batches = queue.Queue(maxsize=self.queue_size)
+        workers = [
+            threading.Thread(
+                target=self._split,
+                args=(documents, namespace, chunks, stages["split"], stop),
+                name="ingest-split",
+                daemon=True,
+            ),
+            threading.Thread(
+                target=self._embed,
+                args=(chunks, batches, stages["embed"], stop),
+                name="ingest-embed",
+                daemon=True,
+            ),
+        ]
+        for worker in workers:
+            worker.start()
+        stage = stages["index"]
+        try:
+            while True:
+                batch = batches.get()
+                if batch is _DONE:
+                    break
+                if isinstance(batch, _StageError):
+                    raise batch.error
+                start = time.perf_counter()
+                for embedding_obj in batch:
+                    self.rag_engine.index_chunk(embedding_obj, namespace, ttl, metadata)
+                    # Drop the embedding once indexed so consumers do not hold it
+                    del embedding_obj["embedding"]
+                stage.items += len(batch)
+                stage.busy += time.perf_counter() - start
+                yield from batch
+        finally:
+            # Also reached when the consumer stops early: unblock the workers
+            stop.set()
+            for worker in workers:
+                worker.join()
+            report = {name: stage.as_dict() for name, stage in stages.items()}
+            if metrics is not None:
+                metrics.update(report)
+            self.logger.debug(f"Ingestion stages: {report}")
+
+    def _split(self, documents, namespace, chunks, stage, stop):
+        try:
+            seen = set()
+            start = time.perf_counter()
+            for document in documents:
+                for content in self.rag_engine.text_splitter.split_text(
+                    document.page_content
+                ):
+                    chunk_id = self.rag_engine.chunk_id(content, namespace)
+                    if chunk_id in seen:
+                        continue
+                    seen.add(chunk_id)
+                    embedding_obj = {
+                        "id": chunk_id,
+                        "content": content,
+                        "known": chunk_id in self.rag_engine.vector_store,
+                        "embedding": None,
+                    }
+                    stage.items += 1
+                    stage.busy += time.perf_counter() - start
+                    if not self._put(chunks, embedding_obj, stage, stop):
+                        return
+                    start = time.perf_counter()
+            self._put(chunks, _DONE, stage, stop)
+        except Exception as error:
+            self._put(chunks, _StageError(error), stage, stop)
+
+    def _embed(self, chunks, batches, stage, stop):
+        try:
+            done = False
+            while not done:
+                batch = []
+                while len(batch) < self.batch_size:
+                    embedding_obj = self._get(chunks, stop)
+                    if embedding_obj is None:
+                        return
+                    if embedding_obj is _DONE:
+                        done = True
+                        break
+                    if isinstance(embedding_obj, _StageError):
+                        self._put(batches, embedding_obj, stage, stop)
+                        return
+                    batch.append(embedding_obj)
+                if batch:
+                    start = time.perf_counter()
+                    new = [obj for obj in batch if not obj["known"]]
+                    if new:
+                        embeddings = self._encode([obj["content"] for obj in new])
+                        for obj, embedding in zip(new, embeddings):
+                            obj["embedding"] = embedding
+                    stage.items += len(new)
+                    stage.busy += time.perf_counter() - start
+                    if not self._put(batches, batch, stage, stop):
+                        return
+            self._put(batches, _DONE, stage, stop)
+        except Exception as error:
+            self._put(batches, _StageError(error), stage, stop)
+
+    def _encode(self, texts):
+        embedding_model = self.rag_engine.embedding_model
+        if hasattr(embedding_model, "encode_batch"):
+            return embedding_model.encode_batch(texts, batch_size=self.batch_size)
+        return np.stack([embedding_model.encode(text) for text in texts])
+
+    @staticmethod
+    def _get(source, stop):
+        # None if the run was stopped while waiting
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    @staticmethod
+    def _put(target, item, stage, stop):
+        # Blocks while the downstream queue is full; False if the run was stopped
+        start = time.perf_counter()
+        try:
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            stage.blocked += time.perf_counter() - start
+
+
+class _Sequence:
+    """Sequence numbers of one namespace: the last issued and the watermark."""
+
+    __slots__ = ("next_seq", "watermark", "completed", "failures", "failed")
+
+    def __init__(self):
+        self.next_seq = 0
+        self.watermark = 0
+        self.completed = set()  # finished sequence numbers above the watermark
+        self.failures = {}  # sequence number -> exception, the latest few only
+        self.failed = set()  # older failed sequence numbers, without their exception
+
+
+class IngestionWorker:
+    """
+    Background ingestion with sequence numbers for read-your-writes.
+
+    submit() queues documents and returns at once with a sequence number;
+    worker threads run them through the ingestion pipeline. Sequence
+    numbers count per namespace, and a namespace's watermark is the highest
+    sequence number N such that every submission to it up to N has been
+    indexed (or has failed). A reader that needs its own upload calls
+    wait_for(N, namespace=...), which an upload to another namespace never
+    delays, and everyone else reads without waiting. At most max_pending
+    submissions are queued; submit() blocks beyond that. Each namespace
+    keeps the exceptions of its last max_failures failed submissions (their
+    tracebacks can hold whole documents); older failures are still reported,
+    without their cause.
+    """
+
+    def __init__(self, rag_engine, workers=1, max_pending=64, max_failures=16):
+        self.logger = logging.getLogger(__name__)
+        self.rag_engine = rag_engine
+        self.max_failures = max_failures
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._condition = threading.Condition()
+        self._sequences = {}  # namespace -> _Sequence
+        self._workers = [
+            threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def watermark(self, namespace=None):
+        with self._condition:
+            sequence = self._sequences.get(namespace)
+            return sequence.watermark if sequence is not None else 0
+
+    def issued(self, namespace=None):
+        """Highest sequence number handed out for namespace so far."""
+        with self._condition:
+            sequence = self._sequences.get(namespace)
+            return sequence.next_seq if sequence is not None else 0
+
+    def pending(self):
+        with self._condition:
+            return sum(s.next_seq - s.watermark for s in self._sequences.values())
+
+    def submit(self, documents, namespace=None, ttl=None, metadata=None):
+        """Queue documents for ingestion; returns their sequence number in namespace."""
+        with self._condition:
+            sequence = self._sequences.setdefault(namespace, _Sequence())
+            sequence.next_seq += 1
+            seq = sequence.next_seq
+        self._jobs.put((seq, documents, namespace, ttl, metadata))
+        return seq
+
+    def wait_for(self, seq, timeout=None, namespace=None):
+        """Block until submission seq to namespace is indexed; False on timeout."""
+        with self._condition:
+            sequence = self._sequences.setdefault(namespace, _Sequence())
+            if seq > sequence.next_seq:
+                raise ValueError(
+                    f"Ingestion {seq} was never submitted to namespace {namespace!r}"
+                )
+            if not self._condition.wait_for(
+                lambda: sequence.watermark >= seq, timeout=timeout
+            ):
+                return False
+            error = sequence.failures.get(seq)
+            failed = seq in sequence.failed
+        if error is not None:
+            raise RuntimeError(f"Ingestion {seq} failed: {error}") from error
+        if failed:
+            raise RuntimeError(f"Ingestion {seq} failed")
+        return True
+
+    def close(self, timeout=None):
+        """Finish the queued submissions and stop the workers."""
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            seq, documents, namespace, ttl, metadata = job
+            error = None
+            try:
+                for _ in self.rag_engine.ingest_stream(
+                    documents, namespace, ttl, metadata
+                ):
+                    pass
+            except Exception as e:
+                error = e
+                self.logger.error(f"Ingestion {seq} failed: {e}")
+            self._complete(seq, namespace, error)
+
+    def _complete(self, seq, namespace, error):
+        with self._condition:
+            sequence = self._sequences[namespace]
+            if error is not None:
+                sequence.failures[seq] = error
+                if len(sequence.failures) > self.max_failures:
+                    oldest = next(iter(sequence.failures))
+                    del sequence.failures[oldest]
+                    sequence.failed.add(oldest)
+            sequence.completed.add(seq)
+            # Submissions finish out of order with several workers: advance
+            # the watermark over the contiguous run of finished ones
+            while sequence.watermark + 1 in sequence.completed:
+                sequence.watermark += 1
+                sequence.completed.remove(sequence.watermark)
+            self._condition.notify_all()
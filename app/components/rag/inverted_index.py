@@ -0,0 +1,207 @@
+"""In-memory inverted index with BM25 scoring, for lexical candidate generation."""
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+TOKEN = re.compile(r"\w+")
+
+
+class InvertedIndex:
+    """
+    Term -> {doc_id: term frequency} postings, updated one chunk at a time.
+
+    Tokens are lower-cased word characters, so anonymised placeholders such
+    as PERSON_3fa9 stay single tokens and match exactly. Scores are BM25
+    (k1, b); document frequencies and lengths are kept incrementally, so
+    adds and removes are O(terms in the chunk) and a query only touches the
+    postings of its own terms.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # term -> {doc_id: term frequency}
+        self._terms = {}  # doc_id -> Counter of its terms
+        self._lengths = {}  # doc_id -> number of tokens
+        self._namespaces = {}  # doc_id -> namespace
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._terms)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._terms
+
+    @staticmethod
+    def tokenize(text):
+        return TOKEN.findall(text.lower())
+
+    def add(self, doc_id, text, namespace=None):
+        terms = Counter(self.tokenize(text))
+        with self._lock:
+            self._add(doc_id, terms, namespace)
+
+    def remove(self, doc_id):
+        with self._lock:
+            return self._remove(doc_id)
+
+    def remove_namespace(self, namespace):
+        with self._lock:
+            return self._remove_namespace(namespace)
+
+    def search(self, query, k=50, namespace=None):
+        """Return up to k (doc_id, BM25 score) pairs, best first."""
+        terms = set(self.tokenize(query))
+        with self._lock:
+            n = len(self._terms)
+            if not n:
+                return []
+            average_length = self._total_length / n
+            scores = Counter()
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if namespace is not None and self._namespaces[doc_id] != namespace:
+                        continue
+                    length = self._lengths[doc_id] / average_length
+                    norm = self.k1 * (1 - self.b + self.b * length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+    def _add(self, doc_id, terms, namespace):
+        self._remove(doc_id)
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        self._terms[doc_id] = terms
+        self._lengths[doc_id] = sum(terms.values())
+        self._namespaces[doc_id] = namespace
+        self._total_length += self._lengths[doc_id]
+
+    def _remove_namespace(self, namespace):
+        doc_ids = [d for d, ns in self._namespaces.items() if ns == namespace]
+        for doc_id in doc_ids:
+            self._remove(doc_id)
+        return len(doc_ids)
+
+    def _remove(self, doc_id):
+        terms = self._terms.pop(doc_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        del self._namespaces[doc_id]
+        self._total_length -= self._lengths.pop(doc_id)
+        return True
+
+
+class PersistentInvertedIndex(InvertedIndex):
+    """
+    InvertedIndex that survives restarts, for a persistent vector store.
+
+    Every add and remove is appended to a JSON-lines log at path (the terms
+    of an added chunk, not its text) and the log is replayed on start. Once
+    the log holds more than twice as many records as there are chunks
+    (and at least compact_min), it is rewritten with one record per chunk.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75, fsync=False, compact_min=10000):
+        super().__init__(k1=k1, b=b)
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.fsync = fsync
+        self.compact_min = compact_min
+        self._records = 0
+        self._replay()
+        self._log = open(path, "ab")
+
+    def add(self, doc_id, text, namespace=None):
+        terms = Counter(self.tokenize(text))
+        with self._lock:
+            self._add(doc_id, terms, namespace)
+            self._append({"id": doc_id, "namespace": namespace, "terms": terms})
+
+    def remove(self, doc_id):
+        with self._lock:
+            removed = self._remove(doc_id)
+            if removed:
+                self._append({"remove": doc_id})
+            return removed
+
+    def remove_namespace(self, namespace):
+        with self._lock:
+            removed = self._remove_namespace(namespace)
+            if removed:
+                self._append({"remove_namespace": namespace})
+            return removed
+
+    def close(self):
+        with self._lock:
+            self._log.close()
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if record is None or not line.endswith(b"\n"):
+                    # Crash mid-append: drop the partial record
+                    self.logger.warning(
+                        f"Truncating torn record at {self.path}:{offset}"
+                    )
+                    os.truncate(self.path, offset)
+                    break
+                if "remove" in record:
+                    self._remove(record["remove"])
+                elif "remove_namespace" in record:
+                    self._remove_namespace(record["remove_namespace"])
+                else:
+                    self._add(
+                        record["id"], Counter(record["terms"]), record["namespace"]
+                    )
+                offset += len(line)
+                self._records += 1
+
+    def _append(self, record):
+        # Caller holds _lock and has applied the record
+        self._log.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._records += 1
+        if self._records > max(self.compact_min, 2 * len(self._terms)):
+            self._compact()
+
+    def _compact(self):
+        # Rewrite the log as one add per chunk and switch to it atomically
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for doc_id, terms in self._terms.items():
+                record = {
+                    "id": doc_id,
+                    "namespace": self._namespaces[doc_id],
+                    "terms": terms,
+                }
+                f.write(json.dumps(record).encode("utf-8") + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._log.close()
+        os.replace(tmp_path, self.path)
+        self._log = open(self.path, "ab")
+        self._records = len(self._terms)
@@ -0,0 +1,447 @@
+"""Disk-backed VectorStore: memory-mapped snapshots plus an append log."""
+
+import contextlib
+import json
+import logging
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+
+import numpy as np
+
+from .vector_store import CODE_CHUNK_ROWS, ScalarQuantizer, VectorStore
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOT_DIR = "snapshot-{:06d}"
+LOG_FILE = "append-{:06d}.log"
+LOG_PATTERN = re.compile(r"append-(\d{6})\.log$")
+# Log record header: kind, JSON payload byte length, vector dimension, expiry time.
+# The payload holds the doc id, namespace and metadata of the record.
+RECORD_HEADER = struct.Struct("<BIId")
+ADD_RECORD = 1
+DELETE_RECORD = 2
+DELETE_NAMESPACE_RECORD = 3
+REFRESH_RECORD = 4
+
+
+class PersistentVectorStore(VectorStore):
+    """
+    VectorStore that survives restarts.
+
+    Layout under path:
+
+        CURRENT                   name of the active snapshot (atomically replaced)
+        snapshot-N/vectors.npy    float32 rows, memory-mapped read-only on restore
+        snapshot-N/meta.json      doc ids (row order), namespace and metadata values
+        snapshot-N/rows.npz       per-row namespace/metadata codes and expiry times
+        snapshot-N/codes.npy      int8 row codes and quantizer (quantize=True only)
+        append-N.log              adds, deletes and TTL refreshes since snapshot N
+
+    Restore maps the snapshot's vectors without reading them, so boot is
+    fast and workers restoring the same snapshot share its pages through the
+    page cache. Each add or delete is appended to the log before it is
+    acknowledged; snapshot() writes the live rows as a new snapshot and
+    switches CURRENT only once its files are complete and fsynced, so
+    compaction is a snapshot followed by a restore, which swaps in the new
+    snapshot and the records logged since it in one step. The log is folded into
+    a snapshot in a background thread once it holds snapshot_every records
+    or as many records as the last snapshot has rows, whichever is more,
+    so the rows rewritten by snapshots stay linear in the rows added. Only
+    one process may write to a path; others can open it with read_only=True.
+    """
+
+    def __init__(
+        self,
+        path,
+        read_only=False,
+        fsync=False,
+        snapshot_every=10000,
+        initial_capacity=1024,
+        shards=None,
+        quantize=False,
+        rescore_factor=4,
+    ):
+        super().__init__(
+            initial_capacity=initial_capacity,
+            shards=shards,
+            quantize=quantize,
+            rescore_factor=rescore_factor,
+        )
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.read_only = read_only
+        self.fsync = fsync
+        # Fold the log into a new snapshot after at least this many appended rows (None = never)
+        self.snapshot_every = snapshot_every
+        self._version = 0
+        self._log = None
+        self._log_records = 0
+        self._snapshot_rows = 0  # rows in the current snapshot
+        self._snapshotter = None
+        self._write_lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.restore()
+
+    def add_embedding(self, embedding, doc_id, namespace=None, ttl=None, metadata=None):
+        vector = self.normalise(embedding)
+        expires_at = time.time() + ttl if ttl else np.inf
+        with self._write_lock:
+            # A record that cannot be applied must not reach the log
+            self._check_dim(vector.shape[0])
+            self._append(ADD_RECORD, doc_id, namespace, metadata, vector, expires_at)
+            with self._lock:
+                self._add(vector, doc_id, namespace, expires_at, metadata)
+            if self.snapshot_every and self._log_records >= max(
+                self.snapshot_every, self._snapshot_rows
+            ):
+                self._snapshot_in_background()
+
+    def refresh(self, doc_id, ttl=None):
+        expires_at = time.time() + ttl if ttl else np.inf
+        with self._write_lock:
+            if doc_id not in self._rows:
+                return False
+            self._append(REFRESH_RECORD, doc_id, expires_at=expires_at)
+            with self._lock:
+                return self._refresh(doc_id, expires_at)
+
+    def delete(self, doc_id):
+        with self._write_lock:
+            self._append(DELETE_RECORD, doc_id)
+            return super().delete(doc_id)
+
+    def delete_namespace(self, namespace):
+        with self._write_lock:
+            self._append(DELETE_NAMESPACE_RECORD, namespace=namespace)
+            return super().delete_namespace(namespace)
+
+    def compact(self):
+        """Drop tombstoned rows by writing a snapshot of the live rows and mapping it."""
+        if self.read_only:
+            return super().compact()
+        self.expire()
+        dropped = self._dead
+        if dropped:
+            with self._snapshot_lock:
+                self._snapshot()
+                self._restore()
+        return dropped
+
+    def snapshot(self):
+        """Write the current rows as a new snapshot and make it current."""
+        if self.read_only:
+            raise PermissionError(f"Vector store at {self.path} was opened read-only")
+        with self._snapshot_lock:
+            return self._snapshot()
+
+    def _snapshot_in_background(self):
+        # Caller holds _write_lock; at most one background snapshot at a time
+        if self._snapshotter is not None and self._snapshotter.is_alive():
+            return
+
+        def run():
+            try:
+                self.snapshot()
+            except Exception as e:
+                self.logger.error(f"Vector store snapshot failed: {e}")
+
+        self._snapshotter = threading.Thread(
+            target=run, name="vector-store-snapshot", daemon=True
+        )
+        self._snapshotter.start()
+
+    def _snapshot(self):
+        with self._write_lock, self._lock:
+            # Rows below _size are never written again, so the blocks can be
+            # read after the lock is released without copying them here
+            keep = np.flatnonzero(self._live[: self._size])
+            blocks = self._blocks()
+            dim = self.dim
+            doc_ids = [self._doc_ids[row] for row in keep]
+            namespaces = [
+                self._namespace_names[code] for code in self._namespace_codes[keep]
+            ]
+            expires = self._expires[keep]
+            metadata = [self._row_metadata(row) for row in keep]
+            quantizer = self._quantizer
+            if quantizer is not None:
+                codes = self._codes[keep]
+            version = self._version + 1
+            # Rows added from here on go to the new snapshot's log; restore
+            # replays every log from the current snapshot onwards
+            self._open_log(version)
+            self._log_records = 0
+
+        snapshot_dir = os.path.join(self.path, SNAPSHOT_DIR.format(version))
+        tmp_dir = f"{snapshot_dir}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        names, namespace_codes = self._encode(namespaces)
+        fields = {}
+        for field in {field for row in metadata for field in row}:
+            fields[field] = self._encode([row.get(field) for row in metadata])
+        self._write_vectors(os.path.join(tmp_dir, "vectors.npy"), blocks, keep, dim)
+        if quantizer is not None:
+            with self._create(tmp_dir, "codes.npy") as f:
+                np.save(f, codes)
+            with self._create(tmp_dir, "quantizer.npz") as f:
+                np.savez(f, scale=quantizer.scale, offset=quantizer.offset)
+        with self._create(tmp_dir, "rows.npz") as f:
+            np.savez(
+                f,
+                namespace_codes=namespace_codes,
+                expires=expires,
+                **{f"field:{field}": codes for field, (_, codes) in fields.items()},
+            )
+        with self._create(tmp_dir, "meta.json") as f:
+            f.write(
+                json.dumps(
+                    {
+                        "dim": dim,
+                        "count": len(doc_ids),
+                        "doc_ids": doc_ids,
+                        "namespaces": names,
+                        "fields": {
+                            field: values for field, (values, _) in fields.items()
+                        },
+                    }
+                ).encode("utf-8")
+            )
+        self._fsync_dir(tmp_dir)
+        os.replace(tmp_dir, snapshot_dir)
+        self._write_pointer(SNAPSHOT_DIR.format(version))
+
+        previous = self._version
+        self._version = version
+        self._snapshot_rows = len(doc_ids)
+        self._remove_older_than(version, previous)
+        self.logger.info(
+            f"Vector store snapshot {version} written: {len(doc_ids)} rows"
+        )
+        return version
+
+    def restore(self):
+        """Load the current snapshot (memory-mapped) and replay the append logs."""
+        # A snapshot in progress would switch CURRENT and delete the files read here
+        with self._snapshot_lock:
+            return self._restore()
+
+    def _restore(self):
+        version, base, doc_ids = 0, np.empty((0, 0), dtype=np.float32), []
+        namespaces = expires = fields = codes = quantizer = None
+        pointer = os.path.join(self.path, CURRENT_FILE)
+        if os.path.exists(pointer):
+            with open(pointer, encoding="utf-8") as f:
+                name = f.read().strip()
+            version = int(name.rsplit("-", 1)[1])
+            snapshot_dir = os.path.join(self.path, name)
+            with open(os.path.join(snapshot_dir, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            doc_ids = meta["doc_ids"]
+            if meta["count"]:
+                base = np.load(os.path.join(snapshot_dir, "vectors.npy"), mmap_mode="r")
+                with np.load(os.path.join(snapshot_dir, "rows.npz")) as rows:
+                    namespaces = [
+                        meta["namespaces"][c] for c in rows["namespace_codes"]
+                    ]
+                    expires = rows["expires"]
+                    fields = {
+                        field: (rows[f"field:{field}"], values)
+                        for field, values in meta.get("fields", {}).items()
+                    }
+                # The codes are the hot part of a quantized store: read them into RAM
+                codes_path = os.path.join(snapshot_dir, "codes.npy")
+                if self.quantize and os.path.exists(codes_path):
+                    codes = np.load(codes_path)
+                    with np.load(os.path.join(snapshot_dir, "quantizer.npz")) as q:
+                        quantizer = ScalarQuantizer(q["scale"], q["offset"])
+
+        with self._write_lock:
+            records = []
+            for log_version in self._log_versions():
+                if log_version >= version:
+                    records += self._read_log(
+                        os.path.join(self.path, LOG_FILE.format(log_version))
+                    )
+            # The snapshot and the records logged since are swapped in together,
+            # so concurrent searches never miss an acknowledged row
+            with self._lock:
+                self._load(base, doc_ids, namespaces, expires, fields, codes, quantizer)
+                for record in records:
+                    self._apply(*record)
+            self._version = version
+            self._snapshot_rows = len(doc_ids)
+            replayed = len(records)
+            self._log_records = replayed
+            if not self.read_only:
+                self._open_log(max([version] + self._log_versions()))
+        self.logger.info(
+            f"Vector store restored from snapshot {version}: {len(self)} rows ({replayed} from log)"
+        )
+
+    def close(self):
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        with self._write_lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def _read_log(self, log_path):
+        # (kind, payload, vector, expiry time) of every complete record in the log
+        records = []
+        with open(log_path, "rb") as f:
+            while True:
+                offset = f.tell()
+                header = f.read(RECORD_HEADER.size)
+                if not header:
+                    break
+                torn = len(header) < RECORD_HEADER.size
+                if not torn:
+                    kind, payload_length, dim, expires_at = RECORD_HEADER.unpack(header)
+                    payload = f.read(payload_length)
+                    data = f.read(4 * dim)
+                    torn = len(payload) < payload_length or len(data) < 4 * dim
+                if torn:
+                    # Crash mid-append: the record was never acknowledged, drop it so
+                    # later appends do not land behind a partial record
+                    self.logger.warning(
+                        f"Truncating torn record at {log_path}:{offset}"
+                    )
+                    if not self.read_only:
+                        os.truncate(log_path, offset)
+                    break
+                records.append(
+                    (
+                        kind,
+                        json.loads(payload),
+                        np.frombuffer(data, dtype=np.float32),
+                        expires_at,
+                    )
+                )
+        return records
+
+    def _apply(self, kind, payload, vector, expires_at):
+        # Replay one logged record without logging it again; caller holds _lock
+        if kind == ADD_RECORD:
+            self._add(
+                vector,
+                payload["id"],
+                payload.get("namespace"),
+                expires_at,
+                payload.get("metadata"),
+            )
+        elif kind == DELETE_RECORD:
+            self._delete(payload["id"])
+        elif kind == REFRESH_RECORD:
+            self._refresh(payload["id"], expires_at)
+        elif kind == DELETE_NAMESPACE_RECORD:
+            self._delete_namespace(payload.get("namespace"))
+
+    def _append(
+        self,
+        kind,
+        doc_id=None,
+        namespace=None,
+        metadata=None,
+        vector=None,
+        expires_at=np.inf,
+    ):
+        # Caller holds _write_lock
+        if self.read_only:
+            raise PermissionError(f"Vector store at {self.path} was opened read-only")
+        # The namespace is always written: None is a namespace too
+        payload = {"id": doc_id, "namespace": namespace}
+        if metadata:
+            payload["metadata"] = metadata
+        payload = json.dumps(payload).encode("utf-8")
+        data = vector.tobytes() if vector is not None else b""
+        self._log.write(
+            RECORD_HEADER.pack(kind, len(payload), len(data) // 4, expires_at)
+        )
+        self._log.write(payload + data)
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._log_records += 1
+
+    def _open_log(self, version):
+        if self._log is not None:
+            self._log.close()
+        self._log = open(os.path.join(self.path, LOG_FILE.format(version)), "ab")
+
+    def _log_versions(self):
+        return sorted(
+            int(match.group(1))
+            for match in map(LOG_PATTERN.match, os.listdir(self.path))
+            if match
+        )
+
+    @staticmethod
+    def _write_vectors(path, blocks, rows, dim):
+        # Copy the given rows into a new .npy a chunk at a time, so a snapshot
+        # of a memory-mapped store never holds every vector in memory at once
+        out = np.lib.format.open_memmap(
+            path, mode="w+", dtype=np.float32, shape=(len(rows), dim or 0)
+        )
+        written = offset = 0
+        for block in blocks:
+            block_rows = rows[(rows >= offset) & (rows < offset + len(block))] - offset
+            for start in range(0, len(block_rows), CODE_CHUNK_ROWS):
+                chunk = block[block_rows[start : start + CODE_CHUNK_ROWS]]
+                out[written : written + len(chunk)] = chunk
+                written += len(chunk)
+            offset += len(block)
+        out.flush()
+        del out
+        with open(path, "rb+") as f:
+            os.fsync(f.fileno())
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _create(directory, name):
+        # New binary file that is flushed and fsynced once written
+        with open(os.path.join(directory, name), "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_pointer(self, name):
+        tmp_path = os.path.join(self.path, f"{CURRENT_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, CURRENT_FILE))
+        self._fsync_dir(self.path)
+
+    def _remove_older_than(self, version, previous):
+        # Readers that still map an old snapshot keep their pages until they unmap
+        for old in range(previous, version):
+            shutil.rmtree(
+                os.path.join(self.path, SNAPSHOT_DIR.format(old)), ignore_errors=True
+            )
+            try:
+                os.remove(os.path.join(self.path, LOG_FILE.format(old)))
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _encode(values):
+        # Dictionary-encode a column: (distinct values, int32 code per row).
+        # None always takes code 0, matching FieldIndex
+        distinct = list(dict.fromkeys([None, *values]))
+        codes = {value: code for code, value in enumerate(distinct)}
+        return distinct, np.array([codes[value] for value in values], dtype=np.int32)
+
+    @staticmethod
+    def _fsync_dir(path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
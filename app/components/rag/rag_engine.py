@@ -1,4 +1,4 @@
-import uuid
+import hashlib
 from typing import Annotated, Any
 
 from langchain import hub
@@ -14,6 +14,11 @@ from langgraph.graph import END, START, MessagesState, StateGraph
 from langgraph.prebuilt import ToolNode, create_react_agent, tools_condition
 from typing_extensions import List, TypedDict
 
+from .ingestion import IngestionPipeline, IngestionWorker
+from .inverted_index import InvertedIndex
+from .query_cache import LRUCache
+from .vector_store import VectorStore
+
 
 # Define state for application
 class State(TypedDict):
@@ -23,28 +28,25 @@ class State(TypedDict):
     messages: List[Any]
 
 
-class VectorStore:
-    def __init__(self):
-        self.vectors = []
-        self.doc_ids = []
-
-    def add_embedding(self, embedding, doc_id):
-        self.vectors.append(embedding)
-        self.doc_ids.append(doc_id)
-
-    def similarity_search_by_embedding(self, query_embedding, top_k=2):
-        # simple cosine similarity
-        import numpy as np
-
-        vecs = np.array(self.vectors)
-        query = np.array(query_embedding)
-        sims = vecs @ query / (np.linalg.norm(vecs, axis=1) * np.linalg.norm(query))
-        top_indices = np.argsort(-sims)[:top_k]
-        return [self.doc_ids[i] for i in top_indices]
-
-
 class RAGEngine:
-    def __init__(self, embedding_model, llm):
+    def __init__(
+        self,
+        embedding_model,
+        llm,
+        top_k=2,
+        min_score=None,
+        vector_index=None,
+        ttl=None,
+        retrieval_mode="vector",
+        hybrid_alpha=0.5,
+        hybrid_candidates=50,
+        ingest_batch_size=32,
+        ingest_queue_size=4,
+        query_cache_size=1024,
+        ingest_workers=1,
+        lexical_index=None,
+        ingest_wait_timeout=30.0,
+    ):
         # self.llm = llm
         # self.memory = MemorySaver()
         # self.tools = self.initialize_tools()
@@ -52,12 +54,43 @@ class RAGEngine:
         # self.agent_llm = create_react_agent(llm, self.tools, checkpointer=self.memory)
         # self.prompt_template = hub.pull("rlm/rag-prompt")
         self.embedding_model = embedding_model
-        self.vector_store = VectorStore()
+        # Any VectorIndex backend (numpy brute force or FAISS); see create_vector_index
+        self.vector_store = vector_index if vector_index is not None else VectorStore()
+        # Default number of chunks retrieved and minimum cosine similarity to keep one
+        self.top_k = top_k
+        self.min_score = min_score
+        # Default lifetime in seconds of stored chunks (None = until deleted)
+        self.ttl = ttl
+        if retrieval_mode not in ("vector", "hybrid"):
+            raise ValueError(f"Unsupported retrieval mode: {retrieval_mode}")
+        # "hybrid": BM25 shortlist of hybrid_candidates chunks, rescored by vector and
+        # fused as hybrid_alpha * cosine + (1 - hybrid_alpha) * normalised BM25
+        self.retrieval_mode = retrieval_mode
+        self.hybrid_alpha = hybrid_alpha
+        self.hybrid_candidates = hybrid_candidates
+        # Pass a PersistentInvertedIndex with a persistent vector index, or
+        # hybrid retrieval loses its lexical candidates on restart
+        self.lexical_index = (
+            lexical_index if lexical_index is not None else InvertedIndex()
+        )
+        # query hash -> embedding, and (query hash, namespace, index version, ...) -> ids
+        self.embedding_cache = LRUCache(query_cache_size)
+        self.result_cache = LRUCache(query_cache_size)
         # self.vector_store = InMemoryVectorStore(embedding_model)
         # self.vector_store = None
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=500, chunk_overlap=50
         )
+        # Streaming split -> batch embed -> index; see ingest_stream
+        self.ingestion = IngestionPipeline(
+            self, batch_size=ingest_batch_size, queue_size=ingest_queue_size
+        )
+        # Background ingestion (see ingest_async); 0 workers = ingest in the caller
+        self.ingestion_worker = (
+            IngestionWorker(self, workers=ingest_workers) if ingest_workers else None
+        )
+        # Longest a retrieval waits in seconds for the upload passed as min_seq
+        self.ingest_wait_timeout = ingest_wait_timeout
         # self.graph = self.initialize_graph()
 
     # # Initialise graph with nodes and edges
@@ -101,18 +134,53 @@ class RAGEngine:
     def text_to_document(self, text):
         return Document(page_content=text, metadata={"source": "user_input"})
 
-    # Split documents
-    def generate_key_and_embeddings(self, documents):
-        all_splits = self.text_splitter.split_documents(documents)
-        result_list = []
-        for doc in all_splits:
-            embedding_obj = {}
-            embedding_obj["id"] = uuid.uuid4().hex[:8]
-            embedding_obj["content"] = doc.page_content
-            embedding = self.embedding_model.encode(embedding_obj["content"])
-            embedding_obj["embedding"] = embedding
-            result_list.append(embedding_obj)
-        return result_list
+    # Content-derived chunk id: the same chunk in the same namespace always gets the same id
+    @staticmethod
+    def chunk_id(content, namespace=None):
+        digest = hashlib.sha256(f"{namespace or ''}\0{content}".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    # Embed and index only new chunks; known chunks get their TTL restarted.
+    # Yields {"id", "content", "known"} per chunk as it is indexed, without
+    # holding every split or embedding of the documents in memory. A metrics
+    # dict, if given, receives the per-stage metrics of this run
+    def ingest_stream(
+        self, documents, namespace=None, ttl=None, metadata=None, metrics=None
+    ):
+        return self.ingestion.run(documents, namespace, ttl, metadata, metrics)
+
+    def ingest(self, documents, namespace=None, ttl=None, metadata=None, metrics=None):
+        return list(self.ingest_stream(documents, namespace, ttl, metadata, metrics))
+
+    # Queue documents for background ingestion; returns the sequence number (per
+    # namespace) to pass as min_seq when a later retrieval of that namespace
+    # must see them (None if ingested inline)
+    def ingest_async(self, documents, namespace=None, ttl=None, metadata=None):
+        if self.ingestion_worker is None:
+            self.ingest(documents, namespace, ttl, metadata)
+            return None
+        return self.ingestion_worker.submit(documents, namespace, ttl, metadata)
+
+    # Index stage of the ingestion pipeline, for one chunk
+    def index_chunk(self, embedding_obj, namespace=None, ttl=None, metadata=None):
+        # Known chunks missing from the lexical index (indexed before hybrid
+        # mode was enabled, or by an index that was not persisted) are added
+        # when they are seen again
+        if embedding_obj["id"] not in self.lexical_index:
+            self.lexical_index.add(
+                embedding_obj["id"], embedding_obj["content"], namespace
+            )
+        if embedding_obj["known"]:
+            if ttl or self.ttl:
+                self.vector_store.refresh(embedding_obj["id"], ttl or self.ttl)
+        else:
+            self.store_embedding(
+                embedding_obj["embedding"],
+                embedding_obj["id"],
+                namespace=namespace,
+                ttl=ttl,
+                metadata=metadata,
+            )
 
     # def store_documents(self, documents):
     #     all_splits = self.text_splitter.split_documents(documents)
@@ -120,8 +188,17 @@ class RAGEngine:
     #         text = doc.page_content
     #     self.vector_store.add_documents(documents=all_splits)
 
-    def store_embedding(self, embedding_vector_key, value):
-        self.vector_store.add_embedding(embedding_vector_key, value)
+    def store_embedding(
+        self, embedding_vector_key, value, namespace=None, ttl=None, metadata=None
+    ):
+        # metadata ({field: value}, e.g. source or doc type) can be filtered on at retrieval
+        self.vector_store.add_embedding(
+            embedding_vector_key,
+            value,
+            namespace=namespace,
+            ttl=ttl or self.ttl,
+            metadata=metadata,
+        )
         # if self.vector_store is None:
         #     embedding_list = [(obj["id"], obj["embedding"]) for obj in embedding_list]
         #     self.vector_store = FAISS.from_embeddings(
@@ -132,12 +209,212 @@ class RAGEngine:
         #     for obj in embedding_list:
         #         self.vector_store.add_vectors([(obj["embedding"].tolist(), {"id": obj["id"]})])
 
-    def retrieve_context_ids(self, query):
+    def delete_document(self, doc_id):
+        self.lexical_index.remove(doc_id)
+        return self.vector_store.delete(doc_id)
+
+    def delete_namespace(self, namespace):
+        # Drop every chunk of a session/document namespace
+        self.lexical_index.remove_namespace(namespace)
+        return self.vector_store.delete_namespace(namespace)
+
+    def retrieve_context_ids(
+        self,
+        query,
+        top_k=None,
+        min_score=None,
+        namespace=None,
+        filters=None,
+        min_seq=None,
+        wait_timeout=None,
+        with_scores=False,
+    ):
         print(f"\nRetrieve_context_ids query: {query}")
-        query_embedding = self.embedding_model.encode(query)
-        return self.vector_store.similarity_search_by_embedding(query_embedding)
+        return self.retrieve_context_ids_batch(
+            [query],
+            top_k,
+            min_score,
+            namespace,
+            filters,
+            min_seq,
+            wait_timeout,
+            with_scores,
+        )[0]
         # return self.vector_store.similarity_search_by_vector(query_embedding, k=2)
 
+    def retrieve_context_ids_batch(
+        self,
+        queries,
+        top_k=None,
+        min_score=None,
+        namespace=None,
+        filters=None,
+        min_seq=None,
+        wait_timeout=None,
+        with_scores=False,
+    ):
+        # Score all cache misses in one matrix product; returns one id list per
+        # query, or one list of (id, score) pairs with with_scores
+        if min_seq and self.ingestion_worker is not None:
+            # Read-your-writes: only callers that need an upload wait for it
+            if wait_timeout is None:
+                wait_timeout = self.ingest_wait_timeout
+            if not self.ingestion_worker.wait_for(min_seq, wait_timeout, namespace):
+                print(
+                    f"Ingestion {min_seq} not indexed after {wait_timeout}s; "
+                    f"retrieving up to {self.ingestion_worker.watermark(namespace)}"
+                )
+        top_k = top_k or self.top_k
+        min_score = min_score if min_score is not None else self.min_score
+        # Results are cached under the index version of the namespace, so any
+        # insert or delete there makes earlier entries unreachable
+        version = self.vector_store.version(namespace)
+        keys = [
+            (
+                self._query_hash(query),
+                namespace,
+                version,
+                self.retrieval_mode,
+                top_k,
+                min_score,
+                self._filters_key(filters),
+            )
+            for query in queries
+        ]
+        results = [self.result_cache.get(key) for key in keys]
+        # TTLs run out without a version change: drop hits holding an expired chunk
+        missed = [
+            i
+            for i, result in enumerate(results)
+            if result is None
+            or not all(doc_id in self.vector_store for doc_id, _ in result)
+        ]
+        if not missed:
+            return self._unpack(results, with_scores)
+
+        query_embeddings = [self._encode_query(queries[i]) for i in missed]
+        # filters ({field: value or [values]}) mask rows out before they are scored
+        if self.retrieval_mode == "hybrid":
+            found = [
+                self.hybrid_search(
+                    queries[i],
+                    query_embedding,
+                    top_k=top_k,
+                    min_score=min_score,
+                    namespace=namespace,
+                    filters=filters,
+                )
+                for i, query_embedding in zip(missed, query_embeddings)
+            ]
+        else:
+            found = self.vector_store.search_batch(
+                query_embeddings,
+                k=top_k,
+                min_score=min_score,
+                namespace=namespace,
+                filters=filters,
+            )
+        for i, result in zip(missed, found):
+            results[i] = tuple(result)
+            self.result_cache.put(keys[i], results[i])
+        return self._unpack(results, with_scores)
+
+    def cache_stats(self):
+        return {
+            "query_embeddings": self.embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+        }
+
+    def _encode_query(self, query):
+        key = self._query_hash(query)
+        query_embedding = self.embedding_cache.get(key)
+        if query_embedding is None:
+            query_embedding = self.embedding_model.encode(query)
+            self.embedding_cache.put(key, query_embedding)
+        return query_embedding
+
+    @staticmethod
+    def _unpack(results, with_scores):
+        # Cached results hold (id, score) pairs
+        if with_scores:
+            return [list(result) for result in results]
+        return [[doc_id for doc_id, _ in result] for result in results]
+
+    @staticmethod
+    def _query_hash(query):
+        return hashlib.sha256(query.encode("utf-8")).digest()
+
+    @staticmethod
+    def _filters_key(filters):
+        # Hashable, order-independent form of {field: value or [values]}
+        if not filters:
+            return None
+        return frozenset(
+            (
+                field,
+                (
+                    frozenset(wanted)
+                    if isinstance(wanted, (list, tuple, set, frozenset))
+                    else wanted
+                ),
+            )
+            for field, wanted in filters.items()
+        )
+
+    def hybrid_search(
+        self,
+        query,
+        query_embedding,
+        top_k=2,
+        min_score=None,
+        namespace=None,
+        filters=None,
+    ):
+        # Cheap BM25 candidate generation first; only the shortlist is scored by vector
+        shortlist = self.lexical_index.search(
+            query, self.hybrid_candidates, namespace=namespace
+        )
+        cosine = {}
+        if shortlist:
+            cosine = self.vector_store.score_ids(
+                query_embedding,
+                [doc_id for doc_id, _ in shortlist],
+                namespace=namespace,
+                filters=filters,
+            )
+            # Prune lexical entries whose vectors were deleted or expired
+            for doc_id, _ in shortlist:
+                if doc_id not in cosine and doc_id not in self.vector_store:
+                    self.lexical_index.remove(doc_id)
+        best_bm25 = shortlist[0][1] if shortlist else 1.0
+        fused = sorted(
+            (
+                (
+                    doc_id,
+                    self.hybrid_alpha * cosine[doc_id]
+                    + (1 - self.hybrid_alpha) * bm25 / best_bm25,
+                )
+                for doc_id, bm25 in shortlist
+                if doc_id in cosine
+                and (min_score is None or cosine[doc_id] >= min_score)
+            ),
+            key=lambda result: result[1],
+            reverse=True,
+        )[:top_k]
+        if len(fused) < top_k:
+            # No lexical overlap for enough chunks: fill up with pure vector hits
+            found = {doc_id for doc_id, _ in fused}
+            for doc_id, score in self.vector_store.search(
+                query_embedding,
+                top_k,
+                min_score,
+                namespace=namespace,
+                filters=filters,
+            ):
+                if doc_id not in found and len(fused) < top_k:
+                    fused.append((doc_id, score))
+        return fused
+
     # # Step 0: Generate an AIMessage that may include a tool-call to be sent.
     # def query_or_respond(self, state: MessagesState):
     #     """Generate tool call for retrieval or respond."""
@@ -0,0 +1,174 @@
+"""Vector index interface and backend factory for RAG retrieval."""
+
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from ..common.vectors import normalise
+
+VECTOR_INDEX_BACKENDS = ("numpy", "flat", "hnsw", "ivfpq")
+
+
+class VectorIndex(ABC):
+    """
+    Interface for chunk-embedding indexes.
+
+    Scores are cosine similarities: implementations store L2-normalised
+    vectors and rank by inner product. Namespaces, TTLs and deletion are
+    optional features, as are per-vector metadata and metadata filters
+    ({field: value or [values]}, AND across fields); backends without them
+    raise NotImplementedError.
+    """
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def add_embedding(
+        self,
+        embedding: Any,
+        doc_id: Hashable,
+        namespace: Optional[str] = None,
+        ttl: Optional[float] = None,
+        metadata: Optional[Dict[str, Hashable]] = None,
+    ) -> None:
+        """Index one embedding under doc_id, optionally in a namespace, expiring after ttl seconds and tagged with metadata."""
+        pass
+
+    @abstractmethod
+    def search(
+        self,
+        query_embedding: Any,
+        top_k: int = 2,
+        min_score: Optional[float] = None,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[Hashable, float]]:
+        """Return up to top_k (doc_id, score) pairs, best first, scoring at least min_score."""
+        pass
+
+    @abstractmethod
+    def search_batch(
+        self,
+        queries: Any,
+        k: int = 2,
+        min_score: Optional[float] = None,
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[Hashable, float]]]:
+        """Search many queries at once; one result list per query."""
+        pass
+
+    def version(self, namespace: Optional[str] = None) -> int:
+        """Number that changes whenever results for namespace (None = all) could change."""
+        raise NotImplementedError(f"{type(self).__name__} does not track versions")
+
+    def score_ids(
+        self,
+        query_embedding: Any,
+        doc_ids: List[Hashable],
+        namespace: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ) -> Dict[Hashable, float]:
+        """Scores of the given (eligible) doc ids only, for rescoring a shortlist."""
+        raise NotImplementedError(f"{type(self).__name__} does not support rescoring")
+
+    def __contains__(self, doc_id: Hashable) -> bool:
+        """Whether doc_id is indexed and has not expired."""
+        raise NotImplementedError(f"{type(self).__name__} does not support lookups")
+
+    def refresh(self, doc_id: Hashable, ttl: Optional[float] = None) -> bool:
+        """Restart the TTL of doc_id (None = never expire); returns whether it exists."""
+        raise NotImplementedError(f"{type(self).__name__} does not support TTLs")
+
+    def delete(self, doc_id: Hashable) -> bool:
+        """Remove doc_id; returns whether it existed."""
+        raise NotImplementedError(f"{type(self).__name__} does not support deletion")
+
+    def delete_namespace(self, namespace: str) -> int:
+        """Remove every vector in namespace; returns the number removed."""
+        raise NotImplementedError(f"{type(self).__name__} does not support namespaces")
+
+    def similarity_search_by_embedding(
+        self, query_embedding, top_k=2, min_score=None, namespace=None, filters=None
+    ):
+        results = self.search(
+            query_embedding, top_k, min_score, namespace=namespace, filters=filters
+        )
+        return [doc_id for doc_id, _ in results]
+
+    @staticmethod
+    def normalise(embedding) -> np.ndarray:
+        return normalise(embedding)
+
+
+def create_vector_index(
+    backend: str = "numpy",
+    hnsw_m: int = 32,
+    ef_search: int = 64,
+    nlist: int = 256,
+    nprobe: int = 16,
+    path: Optional[str] = None,
+    compaction_interval: Optional[float] = None,
+    shards: Optional[int] = None,
+    quantize: bool = False,
+    rescore_factor: int = 4,
+) -> VectorIndex:
+    """
+    Build the vector index for a backend name.
+
+    "numpy" is exact brute force (VectorStore). "flat", "hnsw" and "ivfpq"
+    are FAISS indexes: exact inner product, HNSW graph (ef_search trades
+    recall for speed) and IVF-PQ (nprobe lists searched per query).
+    With a path, the numpy store is persisted there and restored on start;
+    with a compaction_interval any backend expires and compacts in the
+    background. shards caps the threads a numpy search is split across
+    (None = cores); quantize keeps int8 codes for a coarse search whose best
+    top_k * rescore_factor candidates are rescored on the float rows. Both
+    apply to the numpy backend only and are ignored, with a warning, by the
+    FAISS ones.
+    """
+    if backend == "numpy":
+        if path:
+            from .persistent_store import PersistentVectorStore
+
+            store = PersistentVectorStore(
+                path, shards=shards, quantize=quantize, rescore_factor=rescore_factor
+            )
+        else:
+            from .vector_store import VectorStore
+
+            store = VectorStore(
+                shards=shards, quantize=quantize, rescore_factor=rescore_factor
+            )
+        if compaction_interval:
+            store.start_compaction(interval=compaction_interval)
+        return store
+    if path:
+        raise ValueError(
+            f"Persistence is only supported by the numpy backend, not {backend}"
+        )
+
+    from .faiss_index import FlatIndex, HNSWIndex, IVFPQIndex
+
+    if backend == "flat":
+        index = FlatIndex()
+    elif backend == "hnsw":
+        index = HNSWIndex(m=hnsw_m, ef_search=ef_search)
+    elif backend == "ivfpq":
+        index = IVFPQIndex(nlist=nlist, nprobe=nprobe)
+    else:
+        raise ValueError(
+            f"Unsupported vector index backend: {backend} (expected one of {VECTOR_INDEX_BACKENDS})"
+        )
+    if shards is not None or quantize:
+        logging.getLogger(__name__).warning(
+            f"Vector search shards and quantize apply to the numpy backend only; "
+            f"the {backend} backend ignores them"
+        )
+    if compaction_interval:
+        index.start_compaction(interval=compaction_interval)
+    return index
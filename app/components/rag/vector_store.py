@@ -0,0 +1,749 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ..common.vectors import grown_capacity, resized
+from .vector_index import VectorIndex
+
+# The rows a search reads: rows below size are never written again, so a view
+# taken under the lock can be scored after it is released
+RowsView = namedtuple("RowsView", "size base_size blocks doc_ids codes")
+
+# Score eligible rows by gathering them when they are at most this share of the store
+GATHER_RATIO = 0.5
+# Smallest row range worth scoring on its own thread
+SHARD_MIN_ROWS = 32768
+# Rows needed before the int8 quantizer is fitted; smaller stores are searched exactly
+QUANTIZE_MIN_ROWS = 1024
+# Rows converted to float32 at a time when fitting, encoding or scoring int8 codes
+CODE_CHUNK_ROWS = 65536
+
+
+class FieldIndex:
+    """Dictionary-encoded metadata field: one int32 code per row, 0 when absent."""
+
+    __slots__ = ("codes", "values", "names")
+
+    def __init__(self, capacity):
+        self.codes = np.zeros(capacity, dtype=np.int32)
+        self.values = {}  # value -> code
+        self.names = [None]  # code -> value
+
+    def code(self, value):
+        if value is None:
+            return 0
+        code = self.values.get(value)
+        if code is None:
+            code = self.values[value] = len(self.names)
+            self.names.append(value)
+        return code
+
+    def mask(self, wanted, size):
+        # Rows whose value equals wanted, or is one of wanted for a list/tuple/set
+        if isinstance(wanted, (list, tuple, set, frozenset)):
+            codes = [self.values[value] for value in wanted if value in self.values]
+            return np.isin(self.codes[:size], codes)
+        code = self.values.get(wanted)
+        if code is None:
+            return np.zeros(size, dtype=bool)
+        return self.codes[:size] == code
+
+
+class ScalarQuantizer:
+    """Per-dimension int8 scalar quantisation: v ~ offset + scale * (code + 128)."""
+
+    __slots__ = ("scale", "offset")
+
+    def __init__(self, scale, offset):
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.offset = np.asarray(offset, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, blocks):
+        # Per-dimension min/max over every row, a chunk at a time
+        low = high = None
+        for block in blocks:
+            for start in range(0, len(block), CODE_CHUNK_ROWS):
+                chunk = np.asarray(block[start : start + CODE_CHUNK_ROWS])
+                chunk_low, chunk_high = chunk.min(axis=0), chunk.max(axis=0)
+                low = chunk_low if low is None else np.minimum(low, chunk_low)
+                high = chunk_high if high is None else np.maximum(high, chunk_high)
+        return cls(np.maximum(high - low, 1e-12) / 255, low)
+
+    def encode(self, vectors):
+        codes = np.rint((vectors - self.offset) / self.scale) - 128
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def score(self, codes, queries):
+        # Approximate inner products of queries with the coded rows:
+        # q . v = q . (offset + 128 * scale) + (q * scale) . code
+        weights = queries * self.scale
+        bias = queries @ (self.offset + 128 * self.scale)
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), CODE_CHUNK_ROWS):
+            chunk = codes[start : start + CODE_CHUNK_ROWS].astype(np.float32)
+            scores[:, start : start + len(chunk)] = weights @ chunk.T
+        scores += bias[:, None]
+        return scores
+
+
+class VectorStore(VectorIndex):
+    """
+    Chunk embeddings stored as rows of one contiguous float32 matrix.
+
+    Rows are L2-normalised once at insert and doc ids are kept in a parallel
+    array, so a cosine-similarity query is a single matrix-vector product
+    written into a score buffer reused by the calling thread (or one
+    matrix-matrix product for a batch of queries), followed by a partial
+    top-k selection. The lock is held only to read the row state, so
+    concurrent searches score in parallel.
+
+    A store restored from disk keeps the snapshot rows as a read-only base
+    block (usually memory-mapped); rows added afterwards go to the growable
+    block and both are scored into the same buffer.
+
+    Large stores are searched in shards: contiguous row ranges scored in
+    parallel on a thread pool (numpy matmul releases the GIL), each keeping
+    its own top-k, which are then merged. shards defaults to the number of
+    cores and no shard gets fewer than SHARD_MIN_ROWS rows.
+
+    With quantize=True every row also gets an int8 code (ScalarQuantizer,
+    fitted once QUANTIZE_MIN_ROWS rows exist and refitted on compaction).
+    Searches score the codes, then rescore only the best
+    k * rescore_factor candidates against the float rows. The codes are a
+    quarter of the float32 size, so when the float rows are a memory-mapped
+    snapshot (PersistentVectorStore) only the codes need to stay in RAM.
+
+    Each row also has a namespace code, an expiry time and a live flag.
+    Deleted or expired rows are tombstoned and skipped by searches until
+    compact() rewrites the matrix without them. Chunk metadata (session,
+    file, page, ...) is stored per field as a FieldIndex, so a filter is
+    turned into a row mask before any scoring happens.
+    """
+
+    def __init__(
+        self, initial_capacity=1024, shards=None, quantize=False, rescore_factor=4
+    ):
+        self._initial_capacity = initial_capacity
+        self.shards = shards or os.cpu_count() or 1
+        self.quantize = quantize
+        self.rescore_factor = rescore_factor
+        self._executor = None
+        self._quantizer = None  # fitted ScalarQuantizer, once there are enough rows
+        self._codes = None  # int8 row codes, sized like the per-row state
+        self._base = None  # read-only rows restored from a snapshot
+        self._matrix = None  # growable block for rows added since
+        self._scratch = threading.local()  # per-thread score buffer
+        self._doc_ids = []  # row index -> doc id
+        self._rows = {}  # doc id -> row index of its live row
+        # Per-row state, sized for both blocks
+        self._namespace_codes = np.empty(0, dtype=np.int32)
+        self._expires = np.empty(0, dtype=np.float64)
+        self._live = np.empty(0, dtype=bool)
+        self._namespaces = {None: 0}  # namespace -> code
+        self._namespace_names = [None]  # code -> namespace
+        self._fields = {}  # metadata field -> FieldIndex
+        self._size = 0
+        self._dead = 0
+        self._expiring = 0  # live rows that have a TTL
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()  # one compaction at a time
+        self._generation = 0  # bumped whenever the blocks are replaced
+        self._compactor = None
+        self._stop_compaction = threading.Event()
+        # Monotonic change counter: the store as a whole and each namespace
+        # remember the clock value of their last insert or removal
+        self._clock = 0
+        self._changed = 0
+        self._changed_before = 0  # version of namespaces not changed since a restore
+        self._namespace_changed = {}
+
+    def __len__(self):
+        return self._size - self._dead
+
+    def __contains__(self, doc_id):
+        with self._lock:
+            row = self._rows.get(doc_id)
+            return row is not None and self._expires[row] > time.time()
+
+    @property
+    def doc_ids(self):
+        return list(self._doc_ids)
+
+    @property
+    def dim(self):
+        for block in (self._base, self._matrix):
+            if block is not None:
+                return block.shape[1]
+        return None
+
+    @property
+    def vectors(self):
+        # Read-only view of the stored (normalised) rows, tombstoned ones included
+        blocks = self._blocks()
+        if not blocks:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        view = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        view.flags.writeable = False
+        return view
+
+    def stats(self):
+        return {
+            "rows": self._size,
+            "live": len(self),
+            "tombstoned": self._dead,
+            "namespaces": len(self._namespace_names) - 1,
+            "fields": {
+                name: len(index.names) - 1 for name, index in self._fields.items()
+            },
+            "quantized": self._quantizer is not None,
+        }
+
+    def add_embedding(self, embedding, doc_id, namespace=None, ttl=None, metadata=None):
+        expires_at = time.time() + ttl if ttl else np.inf
+        with self._lock:
+            self._add(
+                self.normalise(embedding), doc_id, namespace, expires_at, metadata
+            )
+
+    def refresh(self, doc_id, ttl=None):
+        """Restart the TTL of doc_id (None = never expire); returns whether it exists."""
+        expires_at = time.time() + ttl if ttl else np.inf
+        with self._lock:
+            return self._refresh(doc_id, expires_at)
+
+    def version(self, namespace=None):
+        """Changes whenever a search of namespace (None = every row) could change."""
+        with self._lock:
+            if namespace is None:
+                return self._changed
+            return self._namespace_changed.get(namespace, self._changed_before)
+
+    def get_metadata(self, doc_id):
+        with self._lock:
+            row = self._rows.get(doc_id)
+            return None if row is None else self._row_metadata(row)
+
+    def delete(self, doc_id):
+        """Tombstone the row of doc_id; returns whether it existed."""
+        with self._lock:
+            return self._delete(doc_id)
+
+    def delete_namespace(self, namespace):
+        """Tombstone every row in namespace; returns the number of rows removed."""
+        with self._lock:
+            return self._delete_namespace(namespace)
+
+    def expire(self, now=None):
+        """Tombstone rows whose TTL has passed; returns the number of rows removed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._expiring:
+                return 0
+            rows = np.flatnonzero(
+                self._live[: self._size] & (self._expires[: self._size] <= now)
+            )
+            return self._tombstone(rows)
+
+    def compact(self):
+        """Rewrite the matrix with only live rows; returns the number of rows dropped."""
+        self.expire()
+        with self._compact_lock:
+            with self._lock:
+                if not self._dead:
+                    return 0
+                # Rows below _size are never written again, so the blocks can be
+                # copied after the lock is released; searches and writes carry on
+                size = self._size
+                keep = np.flatnonzero(self._live[:size])
+                blocks = self._blocks()
+                doc_ids = self._doc_ids[:size]
+                generation = self._generation
+            matrix = self._compacted(blocks, keep)
+            doc_ids = [doc_ids[row] for row in keep]
+            rows = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+            with self._lock:
+                if self._generation != generation:
+                    # Reloaded from a snapshot meanwhile; the copy is stale
+                    return 0
+                self._swap_compacted(size, keep, matrix, doc_ids, rows)
+                return size - len(keep)
+
+    def start_compaction(self, interval=60.0, min_dead_ratio=0.2):
+        """Expire and compact in a background thread once enough rows are dead."""
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop_compaction.wait(interval):
+                self.expire()
+                if self._size and self._dead / self._size >= min_dead_ratio:
+                    self.compact()
+
+        self._stop_compaction.clear()
+        self._compactor = threading.Thread(
+            target=run, name="vector-store-compaction", daemon=True
+        )
+        self._compactor.start()
+
+    def stop_compaction(self):
+        if self._compactor is not None:
+            self._stop_compaction.set()
+            self._compactor.join()
+            self._compactor = None
+
+    def search(
+        self, query_embedding, top_k=2, min_score=None, namespace=None, filters=None
+    ):
+        # Cosine similarity: rows and query are unit length, so a dot product suffices
+        query = self.normalise(query_embedding)
+        return self._search(query[None, :], top_k, min_score, namespace, filters)[0]
+
+    def search_batch(self, queries, k=2, min_score=None, namespace=None, filters=None):
+        # All queries are scored in one matrix-matrix product per block
+        queries = [self.normalise(query) for query in queries]
+        if not queries:
+            return []
+        return self._search(np.stack(queries), k, min_score, namespace, filters)
+
+    def score_ids(self, query_embedding, doc_ids, namespace=None, filters=None):
+        # Cosine scores of just these docs (e.g. a lexical shortlist); ineligible ones are left out
+        query = self.normalise(query_embedding)
+        with self._lock:
+            rows = [self._rows[d] for d in doc_ids if d in self._rows]
+            if not rows:
+                return {}
+            eligible = self._eligible(namespace, filters)
+            wanted = np.zeros(self._size, dtype=bool)
+            wanted[rows] = True
+            if eligible is not None:
+                wanted &= eligible
+            scores = {}
+            for block, offset, rows in self._gather(self._blocks(), wanted):
+                for row, score in zip(rows, block[rows - offset] @ query):
+                    scores[self._doc_ids[row]] = float(score)
+            return scores
+
+    @property
+    def _base_size(self):
+        return 0 if self._base is None else self._base.shape[0]
+
+    def _blocks(self):
+        blocks = []
+        if self._base_size:
+            blocks.append(self._base)
+        if self._size > self._base_size:
+            blocks.append(self._matrix[: self._size - self._base_size])
+        return blocks
+
+    def _search(self, queries, k, min_score, namespace, filters):
+        # Only the row state is read under the lock; rows below the captured
+        # size are never written again, so scoring runs unlocked and
+        # concurrent searches do not wait for each other
+        with self._lock:
+            eligible = self._eligible(namespace, filters)
+            if self._size == 0 or (eligible is not None and not eligible.any()):
+                return [[] for _ in range(len(queries))]
+            quantized = self._quantized()
+            rows = self._view()
+        dense = eligible is None or eligible.mean() > GATHER_RATIO
+        if quantized and dense:
+            indices, top = self._search_quantized(rows, queries, eligible, k)
+            return self._results(rows, indices, top, min_score)
+        scores = self._score_buffer(len(queries), rows.size)
+        if dense and self._shard_count(rows.size) > 1:
+            indices, top = self._search_shards(rows, queries, scores, eligible, k)
+            return self._results(rows, indices, top, min_score)
+        if dense:
+            offset = 0
+            for block in rows.blocks:
+                if len(queries) == 1:
+                    np.matmul(
+                        block, queries[0], out=scores[0, offset : offset + len(block)]
+                    )
+                else:
+                    scores[:, offset : offset + len(block)] = queries @ block.T
+                offset += len(block)
+            if eligible is not None:
+                scores[:, ~eligible] = -np.inf
+        else:
+            # Few eligible rows: score only those
+            scores.fill(-np.inf)
+            for block, offset, gathered in self._gather(rows.blocks, eligible):
+                scores[:, gathered] = queries @ block[gathered - offset].T
+        return self._select(rows, scores, k, min_score)
+
+    def _view(self):
+        # The arrays a search reads, as of now; caller holds _lock
+        return RowsView(
+            self._size, self._base_size, self._blocks(), self._doc_ids, self._codes
+        )
+
+    def _score_buffer(self, queries, size):
+        # Score buffer of this thread, reused across its searches and grown as needed
+        buffer = getattr(self._scratch, "scores", None)
+        if buffer is None or buffer.size < queries * size:
+            buffer = self._scratch.scores = np.empty(
+                grown_capacity(0 if buffer is None else buffer.size, queries * size),
+                dtype=np.float32,
+            )
+        return buffer[: queries * size].reshape(queries, size)
+
+    @staticmethod
+    def _gather(blocks, eligible):
+        # (block, block offset, eligible row indices) for blocks with eligible rows
+        offset = 0
+        for block in blocks:
+            rows = np.flatnonzero(eligible[offset : offset + len(block)]) + offset
+            if len(rows):
+                yield block, offset, rows
+            offset += len(block)
+
+    def _eligible(self, namespace, filters=None):
+        # Boolean mask of searchable rows, or None when every row is
+        if namespace is None and not filters and not self._dead and not self._expiring:
+            return None
+        eligible = self._live[: self._size].copy()
+        if self._expiring:
+            eligible &= self._expires[: self._size] > time.time()
+        if namespace is not None:
+            code = self._namespaces.get(namespace)
+            if code is None:
+                return np.zeros(self._size, dtype=bool)
+            eligible &= self._namespace_codes[: self._size] == code
+        # Filters: {field: value or list of values}, all fields must match
+        for field, wanted in (filters or {}).items():
+            index = self._fields.get(field)
+            if index is None:
+                return np.zeros(self._size, dtype=bool)
+            eligible &= index.mask(wanted, self._size)
+        return eligible
+
+    def _add(self, vector, doc_id, namespace, expires_at, metadata=None):
+        self._ensure_capacity(self._size - self._base_size + 1, vector.shape[0])
+        previous = self._rows.get(doc_id)
+        if previous is not None:
+            # Re-adding a doc id replaces its row
+            self._tombstone(np.array([previous]))
+        row = self._size
+        self._matrix[row - self._base_size] = vector
+        self._rows[doc_id] = row
+        self._touch([namespace])
+        self._doc_ids.append(doc_id)
+        self._namespace_codes[row] = self._namespace_code(namespace)
+        self._expires[row] = expires_at
+        self._live[row] = True
+        if self._quantizer is not None:
+            self._codes[row] = self._quantizer.encode(vector)
+        for index in self._fields.values():
+            index.codes[row] = 0
+        for field, value in (metadata or {}).items():
+            index = self._fields.get(field)
+            if index is None:
+                index = self._fields[field] = FieldIndex(len(self._live))
+            index.codes[row] = index.code(value)
+        if np.isfinite(expires_at):
+            self._expiring += 1
+        self._size += 1
+
+    def _refresh(self, doc_id, expires_at):
+        row = self._rows.get(doc_id)
+        if row is None:
+            return False
+        self._expiring += int(np.isfinite(expires_at)) - int(
+            np.isfinite(self._expires[row])
+        )
+        revived = self._expires[row] <= time.time()
+        self._expires[row] = expires_at
+        # Extending a live row's TTL changes no search result, so cached results
+        # stay valid; only a row brought back from expiry changes them
+        if revived:
+            self._touch([self._namespace_names[self._namespace_codes[row]]])
+        return True
+
+    def _delete(self, doc_id):
+        row = self._rows.get(doc_id)
+        if row is None:
+            return False
+        self._tombstone(np.array([row]))
+        return True
+
+    def _delete_namespace(self, namespace):
+        code = self._namespaces.get(namespace)
+        if code is None:
+            return 0
+        rows = np.flatnonzero(
+            self._live[: self._size] & (self._namespace_codes[: self._size] == code)
+        )
+        return self._tombstone(rows)
+
+    def _namespace_code(self, namespace):
+        code = self._namespaces.get(namespace)
+        if code is None:
+            code = self._namespaces[namespace] = len(self._namespace_names)
+            self._namespace_names.append(namespace)
+        return code
+
+    def _tombstone(self, rows):
+        rows = rows[self._live[rows]]
+        self._live[rows] = False
+        for row in rows:
+            if self._rows.get(self._doc_ids[row]) == row:
+                del self._rows[self._doc_ids[row]]
+        self._dead += len(rows)
+        self._expiring -= int(np.isfinite(self._expires[rows]).sum())
+        if len(rows):
+            codes = np.unique(self._namespace_codes[rows])
+            self._touch([self._namespace_names[code] for code in codes])
+        return len(rows)
+
+    def _touch(self, namespaces):
+        self._clock += 1
+        self._changed = self._clock
+        for namespace in namespaces:
+            self._namespace_changed[namespace] = self._clock
+
+    def _row_metadata(self, row):
+        return {
+            field: index.names[index.codes[row]]
+            for field, index in self._fields.items()
+            if index.codes[row]
+        }
+
+    def _compacted(self, blocks, keep):
+        # New growable block holding the rows keep of blocks, copied block by block
+        capacity = grown_capacity(0, len(keep), self._initial_capacity)
+        matrix = np.zeros((capacity, blocks[0].shape[1]), dtype=np.float32)
+        written = offset = 0
+        for block in blocks:
+            block_rows = keep[(keep >= offset) & (keep < offset + len(block))] - offset
+            np.take(
+                block,
+                block_rows,
+                axis=0,
+                out=matrix[written : written + len(block_rows)],
+            )
+            written += len(block_rows)
+            offset += len(block)
+        return matrix
+
+    def _swap_compacted(self, size, keep, matrix, doc_ids, rows):
+        # Install the rows keep of the first size rows, compacted into matrix
+        # without the lock. Rows added since are copied after them and rows
+        # tombstoned or refreshed since keep their current state
+        old = np.concatenate([keep, np.arange(size, self._size)])
+        if len(old) > len(matrix):
+            matrix = resized(matrix, grown_capacity(len(matrix), len(old)), len(keep))
+        if len(old) > len(keep):
+            matrix[len(keep) : len(old)] = self._matrix[
+                size - self._base_size : self._size - self._base_size
+            ]
+        live = self._live[old]
+        for row in np.flatnonzero(~live[: len(keep)]):
+            if rows.get(doc_ids[row]) == row:
+                del rows[doc_ids[row]]
+        tail = self._doc_ids[size : self._size]
+        for row, doc_id in enumerate(tail, len(keep)):
+            if live[row]:
+                rows[doc_id] = row
+        total = len(matrix)
+        self._base = None
+        self._matrix = matrix
+        self._doc_ids = doc_ids + tail
+        self._rows = rows
+        self._namespace_codes = resized(self._namespace_codes[old], total, len(old))
+        self._expires = resized(self._expires[old], total, len(old))
+        self._live = resized(live, total, len(old))
+        for index in self._fields.values():
+            index.codes = resized(index.codes[old], total, len(old))
+        # Refitted on the live rows at the next search
+        self._quantizer = None
+        self._codes = None
+        self._size = len(old)
+        self._dead = int((~live).sum())
+        self._expiring = int(np.isfinite(self._expires[: self._size][live]).sum())
+        self._generation += 1
+
+    def _load(
+        self,
+        base,
+        doc_ids,
+        namespaces=None,
+        expires=None,
+        fields=None,
+        codes=None,
+        quantizer=None,
+    ):
+        # Replace the contents with restored rows; base is used as-is (not copied).
+        # Caller holds _lock
+        self._generation += 1
+        # Codes and quantizer as written by a snapshot; otherwise fitted lazily
+        restored = self.quantize and codes is not None and len(codes) == len(base)
+        self._quantizer = quantizer if restored else None
+        self._codes = np.asarray(codes, dtype=np.int8) if restored else None
+        self._base = base if len(base) else None
+        self._matrix = None
+        self._size = len(base)
+        self._dead = 0
+        self._doc_ids = list(doc_ids)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._doc_ids)}
+        self._namespaces = {None: 0}
+        self._namespace_names = [None]
+        names = namespaces if namespaces is not None else [None] * self._size
+        self._namespace_codes = np.array(
+            [self._namespace_code(name) for name in names], dtype=np.int32
+        )
+        self._expires = (
+            np.array(expires, dtype=np.float64)
+            if expires is not None
+            else np.full(self._size, np.inf)
+        )
+        self._live = np.ones(self._size, dtype=bool)
+        self._expiring = int(np.isfinite(self._expires).sum())
+        # Every namespace may have changed; the clock keeps counting up
+        self._namespace_changed = {}
+        self._touch([])
+        self._changed_before = self._clock
+        # fields: {field: (codes, code -> value list)} as written by a snapshot
+        self._fields = {}
+        for field, (codes, names) in (fields or {}).items():
+            index = self._fields[field] = FieldIndex(0)
+            index.codes = np.array(codes, dtype=np.int32)
+            for value in names[1:]:
+                index.code(value)
+
+    def _quantized(self):
+        # Whether to search the int8 codes; fits the quantizer on first use
+        if not self.quantize or self._size - self._dead < QUANTIZE_MIN_ROWS:
+            return False
+        if self._quantizer is None:
+            blocks = self._blocks()
+            self._quantizer = ScalarQuantizer.fit(blocks)
+            self._codes = np.zeros((len(self._live), self.dim), dtype=np.int8)
+            offset = 0
+            for block in blocks:
+                for start in range(0, len(block), CODE_CHUNK_ROWS):
+                    chunk = block[start : start + CODE_CHUNK_ROWS]
+                    row = offset + start
+                    self._codes[row : row + len(chunk)] = self._quantizer.encode(chunk)
+                offset += len(block)
+        return True
+
+    def _search_quantized(self, rows, queries, eligible, k):
+        # Coarse top k * rescore_factor on the int8 codes, then exact float scores
+        coarse = self._quantizer.score(rows.codes[: rows.size], queries)
+        if eligible is not None:
+            coarse[:, ~eligible] = -np.inf
+        candidates, coarse_top = self._top(coarse, k * self.rescore_factor)
+        vectors = self._take(rows, candidates.reshape(-1)).reshape(
+            candidates.shape + (self.dim,)
+        )
+        exact = np.einsum("qcd,qd->qc", vectors, queries)
+        exact[coarse_top == -np.inf] = -np.inf
+        order, top = self._top(exact, k)
+        return np.take_along_axis(candidates, order, axis=1), top
+
+    @staticmethod
+    def _take(rows, indices):
+        # Float rows by row index; rows in a memory-mapped base are read from disk
+        taken = np.empty((len(indices), rows.blocks[0].shape[1]), dtype=np.float32)
+        in_base = indices < rows.base_size
+        if in_base.any():
+            taken[in_base] = rows.blocks[0][indices[in_base]]
+        if not in_base.all():
+            taken[~in_base] = rows.blocks[-1][indices[~in_base] - rows.base_size]
+        return taken
+
+    def _shard_count(self, size):
+        return min(self.shards, size // SHARD_MIN_ROWS)
+
+    def _search_shards(self, rows, queries, scores, eligible, k):
+        # Each shard scores its row range into its slice of scores and keeps its
+        # own top-k; the per-shard winners are merged into (indices, top)
+        bounds = np.linspace(0, rows.size, self._shard_count(rows.size) + 1)
+        bounds = bounds.astype(int)
+        blocks = rows.blocks
+
+        def run(lo, hi):
+            offset = 0
+            for block in blocks:
+                start, end = max(lo, offset), min(hi, offset + len(block))
+                if start < end:
+                    part = block[start - offset : end - offset]
+                    if len(queries) == 1:
+                        np.matmul(part, queries[0], out=scores[0, start:end])
+                    else:
+                        scores[:, start:end] = queries @ part.T
+                offset += len(block)
+            shard = scores[:, lo:hi]
+            if eligible is not None:
+                shard[:, ~eligible[lo:hi]] = -np.inf
+            indices, top = self._top(shard, k)
+            return indices + lo, top
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.shards, thread_name_prefix="vector-shard"
+            )
+        parts = list(self._executor.map(run, bounds[:-1], bounds[1:]))
+        indices = np.concatenate([part[0] for part in parts], axis=1)
+        merged, top = self._top(np.concatenate([part[1] for part in parts], axis=1), k)
+        return np.take_along_axis(indices, merged, axis=1), top
+
+    def _select(self, rows, scores, k, min_score):
+        return self._results(rows, *self._top(scores, k), min_score)
+
+    @staticmethod
+    def _top(scores, k):
+        # Partial selection of the k best per row, then sort only those k
+        n = scores.shape[1]
+        k = min(k, n)
+        if k < n:
+            indices = np.argpartition(scores, n - k, axis=1)[:, n - k :]
+        else:
+            indices = np.broadcast_to(np.arange(n), scores.shape)
+        top = np.take_along_axis(scores, indices, axis=1)
+        order = np.argsort(-top, axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+        return indices, np.take_along_axis(top, order, axis=1)
+
+    @staticmethod
+    def _results(rows, indices, top, min_score):
+        return [
+            [
+                (rows.doc_ids[i], float(score))
+                for i, score in zip(row_indices, row_scores)
+                # -inf marks rows excluded from the search
+                if score > -np.inf and (min_score is None or score >= min_score)
+            ]
+            for row_indices, row_scores in zip(indices, top)
+        ]
+
+    def _check_dim(self, dim):
+        if self.dim is not None and dim != self.dim:
+            raise ValueError(
+                f"Embedding dimension {dim} does not match store dimension {self.dim}"
+            )
+
+    def _ensure_capacity(self, size, dim):
+        self._check_dim(dim)
+        if self._matrix is None:
+            self._matrix = np.zeros((0, dim), dtype=np.float32)
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        capacity = grown_capacity(capacity, size, self._initial_capacity)
+        self._matrix = resized(self._matrix, capacity, self._size - self._base_size)
+        # Per-row arrays span the base snapshot and the growable block
+        total = self._base_size + capacity
+        self._namespace_codes = resized(self._namespace_codes, total, self._size)
+        self._expires = resized(self._expires, total, self._size)
+        self._live = resized(self._live, total, self._size)
+        for index in self._fields.values():
+            index.codes = resized(index.codes, total, self._size)
+        if self._quantizer is not None:
+            self._codes = resized(self._codes, total, self._size)
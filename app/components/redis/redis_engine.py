@@ -2,7 +2,7 @@
 
 import json
 import logging
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 import redis
 
@@ -15,6 +15,7 @@ class RedisEngine:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self._client: Optional[redis.Redis] = None
+        self._scripts: Dict[str, Any] = {}
         self.config = ConfigLoader.load_config()
         self._connect()
 
@@ -117,6 +118,28 @@ class RedisEngine:
             self.logger.error(f"JSON encode error for key {key}: {str(e)}")
             return False
 
+    def hgetall(self, key: str) -> Optional[Dict[str, str]]:
+        """Get all fields of a hash."""
+        try:
+            self._ensure_connection()
+            return self._client.hgetall(key)
+        except Exception as e:
+            self.logger.error(f"Redis HGETALL error for key {key}: {str(e)}")
+            return None
+
+    def run_script(
+        self, script: str, keys: List[str], args: List[Any]
+    ) -> Optional[Any]:
+        """Run a Lua script atomically, loading it into the script cache once."""
+        try:
+            self._ensure_connection()
+            if script not in self._scripts:
+                self._scripts[script] = self._client.register_script(script)
+            return self._scripts[script](keys=keys, args=args, client=self._client)
+        except Exception as e:
+            self.logger.error(f"Redis EVALSHA error for keys {keys}: {str(e)}")
+            return None
+
     def increment(self, key: str, amount: int = 1) -> Optional[int]:
         """Increment counter."""
         try:
@@ -147,6 +170,10 @@ class RedisEngine:
         """Generate anonymization cache key."""
         return f"anon_cache:{content_hash}"
 
+    def get_entity_registry_key(self, session_id: str) -> str:
+        """Generate entity registry hash key for a session."""
+        return f"entity_registry:{session_id}"
+
     def health_check(self) -> bool:
         """Check Redis health."""
         try:
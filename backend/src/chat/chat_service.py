@@ -44,14 +44,17 @@ class ChatService:
             current_state = self._transition_to_validated(request_dto)
 
             # Step 2: Convert files to markdown and combine with prompt
-            current_state, markdown_content = self._transition_to_file_processed(
-                request_dto
+            current_state, markdown_content, structured_content = (
+                self._transition_to_file_processed(request_dto)
             )
 
             # Step 3: Anonymise request (pass prompt and file content)
             current_state, anonymised_prompt, anonymised_content = (
                 self._transition_to_anonymised(
-                    request_dto.prompt, request_dto.context, markdown_content
+                    request_dto.prompt,
+                    request_dto.context,
+                    markdown_content,
+                    structured_content,
                 )
             )
 
@@ -124,25 +127,46 @@ class ChatService:
 
     def _transition_to_file_processed(
         self, request_dto: ChatRequestDto
-    ) -> tuple[str, str]:
-        """Transition to convert files to markdown."""
+    ) -> tuple[str, str, str]:
+        """
+        Transition to convert files to markdown.
+
+        CSV/JSON files are anonymised column by column while converting when a
+        privacy service is available; their (already anonymised) markdown is
+        returned separately so it skips the free-text anonymisation pass.
+        """
         self.logger.info("State transition: VALIDATED → FILE_PROCESSED")
 
+        column_anonymiser = (
+            getattr(self.privacy_service, "column_anonymiser", None)
+            if self.privacy_service
+            else None
+        )
+
         markdown_content = ""
+        structured_content = ""
         if request_dto.files:
             for file in request_dto.files:
                 if file:
+                    if column_anonymiser and self.file_converter.is_structured(file):
+                        file_markdown = self.file_converter.convert_structured_to_anonymised_markdown(
+                            file, column_anonymiser
+                        )
+                        if file_markdown:
+                            structured_content += file_markdown + "\n\n"
+                            continue
                     file_markdown = self.file_converter.convert_to_markdown(file)
                     if file_markdown:
                         markdown_content += file_markdown + "\n\n"
 
         self.logger.info(
-            f"Files processed to markdown: {len(markdown_content)} characters"
+            f"Files processed to markdown: {len(markdown_content)} characters "
+            f"(+{len(structured_content)} characters pre-anonymised structured data)"
         )
-        return "FILE_PROCESSED", markdown_content
+        return "FILE_PROCESSED", markdown_content, structured_content
 
     def _transition_to_anonymised(
-        self, prompt: str, context: str, file_content: str
+        self, prompt: str, context: str, file_content: str, structured_content: str = ""
     ) -> tuple[str, str, str]:
         """Transition to ANONYMISED state using privacy service transition."""
         self.logger.info("State transition: FILE_PROCESSED → ANONYMISED")
@@ -155,11 +179,14 @@ class ChatService:
                     self.privacy_service.transition_anonymise(prompt, combined_content)
                 )
                 self.logger.info("Successfully anonymised content")
+                # Structured files were already anonymised column by column
+                anonymised_content = f"{anonymised_content}\n\n{structured_content}".strip()
                 return ChatStatus.ANONYMISED, anonymised_prompt, anonymised_content
             except Exception as e:
                 self.logger.warning(f"Could not anonymise content: {e}")
 
         # Fallback to original content
+        combined_content = f"{combined_content}\n\n{structured_content}".strip()
         return ChatStatus.ANONYMISED, prompt, combined_content
 
     def _transition_to_processed(
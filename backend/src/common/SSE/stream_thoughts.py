@@ -27,13 +27,13 @@ def process_chat_with_thoughts(chat_service, request_dto) -> Generator[str, None
 
         # Step 2: Convert files to markdown
         yield _create_thought_event("Converting files to markdown...")
-        current_state, markdown_content = chat_service._transition_to_file_processed(
-            request_dto
+        current_state, markdown_content, structured_content = (
+            chat_service._transition_to_file_processed(request_dto)
         )
 
-        if markdown_content:
+        if markdown_content or structured_content:
             yield _create_thought_event(
-                f"Converted {len(request_dto.files) if request_dto.files else 0} files to markdown ({len(markdown_content)} characters)"
+                f"Converted {len(request_dto.files) if request_dto.files else 0} files to markdown ({len(markdown_content) + len(structured_content)} characters)"
             )
         else:
             yield _create_thought_event("No files to process")
@@ -42,7 +42,10 @@ def process_chat_with_thoughts(chat_service, request_dto) -> Generator[str, None
         yield _create_thought_event("Anonymising content...")
         current_state, anonymised_prompt, anonymised_content = (
             chat_service._transition_to_anonymised(
-                request_dto.prompt or "", request_dto.context or "", markdown_content
+                request_dto.prompt or "",
+                request_dto.context or "",
+                markdown_content,
+                structured_content,
             )
         )
 
@@ -1,6 +1,8 @@
 """File converter utility for converting various file types to markdown."""
 
+import csv
 import io
+import json
 import logging
 from typing import Optional
 
@@ -27,6 +29,15 @@ class FileConverter:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
 
+    def is_structured(self, file: FileStorage) -> bool:
+        """Check whether a file is CSV or JSON (eligible for column-aware anonymisation)."""
+        if not file or not file.filename:
+            return False
+        return file.content_type in [
+            "text/csv",
+            "application/json",
+        ] or file.filename.lower().endswith((".csv", ".json"))
+
     def convert_to_markdown(self, file: FileStorage) -> str:
         """
         Convert uploaded file to markdown format.
@@ -205,3 +216,52 @@ class FileConverter:
                 f"Error processing structured file {file.filename}: {str(e)}"
             )
             return f"# {file.filename}\n\n*Error processing file: {str(e)}*"
+
+    def convert_structured_to_anonymised_markdown(
+        self, file: FileStorage, structured_anonymiser
+    ) -> Optional[str]:
+        """
+        Convert a CSV or JSON file to markdown, anonymising it column by column.
+
+        Args:
+            file: FileStorage object from Flask request
+            structured_anonymiser: ColumnAnonymiser used to replace PII values
+
+        Returns:
+            Anonymised markdown, or None if the file could not be parsed as
+            structured data (callers should then anonymise it as free text)
+        """
+        try:
+            content = file.read().decode("utf-8")
+            file.seek(0)  # Reset file pointer
+
+            if file.content_type == "application/json" or file.filename.lower().endswith(
+                ".json"
+            ):
+                anonymised = structured_anonymiser.anonymise_json(json.loads(content))
+                return f"# {file.filename}\n\n```json\n{json.dumps(anonymised, indent=2)}\n```"
+
+            rows = [row for row in csv.reader(io.StringIO(content)) if row]
+            if len(rows) < 2:
+                return None
+
+            header, body = rows[0], rows[1:]
+            # Only the first 10 rows are rendered, so only those are anonymised
+            header, anonymised_rows = structured_anonymiser.anonymise_table(
+                header, body, max_rows=10
+            )
+
+            markdown_content = f"# {file.filename}\n\n"
+            markdown_content += "| " + " | ".join(header) + " |\n"
+            markdown_content += "| " + " | ".join(["---"] * len(header)) + " |\n"
+            for cells in anonymised_rows:
+                markdown_content += "| " + " | ".join(cells) + " |\n"
+            if len(body) > 10:
+                markdown_content += "\n*... (showing first 10 rows)*\n"
+            return markdown_content
+
+        except Exception as e:
+            self.logger.warning(
+                f"Column-aware anonymisation failed for {file.filename}: {str(e)}"
+            )
+            return None
@@ -3,7 +3,7 @@
 import logging
 import os
 import re
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
 
 from dotenv import load_dotenv
 from langchain.chat_models import init_chat_model
@@ -11,6 +11,7 @@ from langchain.chat_models import init_chat_model
 from ..common.utils.retry_utils import RetryUtils
 from .components.embedding_model.embedding_model import EmbeddingModel
 from .components.homomorphic_encryption.encryption_engine import HEManager
+from .components.presidio.column_anonymiser import ColumnAnonymiser
 from .components.presidio.presidio_engine import PresidioEngine
 from .components.rag.rag_engine import RAGEngine
 
@@ -29,6 +30,9 @@ class PrivacyService:
         )
         self.embedding_model = EmbeddingModel(backend="mini-lm")
         self.presidio_engine = PresidioEngine(self.embedding_model)
+        # Classifies CSV/JSON columns once instead of running NER on every cell;
+        # shares presidio_engine (and its entity registry) with free text
+        self.column_anonymiser = ColumnAnonymiser(self.presidio_engine)
         self.rag_engine = RAGEngine(self.embedding_model, self.cloud_llm)
         self.encryption_engine = HEManager()
         self.logger = logging.getLogger(__name__)
@@ -51,8 +55,14 @@ class PrivacyService:
         """
         context = f"{prompt}\n\n{file_content}" if file_content else prompt
 
-        self.rag_engine.analyze_text(context)
-        anonymized_context = self.rag_engine.anonymise_text(context)
+        # Same engine as the column anonymiser, so structured files and free
+        # text map an entity to the same key
+        self.presidio_engine.analyze_text(context)
+        anonymised_prompt = self.presidio_engine.anonymise_text(prompt)
+        anonymised_file_content = (
+            self.presidio_engine.anonymise_text(file_content) if file_content else ""
+        )
+        return anonymised_prompt, anonymised_file_content
 
     def transition_process(
         self, anonymised_prompt: str, anonymised_file_content: str = ""
@@ -137,3 +147,17 @@ class PrivacyService:
             return final_ai_content
 
         return deanonymised_response
+
+    def transition_deanonymise_stream(
+        self, fragments: Iterable[str]
+    ) -> Generator[str, None, None]:
+        """
+        Streaming counterpart of transition_deanonymise.
+
+        Args:
+            fragments: Text fragments of the AI response as they are generated
+
+        Yields:
+            Deanonymised text, released as soon as no placeholder key can be cut off
+        """
+        yield from self.presidio_engine.de_anonymise_stream(fragments)
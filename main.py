@@ -1,15 +1,28 @@
+import logging
 import os
+import threading
 
 # Initialise cloud LLM Gemini
 from dotenv import load_dotenv
 from flask import Flask, jsonify, request
+from presidio_analyzer import AnalyzerEngine
 
+from app.components.common.config.config_loader import ConfigLoader
 from app.components.embedding_model.embedding_model import EmbeddingModel
 from app.components.homomorphic_encryption.encryption_engine import HEManager
 # from app.components.redis.redis_engine import RedisEngine
 from app.components.llm.llm_engine import LLMEngine
+from app.components.presidio.entity_registry import (
+    InMemoryEntityRegistry,
+    RedisEntityRegistry,
+)
+from app.components.presidio.placeholder import get_placeholder_format
 from app.components.presidio.presidio_engine import PresidioEngine
+from app.components.rag.context_packer import ContextPacker
+from app.components.rag.inverted_index import PersistentInvertedIndex
+from app.components.rag.query_cache import LRUCache
 from app.components.rag.rag_engine import RAGEngine
+from app.components.rag.vector_index import create_vector_index
 
 # Load environment variables from .env file and set api key to environment variable
 load_dotenv()
@@ -17,13 +30,91 @@ from langchain.chat_models import init_chat_model
 
 os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 
+logger = logging.getLogger(__name__)
+
 # Dependency Injection
+config = ConfigLoader.load_config()
+# Fail at startup on an unknown PLACEHOLDER_FORMAT
+placeholder_format = get_placeholder_format(config.placeholder_format)
 cloud_llm = init_chat_model("gemini-2.5-flash", model_provider="google_genai")
 embedding_model = EmbeddingModel(backend="mini-lm")
-presidio_engine = PresidioEngine(embedding_model)
-rag_engine = RAGEngine(embedding_model, cloud_llm)
+# One spaCy-backed analyzer shared by the per-session engines below
+presidio_analyzer = AnalyzerEngine()
+if config.entity_registry_backend == "redis":
+    # Share entity mappings so any worker can deanonymise any turn
+    from app.components.redis.redis_engine import RedisEngine
+
+    redis_engine = RedisEngine()
+# session id -> PresidioEngine holding that session's entity registry
+presidio_engines = LRUCache(config.session_cache_size)
+presidio_engines_lock = threading.Lock()
+
+
+def presidio_engine_for(session_id):
+    # Each session gets its own registry (one Redis hash per session) and
+    # session-scoped placeholder keys; with the memory backend an evicted
+    # session loses its mappings
+    session_id = session_id or "default"
+    with presidio_engines_lock:
+        engine = presidio_engines.get(session_id)
+        if engine is None:
+            if config.entity_registry_backend == "redis":
+                registry = RedisEntityRegistry(
+                    redis_engine, session_id=session_id, ttl=config.entity_registry_ttl
+                )
+            else:
+                registry = InMemoryEntityRegistry(session_id=session_id)
+            engine = PresidioEngine(
+                embedding_model,
+                registry=registry,
+                key_secret=(
+                    config.placeholder_secret.encode("utf-8")
+                    if config.placeholder_secret
+                    else None
+                ),
+                placeholder_format=placeholder_format,
+                analysis_mode=config.analysis_mode,
+                analyzer=presidio_analyzer,
+            )
+            presidio_engines.put(session_id, engine)
+    return engine
+
+
+rag_engine = RAGEngine(
+    embedding_model,
+    cloud_llm,
+    top_k=config.retrieval_top_k,
+    min_score=config.retrieval_min_score,
+    vector_index=create_vector_index(
+        config.vector_index_backend,
+        ef_search=config.hnsw_ef_search,
+        nlist=config.ivf_nlist,
+        nprobe=config.ivf_nprobe,
+        path=config.vector_store_path,
+        compaction_interval=config.vector_compaction_interval,
+        shards=config.vector_search_shards,
+        quantize=config.vector_quantize,
+        rescore_factor=config.vector_rescore_factor,
+    ),
+    ttl=config.vector_ttl,
+    retrieval_mode=config.retrieval_mode,
+    hybrid_alpha=config.hybrid_alpha,
+    hybrid_candidates=config.hybrid_candidates,
+    ingest_batch_size=config.ingest_batch_size,
+    ingest_queue_size=config.ingest_queue_size,
+    query_cache_size=config.query_cache_size,
+    ingest_workers=config.ingest_workers,
+    ingest_wait_timeout=config.ingest_wait_timeout,
+    # The BM25 postings are persisted next to the vector store snapshots
+    lexical_index=(
+        PersistentInvertedIndex(os.path.join(config.vector_store_path, "lexical.log"))
+        if config.vector_store_path and config.retrieval_mode == "hybrid"
+        else None
+    ),
+)
 # redis_engine = RedisEngine()
 llm_engine = LLMEngine(cloud_llm)
+context_packer = ContextPacker(token_budget=config.context_token_budget)
 encryption_engine = HEManager()
 app = Flask(__name__)
 
@@ -40,39 +131,102 @@ def query_model():
     data = request.json
     context = data.get("context", "")
     query = data.get("query", "")
-    message_chain = query_model_final(query, context)
+    session_id = data.get("session_id")
+    if session_id is not None and not isinstance(session_id, str):
+        return jsonify({"status": "error", "body": "session_id must be a string"}), 400
+    # Sequence number from /ingest when the query must see that upload; it
+    # counts per namespace, so pass the namespace the upload went to
+    namespace = data.get("namespace")
+    if namespace is not None and not isinstance(namespace, str):
+        return jsonify({"status": "error", "body": "namespace must be a string"}), 400
+    min_seq = data.get("min_seq")
+    if min_seq is not None:
+        worker = rag_engine.ingestion_worker
+        if not isinstance(min_seq, int) or isinstance(min_seq, bool) or min_seq < 0:
+            return (
+                jsonify(
+                    {"status": "error", "body": "min_seq must be a non-negative integer"}
+                ),
+                400,
+            )
+        if worker is not None and min_seq > worker.issued(namespace):
+            return (
+                jsonify({"status": "error", "body": f"Unknown min_seq {min_seq}"}),
+                400,
+            )
+    # The session's registry version is read from Redis once per request
+    with presidio_engine_for(session_id).registry.request():
+        message_chain = query_model_final(
+            query, context, min_seq, session_id, namespace
+        )
     return message_chain, 200
 
 
-def query_model_final(query, context):
+@app.route("/ingest", methods=["POST"])
+def ingest():
+    # Returns before the upload is indexed; pass seq as min_seq to /query-model
+    data = request.json
+    session_id = data.get("session_id")
+    if session_id is not None and not isinstance(session_id, str):
+        return jsonify({"status": "error", "body": "session_id must be a string"}), 400
+    namespace = data.get("namespace")
+    if namespace is not None and not isinstance(namespace, str):
+        return jsonify({"status": "error", "body": "namespace must be a string"}), 400
+    presidio_engine = presidio_engine_for(session_id)
+    with presidio_engine.registry.request():
+        presidio_engine.analyze_text(data.get("context", ""))
+        anonymized_context = presidio_engine.anonymise_text(data.get("context", ""))
+    seq = rag_engine.ingest_async(
+        rag_engine.text_to_document(anonymized_context), namespace=namespace
+    )
+    return jsonify({"seq": seq}), 202
+
+
+def query_model_final(query, context, min_seq=None, session_id=None, namespace=None):
+    presidio_engine = presidio_engine_for(session_id)
     # Preprocess context
-    rag_engine.analyze_text(context)
-    anonymized_context = rag_engine.anonymise_text(context)
+    presidio_engine.analyze_text(context)
+    anonymized_context = presidio_engine.anonymise_text(context)
+    # Tokenising the context for the overhead report is only worth it when logged
+    if logger.isEnabledFor(logging.DEBUG):
+        overhead = presidio_engine.placeholder_token_overhead(context, anonymized_context)
+        logger.debug(f"Placeholder token overhead: {overhead}")
+        logger.debug(f"PII analysis tiers: {presidio_engine.analysis_stats()}")
     encrypted_context = encryption_engine.encrypt(anonymized_context)
     # Convert anonymized context to embeddings
     documents = rag_engine.text_to_document(anonymized_context)
-    embedding_obj_list = rag_engine.generate_key_and_embeddings(documents)
-    for embedding_obj in embedding_obj_list:
-        # Store anonymized context in vector DB
-        rag_engine.store_embeddings(embedding_obj["embedding"], embedding_obj["id"])
-        # Store encrypter context in redis
-        # redis_engine.set(embedding_obj['id'], embedding_obj['context'])
+    # Store anonymized context in vector DB in the background (chunks seen before
+    # are not re-embedded) while the query is preprocessed below
+    seq = rag_engine.ingest_async(documents, namespace=namespace)
+    if seq is not None:
+        min_seq = max(seq, min_seq or 0)
+    # Store encrypter context in redis
+    # redis_engine.set(embedding_obj['id'], embedding_obj['context'])
 
     # Preprocess query
-    rag_engine.analyze_text(query)
-    anonymized_query = rag_engine.anonymise_text(query)
+    presidio_engine.analyze_text(query)
+    anonymized_query = presidio_engine.anonymise_text(query)
 
     # Retrieve encrypted context_ids
-    retrieved_context_ids = rag_engine.retrieve_context_ids(anonymized_query)
+    # Waits only until this request's context (and min_seq) is indexed
+    retrieved = rag_engine.retrieve_context_ids(
+        anonymized_query, namespace=namespace, min_seq=min_seq, with_scores=True
+    )
+    retrieved_context_ids = [doc_id for doc_id, _ in retrieved]
 
     # Retrieve encrypted context using context_ids and decrypt them
     print(f"Retrieved context ids: {retrieved_context_ids}")
-    decrypted_context_str = ""
+    context_chunks = []
     for id in retrieved_context_ids:
         # encrypted_context = redis_engine.get(id)
         decrypted_context = encryption_engine.decrypt(encrypted_context)
-        deanonymized_context = rag_engine.de_anonymise_text(decrypted_context)
-        decrypted_context_str += f"{deanonymized_context}\n"
+        deanonymized_context = presidio_engine.de_anonymise_text(decrypted_context)
+        context_chunks.append(deanonymized_context)
+    # Pack the best-scoring chunks into the token budget without repeated overlap
+    decrypted_context_str, packing_report = context_packer.pack(
+        context_chunks, scores=[score for _, score in retrieved]
+    )
+    logger.debug(f"Context packing: {packing_report}")
 
     # Query model with decrypted context (both uses anonymized data)
     message_chain = llm_engine.query_model(anonymized_query, decrypted_context_str)
@@ -0,0 +1,112 @@
+import re
+from types import SimpleNamespace
+
+from app.components.presidio.column_anonymiser import (
+    FREE_TEXT_COLUMN,
+    PII_COLUMN,
+    PLAIN_COLUMN,
+    ColumnAnonymiser,
+)
+
+EMAIL = re.compile(r"[\w.]+@[\w.]+")
+
+
+class FakeEngine:
+    """Finds email addresses; keys are EMAIL_<n> in order of first sight."""
+
+    def __init__(self):
+        self.keys = {}
+        self.analyze_calls = []
+        self.added = []
+
+    def analyze(self, text):
+        self.analyze_calls.append(text)
+        return [
+            SimpleNamespace(
+                start=m.start(), end=m.end(), score=1.0, entity_type="EMAIL"
+            )
+            for m in EMAIL.finditer(text)
+        ]
+
+    def add_entity(self, value, entity_type):
+        self.added.append(value)
+        return self.keys.setdefault(value, f"{entity_type}_{len(self.keys)}")
+
+    def analyze_text(self, text):
+        for result in self.analyze(text):
+            self.add_entity(text[result.start : result.end], result.entity_type)
+
+    def anonymise_text(self, text):
+        return EMAIL.sub(lambda m: self.keys.get(m.group(), m.group()), text)
+
+
+def test_pii_column_maps_each_distinct_value_once():
+    engine = FakeEngine()
+    anonymiser = ColumnAnonymiser(engine)
+    column = ["a@x.com", "b@x.com", "a@x.com", "", " b@x.com "]
+    assert anonymiser.classify(column) == (PII_COLUMN, "EMAIL")
+    engine.added.clear()
+    assert anonymiser.anonymise_column(column) == [
+        "EMAIL_0",
+        "EMAIL_1",
+        "EMAIL_0",
+        "",
+        "EMAIL_1",
+    ]
+    assert engine.added == ["a@x.com", "b@x.com"]
+
+
+def test_free_text_column_replaces_entities_seen_in_other_values():
+    engine = FakeEngine()
+    anonymiser = ColumnAnonymiser(engine)
+    column = ["mail a@x.com please", "ok", "no email here"]
+    assert anonymiser.classify(column)[0] == FREE_TEXT_COLUMN
+    assert anonymiser.anonymise_column(column) == [
+        "mail EMAIL_0 please",
+        "ok",
+        "no email here",
+    ]
+
+
+def test_plain_column_does_not_reanalyse_sampled_values():
+    engine = FakeEngine()
+    anonymiser = ColumnAnonymiser(engine, sample_size=2)
+    column = ["red", "green", "blue", "red"]
+    assert anonymiser.classify(column)[0] == PLAIN_COLUMN
+    engine.analyze_calls.clear()
+    assert anonymiser.anonymise_column(column) == column
+    # Two values are analysed as the sample, only the third one again as text
+    assert sorted(engine.analyze_calls) == ["blue", "green", "red"]
+
+
+def test_table_anonymises_header_and_ragged_cells():
+    anonymiser = ColumnAnonymiser(FakeEngine())
+    header = ["email", "h@x.com"]
+    rows = [["a@x.com", "1"], ["b@x.com", "2", "extra c@x.com"], ["a@x.com"]]
+    new_header, new_rows = anonymiser.anonymise_table(header, rows)
+    assert new_header == ["email", "EMAIL_3"]
+    assert new_rows == [
+        ["EMAIL_0", "1"],
+        ["EMAIL_1", "2", "extra EMAIL_2"],
+        ["EMAIL_0", ""],
+    ]
+
+
+def test_table_only_anonymises_rendered_rows():
+    engine = FakeEngine()
+    rows = [[f"user{i}@x.com"] for i in range(10)]
+    _, new_rows = ColumnAnonymiser(engine).anonymise_table(["email"], rows, max_rows=3)
+    assert new_rows == [["EMAIL_0"], ["EMAIL_1"], ["EMAIL_2"]]
+    assert "user5@x.com" not in engine.keys
+
+
+def test_json_keys_and_numeric_leaves_are_anonymised():
+    anonymiser = ColumnAnonymiser(FakeEngine())
+    data = {
+        "users": [{"email": "a@x.com", "age": 30}, {"email": "b@x.com", "age": 41}],
+        "a@x.com": True,
+    }
+    assert anonymiser.anonymise_json(data) == {
+        "users": [{"email": "EMAIL_0", "age": 30}, {"email": "EMAIL_1", "age": 41}],
+        "EMAIL_0": True,
+    }
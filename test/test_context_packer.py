@@ -0,0 +1,49 @@
+import pytest
+
+from app.components.rag import context_packer
+from app.components.rag.context_packer import ContextPacker
+
+
+@pytest.fixture(autouse=True)
+def character_estimate(monkeypatch):
+    # Four characters per token, whether or not tiktoken is installed
+    monkeypatch.setattr(context_packer, "TIKTOKEN_AVAILABLE", False)
+
+
+def test_chunks_are_packed_best_score_first():
+    packer = ContextPacker(token_budget=100)
+    context, report = packer.pack(["low", "high", "mid"], scores=[0.1, 0.9, 0.5])
+    assert context == "high\nmid\nlow"
+    assert report["packed_chunks"] == 3 and report["skipped_chunks"] == 0
+
+
+def test_text_shared_with_packed_chunks_is_trimmed():
+    first = "The quick brown fox jumps over the lazy dog by the river."
+    second = "over the lazy dog by the river. Then it ran into the woods."
+    packer = ContextPacker(token_budget=100)
+    third = "river. Or so it seemed."
+    context, report = packer.pack([first, second, "the lazy dog", third])
+    # The repeated head of the second chunk goes, as does a chunk already in
+    # the context; "river." is shorter than min_overlap and stays
+    assert context == "\n".join([first, " Then it ran into the woods.", third])
+    assert report["trimmed_chunks"] == 2
+    assert report["saved_tokens"] == report["input_tokens"] - report["packed_tokens"]
+    assert report["saved_tokens"] > 0
+
+
+def test_chunks_over_the_budget_are_skipped_for_smaller_ones():
+    packer = ContextPacker(token_budget=25)
+    chunks = ["a" * 40, "b" * 40, "c" * 40, "d" * 8]
+    context, report = packer.pack(chunks)
+    # 10 tokens per long chunk, 2 for the short one and 1 per separator
+    assert context == "\n".join([chunks[0], chunks[1], chunks[3]])
+    assert report["skipped_chunks"] == 1
+    assert report["packed_tokens"] == 24 <= packer.token_budget
+
+
+def test_the_best_chunk_is_truncated_rather_than_dropped():
+    packer = ContextPacker(token_budget=5)
+    context, report = packer.pack(["short", "x" * 40], scores=[0.1, 0.9])
+    assert context == "x" * 20
+    assert report["truncated"] and report["packed_tokens"] == 5
+    assert report["skipped_chunks"] == 1
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+pytest.importorskip("presidio_analyzer")
+pytest.importorskip("ahocorasick")
+
+from app.components.presidio.dictionary_recognizer import DictionaryRecognizer
+
+TERMS = {"DRUG": ["Aspirin", "ibuprofen"], "ORGANIZATION": ["Acme Corp"]}
+
+
+def spans(text, results):
+    return [(r.entity_type, text[r.start : r.end]) for r in results]
+
+
+def test_automaton_cache_round_trips(tmp_path):
+    cache = str(tmp_path / "terms.automaton")
+    built = DictionaryRecognizer(TERMS, cache_path=cache)
+    built.load()
+    assert (tmp_path / "terms.automaton.meta.json").exists()
+
+    loaded = DictionaryRecognizer(TERMS, cache_path=cache)
+    loaded.load()
+    text = "ACME CORP ships aspirin, not Ibuprofen-XR or aspirins."
+    assert spans(text, loaded.analyze(text, [])) == [
+        ("ORGANIZATION", "ACME CORP"),
+        ("DRUG", "aspirin"),
+        ("DRUG", "Ibuprofen"),
+    ]
+    assert spans(text, loaded.analyze(text, ["DRUG"])) == [
+        ("DRUG", "aspirin"),
+        ("DRUG", "Ibuprofen"),
+    ]
+
+
+def test_changed_terms_rebuild_the_cache(tmp_path):
+    cache = str(tmp_path / "terms.automaton")
+    DictionaryRecognizer(TERMS, cache_path=cache).load()
+    digest = json.loads((tmp_path / "terms.automaton.meta.json").read_text())["digest"]
+
+    changed = DictionaryRecognizer({**TERMS, "DRUG": ["Paracetamol"]}, cache_path=cache)
+    changed.load()
+    text = "Paracetamol or aspirin"
+    assert spans(text, changed.analyze(text, [])) == [("DRUG", "Paracetamol")]
+    meta = json.loads((tmp_path / "terms.automaton.meta.json").read_text())
+    assert meta["digest"] != digest
+
+
+def test_cache_not_matching_its_sha256_is_rebuilt(tmp_path, caplog):
+    cache = tmp_path / "terms.automaton"
+    other = tmp_path / "other.automaton"
+    DictionaryRecognizer(TERMS, cache_path=str(cache)).load()
+    DictionaryRecognizer({"DRUG": ["Warfarin"]}, cache_path=str(other)).load()
+    # Swap in another automaton: the sidecar digest still matches the terms
+    cache.write_bytes(other.read_bytes())
+
+    recognizer = DictionaryRecognizer(TERMS, cache_path=str(cache))
+    with caplog.at_level("WARNING"):
+        recognizer.load()
+    assert "does not match its content hash" in caplog.text
+    text = "Warfarin and Aspirin"
+    assert spans(text, recognizer.analyze(text, [])) == [("DRUG", "Aspirin")]
+
+
+def test_offsets_survive_case_folding_that_changes_length():
+    recognizer = DictionaryRecognizer({"LOCATION": ["İzmir", "Straße"]})
+    # "İ".lower() is two code points, so every folded offset after one shifts
+    text = "İİ İZMIR, izmir and STRAßE"
+    assert spans(text, recognizer.analyze(text, [])) == [
+        ("LOCATION", "İZMIR"),
+        ("LOCATION", "STRAßE"),
+    ]
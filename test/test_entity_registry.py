@@ -0,0 +1,55 @@
+import threading
+
+from app.components.presidio.entity_registry import InMemoryEntityRegistry
+
+
+def test_noop_merge_keeps_the_published_snapshot():
+    registry = InMemoryEntityRegistry()
+    registry.create("PERSON_1", "PERSON", "Alice")
+    registry.merge("PERSON_1", "Alice Smith")
+    snapshot = registry.entities()
+    assert registry.merge("PERSON_1", "Alice") is snapshot["PERSON_1"]
+    assert registry.merge("PERSON_1", "Alice Smith") is snapshot["PERSON_1"]
+    assert registry.entities() is snapshot
+
+
+def test_merge_publishes_a_new_snapshot_and_keeps_the_old_one():
+    registry = InMemoryEntityRegistry()
+    registry.create("PERSON_1", "PERSON", "Bob")
+    before = registry.entities()
+    registry.merge("PERSON_1", "Bob Jones")
+    assert before["PERSON_1"].canonical == "Bob"
+    assert registry.entities()["PERSON_1"].canonical == "Bob Jones"
+
+
+def test_concurrent_creates_and_merges_lose_nothing():
+    registry = InMemoryEntityRegistry(stripes=4)
+    types = [f"TYPE_{t}" for t in range(8)]
+    barrier = threading.Barrier(len(types) * 2)
+
+    def create_and_merge(entity_type):
+        barrier.wait()
+        for i in range(50):
+            key = f"{entity_type}_{i}"
+            # Callers serialise per entity type, as PresidioEngine.add_entity does
+            with registry.lock_for(entity_type):
+                registry.create(key, entity_type, f"name {i}")
+                registry.merge(key, f"name {i} long")
+
+    def read():
+        barrier.wait()
+        for _ in range(200):
+            # Every snapshot is internally consistent
+            for entity in list(registry.entities().values()):
+                assert entity.aliases[0] == entity.aliases[0].strip()
+
+    threads = [threading.Thread(target=create_and_merge, args=(t,)) for t in types]
+    threads += [threading.Thread(target=read) for _ in types]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    entities = registry.entities()
+    assert len(entities) == 400
+    assert all(len(entity.aliases) == 2 for entity in entities.values())
+    assert all(entity.canonical.endswith("long") for entity in entities.values())
@@ -0,0 +1,120 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from app.components.rag.faiss_index import FlatIndex, HNSWIndex, IVFPQIndex
+from app.components.rag.vector_index import create_vector_index
+
+
+def unit(i, dim=8):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i % dim] = 1.0
+    return vector
+
+
+@pytest.mark.parametrize(
+    "make", [FlatIndex, HNSWIndex, lambda: IVFPQIndex(nlist=2, train_size=1000)]
+)
+def test_namespaces_filters_tombstones_and_ttl(make):
+    index = make()
+    index.add_embedding(unit(0), "a", namespace="s1", metadata={"source": "pdf"})
+    index.add_embedding(unit(0) + 0.1 * unit(1), "b", namespace="s2")
+    index.add_embedding(unit(0) + 0.2 * unit(1), "c", ttl=0.05)
+    results = index.search(unit(0), 3, namespace="s2")
+    assert [doc_id for doc_id, _ in results] == ["b"]
+    assert [d for d, _ in index.search(unit(0), 3, filters={"source": "pdf"})] == ["a"]
+    assert set(index.score_ids(unit(0), ["a", "b"], namespace="s1")) == {"a"}
+    assert index.delete("a") and "a" not in index
+    time.sleep(0.1)
+    assert "c" not in index
+    assert [doc_id for doc_id, _ in index.search(unit(0), 3)] == ["b"]
+    # Re-adding b replaces its row rather than adding a second one
+    index.add_embedding(unit(2), "b", namespace="s2")
+    assert [doc_id for doc_id, _ in index.search(unit(2), 3)] == ["b"]
+    assert index.score_ids(unit(2), ["b"]) == {"b": pytest.approx(1.0, abs=1e-2)}
+
+
+def test_selective_min_score_does_not_widen_to_the_whole_corpus():
+    index = FlatIndex()
+    rows = np.random.default_rng(0).normal(size=(3000, 16)).astype(np.float32)
+    for i, row in enumerate(rows):
+        index.add_embedding(row, i, namespace="s")
+    fetched = []
+    search = index._search
+
+    def recording_search(queries, k):
+        fetched.append(k)
+        return search(queries, k)
+
+    index._search = recording_search
+    assert index.search(rows[0] + 10, 5, min_score=0.99, namespace="s") == []
+    assert max(fetched) < 3000
+
+
+def test_versions_are_per_namespace():
+    index = FlatIndex()
+    index.add_embedding(unit(0), "a", namespace="s1")
+    index.add_embedding(unit(1), "b", namespace="s2")
+    s1, s2, everything = index.version("s1"), index.version("s2"), index.version()
+    index.delete("b")
+    assert index.version("s1") == s1
+    assert index.version("s2") != s2 and index.version() != everything
+    assert index.version("never-written") == 0
+
+
+def stored_rows(index):
+    # An untrained IVF-PQ index keeps its rows in the pending exact store
+    pending = getattr(index, "_pending", None)
+    return index.index.ntotal if pending is None else len(pending)
+
+
+@pytest.mark.parametrize(
+    "make",
+    [
+        FlatIndex,
+        HNSWIndex,
+        lambda: IVFPQIndex(nlist=2, train_size=1000),
+        lambda: IVFPQIndex(nlist=2, nbits=4, train_size=200),
+    ],
+)
+def test_compaction_drops_tombstoned_rows(make, monkeypatch):
+    index = make()
+    rows = np.random.default_rng(0).normal(size=(300, 16)).astype(np.float32)
+    for i, row in enumerate(rows):
+        index.add_embedding(row, f"d{i}", namespace=f"s{i % 2}", metadata={"i": i})
+    index.delete_namespace("s1")
+    expected = index.search(rows[10], 3)
+    version = index.version()
+    rebuilt = type(index)._rebuilt
+
+    def rebuilt_while_writing(self, source):
+        # Runs without the lock: writes made meanwhile must survive the swap
+        self.delete("d2")
+        self.add_embedding(rows[3], "late", namespace="s0")
+        return rebuilt(self, source)
+
+    monkeypatch.setattr(type(index), "_rebuilt", rebuilt_while_writing)
+    assert index.compact() == 150
+    assert stored_rows(index) == 151
+    assert len(index) == 150 and "d2" not in index and "d4" in index
+    found = index.search(rows[10], 3)
+    assert [d for d, _ in found] == [d for d, _ in expected]
+    assert [s for _, s in found] == pytest.approx([s for _, s in expected], abs=1e-4)
+    assert [d for d, _ in index.search(rows[3], 1, namespace="s0")] == ["late"]
+    assert index.search(rows[4], 1, filters={"i": 4})[0][0] == "d4"
+    assert index.version() != version
+    monkeypatch.undo()
+    assert index.compact() == 1 and stored_rows(index) == 150
+
+
+def test_factory_warns_about_numpy_only_options(caplog):
+    with caplog.at_level("WARNING"):
+        index = create_vector_index("hnsw", shards=4, quantize=True)
+    assert isinstance(index, HNSWIndex)
+    assert "hnsw backend ignores them" in caplog.text
+    index = create_vector_index("flat", compaction_interval=60)
+    assert index._compactor is not None
+    index.stop_compaction()
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.components.rag.ingestion import IngestionPipeline
+
+
+class Document:
+    def __init__(self, page_content):
+        self.page_content = page_content
+
+
+class LineSplitter:
+    @staticmethod
+    def split_text(text):
+        return text.splitlines()
+
+
+class Encoder:
+    """Records the size of every encode_batch call."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def encode_batch(self, texts, batch_size):
+        if self.fail:
+            raise ValueError("encoder down")
+        self.batches.append(len(texts))
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class FakeEngine:
+    """Just enough of a RAGEngine for the pipeline: ids are the chunk text."""
+
+    def __init__(self, known=(), encoder=None):
+        self.text_splitter = LineSplitter()
+        self.vector_store = set(known)
+        self.embedding_model = encoder or Encoder()
+        self.indexed = []
+
+    @staticmethod
+    def chunk_id(content, namespace=None):
+        return content
+
+    def index_chunk(self, embedding_obj, namespace=None, ttl=None, metadata=None):
+        assert embedding_obj["known"] or embedding_obj["embedding"] is not None
+        self.indexed.append(embedding_obj["id"])
+
+
+def ingest_threads():
+    return [t for t in threading.enumerate() if t.name.startswith("ingest-")]
+
+
+def test_new_chunks_are_embedded_in_batches_and_known_ones_skipped():
+    lines = [f"chunk {i}" for i in range(10)]
+    engine = FakeEngine(known=["chunk 1", "chunk 2"])
+    pipeline = IngestionPipeline(engine, batch_size=4)
+    metrics = {}
+
+    chunks = list(
+        pipeline.run(Document("\n".join(lines + ["chunk 0"])), metrics=metrics)
+    )
+
+    # Duplicates within a run are indexed once, in document order
+    assert [c["id"] for c in chunks] == engine.indexed == lines
+    assert [c["known"] for c in chunks] == [c in ("chunk 1", "chunk 2") for c in lines]
+    assert all("embedding" not in c for c in chunks)
+    # Batches of four chunks, of which only the new ones are encoded
+    assert engine.embedding_model.batches == [2, 4, 2]
+    assert metrics["split"]["items"] == 10
+    assert metrics["embed"]["items"] == 8
+    assert metrics["index"]["items"] == 10
+
+
+def test_a_stalled_consumer_holds_back_the_producers():
+    pulled = []
+
+    def documents():
+        for i in range(1000):
+            pulled.append(i)
+            yield Document(f"chunk {i}")
+
+    pipeline = IngestionPipeline(FakeEngine(), batch_size=2, queue_size=1)
+    run = pipeline.run(documents())
+    next(run)
+    time.sleep(0.3)
+    # A batch each in the consumer, the batch queue and the embedder, a full
+    # chunk queue and the one chunk the blocked splitter holds
+    assert len(pulled) <= 4 * 2 + 1
+    run.close()
+    assert not ingest_threads()
+
+
+def test_a_stage_error_reaches_the_consumer():
+    engine = FakeEngine(encoder=Encoder(fail=True))
+    with pytest.raises(ValueError, match="encoder down"):
+        list(IngestionPipeline(engine).run([Document("a\nb")]))
+    assert engine.indexed == []
+    assert not ingest_threads()
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from app.components.rag.ingestion import IngestionWorker
+
+
+class FakeEngine:
+    """Records what was indexed; documents named in gates wait for their event."""
+
+    def __init__(self, gates=None):
+        self.gates = gates or {}
+        self.indexed = []
+        self.lock = threading.Lock()
+
+    def ingest_stream(self, documents, namespace=None, ttl=None, metadata=None):
+        gate = self.gates.get(documents)
+        if gate is not None:
+            gate.wait(5)
+        if documents == "bad":
+            raise ValueError("cannot split")
+        with self.lock:
+            self.indexed.append((namespace, documents))
+        return iter(())
+
+
+def test_wait_for_returns_once_the_submission_is_indexed():
+    engine = FakeEngine()
+    worker = IngestionWorker(engine)
+    seq = worker.submit("doc")
+    assert worker.wait_for(seq, timeout=5)
+    assert (None, "doc") in engine.indexed
+    worker.close()
+
+
+def test_watermark_waits_for_earlier_submissions():
+    gate = threading.Event()
+    engine = FakeEngine({"slow": gate})
+    worker = IngestionWorker(engine, workers=2)
+    first = worker.submit("slow")
+    second = worker.submit("fast")
+    # The second finishes first, but the watermark stops at the unfinished first
+    assert not worker.wait_for(second, timeout=0.2)
+    assert worker.watermark() == 0
+    gate.set()
+    assert worker.wait_for(second, timeout=5)
+    assert worker.watermark() == second and first < second
+    worker.close()
+
+
+def test_sequences_are_per_namespace():
+    gate = threading.Event()
+    engine = FakeEngine({"slow": gate})
+    worker = IngestionWorker(engine, workers=2)
+    slow = worker.submit("slow", namespace="a")
+    fast = worker.submit("fast", namespace="b")
+    assert slow == fast == 1
+    # An upload to b is not held up by the unfinished one in a
+    assert worker.wait_for(fast, timeout=5, namespace="b")
+    assert worker.watermark("a") == 0
+    gate.set()
+    assert worker.wait_for(slow, timeout=5, namespace="a")
+    worker.close()
+
+
+def test_failed_submission_raises_and_unknown_seq_is_rejected():
+    worker = IngestionWorker(FakeEngine())
+    seq = worker.submit("bad")
+    with pytest.raises(RuntimeError):
+        worker.wait_for(seq, timeout=5)
+    with pytest.raises(ValueError):
+        worker.wait_for(seq + 1, timeout=0)
+    worker.close()
+
+
+def test_only_the_latest_failure_causes_are_kept():
+    worker = IngestionWorker(FakeEngine(), max_failures=2)
+    seqs = [worker.submit("bad") for _ in range(4)]
+    with pytest.raises(RuntimeError):
+        worker.wait_for(seqs[-1], timeout=5)
+    causes = []
+    for seq in seqs:
+        with pytest.raises(RuntimeError) as failure:
+            worker.wait_for(seq, timeout=5)
+        causes.append(type(failure.value.__cause__))
+    # Older failures are still reported, without their exception
+    assert causes == [type(None), type(None), ValueError, ValueError]
+    worker.close()
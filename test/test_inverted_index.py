@@ -0,0 +1,42 @@
+from app.components.rag.inverted_index import InvertedIndex, PersistentInvertedIndex
+
+
+def test_bm25_ranks_rarer_terms_higher_and_respects_namespaces():
+    index = InvertedIndex()
+    index.add("a", "PERSON_3fa9 paid the invoice", namespace="s1")
+    index.add("b", "the invoice was paid", namespace="s2")
+    index.add("c", "nothing relevant", namespace="s1")
+    assert [doc_id for doc_id, _ in index.search("person_3fa9 invoice")] == ["a", "b"]
+    assert [doc_id for doc_id, _ in index.search("invoice", namespace="s2")] == ["b"]
+    assert index.remove_namespace("s1") == 2
+    assert "a" not in index and len(index) == 1
+
+
+def test_persistent_index_survives_restart_and_torn_record(tmp_path):
+    path = str(tmp_path / "lexical.log")
+    index = PersistentInvertedIndex(path)
+    index.add("a", "alpha beta", namespace="s1")
+    index.add("b", "beta gamma")
+    index.add("c", "gamma delta", namespace="s1")
+    index.remove("b")
+    index.close()
+    with open(path, "ab") as f:
+        f.write(b'{"id": "d", "namesp')
+
+    restored = PersistentInvertedIndex(path)
+    assert len(restored) == 2 and "b" not in restored
+    assert restored.search("beta") == index.search("beta")
+    restored.add("e", "epsilon")
+    restored.close()
+    assert "e" in PersistentInvertedIndex(path)
+
+
+def test_persistent_index_compacts_its_log(tmp_path):
+    path = str(tmp_path / "lexical.log")
+    index = PersistentInvertedIndex(path, compact_min=4)
+    for _ in range(10):
+        index.add("a", "the same chunk again")
+    index.close()
+    with open(path, "rb") as f:
+        assert len(f.readlines()) <= 4
+    assert len(PersistentInvertedIndex(path)) == 1
@@ -0,0 +1,166 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from app.components.rag.persistent_store import LOG_FILE, PersistentVectorStore
+
+
+def vectors(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+
+def test_restore_replays_snapshot_and_log(tmp_path):
+    rows = vectors(20)
+    store = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    for i, row in enumerate(rows[:10]):
+        store.add_embedding(row, f"d{i}", namespace="s", metadata={"even": i % 2 == 0})
+    store.snapshot()
+    for i, row in enumerate(rows[10:], start=10):
+        store.add_embedding(row, f"d{i}")
+    store.delete("d3")
+    store.refresh("d4", ttl=3600)
+    store.close()
+
+    restored = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    assert len(restored) == 19
+    assert "d3" not in restored and "d4" in restored
+    assert ids(restored.search(rows[15], 1)) == ["d15"]
+    assert set(ids(restored.search(rows[12], 20, namespace="s"))) == {
+        f"d{i}" for i in range(10) if i != 3
+    }
+    assert restored.get_metadata("d6") == {"even": True}
+    assert set(ids(restored.search(rows[0], 20, filters={"even": True}))) == {
+        "d0",
+        "d2",
+        "d4",
+        "d6",
+        "d8",
+    }
+    restored.close()
+
+
+def test_background_snapshot_folds_the_log(tmp_path):
+    rows = vectors(30)
+    store = PersistentVectorStore(str(tmp_path), snapshot_every=10)
+    for i, row in enumerate(rows):
+        store.add_embedding(row, f"d{i}")
+    store.close()
+    # close() waits for the snapshot started once the log held 10 records
+    assert (tmp_path / "CURRENT").exists()
+
+    restored = PersistentVectorStore(str(tmp_path))
+    assert len(restored) == 30
+    assert ids(restored.search(rows[29], 1)) == ["d29"]
+    restored.close()
+
+
+def test_torn_record_is_truncated_and_later_appends_survive(tmp_path):
+    rows = vectors(3)
+    store = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    store.add_embedding(rows[0], "d0")
+    store.add_embedding(rows[1], "d1")
+    store.close()
+    log_path = tmp_path / LOG_FILE.format(0)
+    intact = os.path.getsize(log_path)
+    # A crash mid-append leaves a partial record at the end of the log
+    with open(log_path, "ab") as f:
+        f.write(b"\x01\x05\x00")
+
+    store = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    assert os.path.getsize(log_path) == intact
+    assert len(store) == 2
+    store.add_embedding(rows[2], "d2")
+    store.close()
+
+    restored = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    assert len(restored) == 3
+    assert ids(restored.search(rows[2], 1)) == ["d2"]
+    restored.close()
+
+
+def test_read_only_store_sees_the_written_rows(tmp_path):
+    rows = vectors(2)
+    store = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    store.add_embedding(rows[0], "d0")
+    store.snapshot()
+    store.add_embedding(rows[1], "d1")
+    reader = PersistentVectorStore(str(tmp_path), read_only=True)
+    assert len(reader) == 2
+    store.close()
+
+
+def test_deleting_the_default_namespace_survives_restart(tmp_path):
+    rows = vectors(2)
+    store = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    store.add_embedding(rows[0], "d0")
+    store.add_embedding(rows[1], "d1", namespace="s")
+    assert store.delete_namespace(None) == 1
+    store.close()
+
+    restored = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    assert "d0" not in restored and "d1" in restored
+    restored.close()
+
+
+def test_rejected_add_does_not_reach_the_log(tmp_path):
+    store = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    store.add_embedding(vectors(1, dim=4)[0], "d0")
+    with pytest.raises(ValueError):
+        store.add_embedding(vectors(1, dim=5)[0], "d1")
+    store.close()
+
+    restored = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    assert len(restored) == 1 and "d0" in restored
+    restored.close()
+
+
+def test_compaction_never_hides_acknowledged_rows(tmp_path, monkeypatch):
+    rows = vectors(11)
+    store = PersistentVectorStore(str(tmp_path), snapshot_every=None)
+    for i, row in enumerate(rows[:10]):
+        store.add_embedding(row, f"d{i}")
+    store.delete("d0")
+    snapshot, read_log, apply = (
+        PersistentVectorStore._snapshot,
+        PersistentVectorStore._read_log,
+        PersistentVectorStore._apply,
+    )
+    searches = []
+
+    def snapshot_then_add(self):
+        version = snapshot(self)
+        # Acknowledged after the snapshot was taken: only in the new log
+        self.add_embedding(rows[10], "d10")
+        return version
+
+    def read_log_and_search(self, log_path):
+        records = read_log(self, log_path)
+        # The old rows are still installed while the new snapshot is read
+        assert ids(self.search(rows[10], 1)) == ["d10"]
+        return records
+
+    def apply_and_search(self, *record):
+        if not searches:
+            searches.append(
+                threading.Thread(
+                    target=lambda: searches.append(ids(self.search(rows[10], 1)))
+                )
+            )
+            searches[0].start()
+        apply(self, *record)
+
+    monkeypatch.setattr(PersistentVectorStore, "_snapshot", snapshot_then_add)
+    monkeypatch.setattr(PersistentVectorStore, "_read_log", read_log_and_search)
+    monkeypatch.setattr(PersistentVectorStore, "_apply", apply_and_search)
+    assert store.compact() == 1
+    searches[0].join()
+    # A search issued mid-replay waits for the swap instead of missing d10
+    assert searches[1:] == [["d10"]]
+    assert len(store) == 10 and store.stats()["tombstoned"] == 0
+    store.close()
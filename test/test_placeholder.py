@@ -0,0 +1,87 @@
+from collections import Counter
+
+import pytest
+
+from app.components.presidio.placeholder import (
+    PLACEHOLDER_FORMATS,
+    PlaceholderKeyGenerator,
+)
+
+
+def compact_generator(session_id="s"):
+    return PlaceholderKeyGenerator(
+        b"secret", session_id, placeholder_format=PLACEHOLDER_FORMATS["compact"]
+    )
+
+
+def test_decimal_keys_are_the_digest_modulo_a_power_of_ten():
+    generator = compact_generator()
+    value = int(generator.digest("Jane Doe"), 16)
+    keys = list(generator.candidates("PERSON", "Jane Doe"))
+    assert keys[:3] == [
+        f"P_{value % 1000:03d}",
+        f"P_{value % 10000:04d}",
+        f"P_{value % 100000:05d}",
+    ]
+    assert keys[-1] == f"P_{value:078d}"
+    assert len(set(keys)) == len(keys)
+
+
+def test_decimal_keys_use_every_leading_digit_evenly():
+    generator = compact_generator()
+    leading = Counter(
+        next(generator.candidates("PERSON", f"person {i}"))[2] for i in range(5000)
+    )
+    # 500 expected per digit; a prefix of the decimal value skews towards 1
+    assert set(leading) == set("0123456789")
+    assert max(leading.values()) < 600 and min(leading.values()) > 400
+
+
+def test_colliding_entities_fall_back_to_longer_candidates():
+    generator = compact_generator()
+    first = {}
+    for i in range(1000):
+        text = f"person {i}"
+        key = next(generator.candidates("PERSON", text))
+        if key in first:
+            break
+        first[key] = text
+    else:
+        pytest.fail("no collision among 1000 three-digit keys")
+    taken = list(generator.candidates("PERSON", first[key]))
+    colliding = list(generator.candidates("PERSON", text))
+    assert colliding[0] == taken[0]
+    # The next candidate is one digit longer and tells the two apart
+    assert colliding[1] != taken[1] and len(colliding[1]) == len(taken[1]) == 6
+
+
+def test_engine_creates_a_collided_entity_under_the_next_candidate():
+    pytest.importorskip("presidio_analyzer")
+    pytest.importorskip("rapidfuzz")
+    import zlib
+
+    import numpy as np
+
+    from app.components.presidio.presidio_engine import PresidioEngine
+
+    class Encoder:
+        def encode(self, text):
+            vector = np.zeros(8, dtype=np.float32)
+            # Stable across runs, unlike hash(), so the two names never collide
+            vector[zlib.crc32(" ".join(text.lower().split()).encode()) % 8] = 1.0
+            return vector
+
+    engine = PresidioEngine(
+        Encoder(),
+        key_secret=b"secret",
+        placeholder_format=PLACEHOLDER_FORMATS["compact"],
+    )
+    candidates = list(engine.key_generator.candidates("PERSON", "Jane Doe"))
+    # Another entity already holds the shortest key
+    engine.registry.create(candidates[0], "PERSON", "Zebulon Quartermaine")
+    assert engine.add_entity("Jane Doe", "PERSON") == candidates[1]
+    assert engine.add_entity("jane  doe", "PERSON") == candidates[1]
+    assert engine.registry.entities()[candidates[1]].aliases == (
+        "Jane Doe",
+        "jane  doe",
+    )
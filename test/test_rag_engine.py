@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_text_splitters")
+
+from app.components.rag import vector_store
+from app.components.rag.rag_engine import RAGEngine
+
+
+class CountingEncoder:
+    """Bag-of-words vectors; counts encode calls."""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[sum(map(ord, word)) % self.dim] += 1
+        vector[-1] += 0.01  # never all zero
+        return vector
+
+
+class Clock:
+    """Stands in for the time module of the vector store."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def engine(**kwargs):
+    kwargs.setdefault("ingest_workers", 0)
+    return RAGEngine(CountingEncoder(), None, top_k=1, **kwargs)
+
+
+def test_repeated_query_is_served_from_the_cache():
+    rag = engine()
+    rag.ingest(rag.text_to_document("alpha beta gamma"))
+    first = rag.retrieve_context_ids("alpha beta")
+    calls = rag.embedding_model.calls
+    assert rag.retrieve_context_ids("alpha beta") == first
+    assert rag.embedding_model.calls == calls
+    assert rag.cache_stats()["results"]["hits"] == 1
+
+
+def test_insert_and_delete_invalidate_cached_results():
+    rag = engine()
+    rag.ingest(rag.text_to_document("alpha beta gamma"))
+    (first,) = rag.retrieve_context_ids("delta epsilon")
+    (chunk,) = rag.ingest(rag.text_to_document("delta epsilon"))
+    assert rag.retrieve_context_ids("delta epsilon") == [chunk["id"]]
+    rag.delete_document(chunk["id"])
+    assert rag.retrieve_context_ids("delta epsilon") == [first]
+
+
+def test_ttl_refresh_of_known_chunks_keeps_the_cache():
+    rag = engine(ttl=3600)
+    document = rag.text_to_document("alpha beta gamma")
+    rag.ingest(document)
+    rag.retrieve_context_ids("alpha")
+    # Re-ingesting the same context only restarts the chunk's TTL
+    rag.ingest(document)
+    rag.retrieve_context_ids("alpha")
+    assert rag.cache_stats()["results"]["hits"] == 1
+
+
+def test_reingested_chunks_are_not_embedded_again():
+    rag = engine()
+    document = rag.text_to_document("alpha beta gamma")
+    (chunk,) = rag.ingest(document)
+    calls = rag.embedding_model.calls
+    assert not chunk["known"]
+    assert chunk["id"] == RAGEngine.chunk_id("alpha beta gamma")
+
+    assert rag.ingest(document) == [dict(chunk, known=True)]
+    assert rag.embedding_model.calls == calls
+    assert len(rag.vector_store) == 1
+
+    # The same content in another namespace is a separate chunk
+    (other,) = rag.ingest(document, namespace="session")
+    assert not other["known"] and other["id"] != chunk["id"]
+    assert rag.embedding_model.calls == calls + 1
+    assert len(rag.vector_store) == 2
+
+
+def test_reingesting_a_chunk_restarts_its_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(vector_store, "time", clock)
+    rag = engine(ttl=10)
+    document = rag.text_to_document("alpha beta gamma")
+    (chunk,) = rag.ingest(document)
+    (stale,) = rag.ingest(rag.text_to_document("delta epsilon"))
+
+    clock.now += 8
+    assert rag.ingest(document)[0]["known"]
+    clock.now += 7  # past the first TTL, within the restarted one
+    assert chunk["id"] in rag.vector_store
+    assert stale["id"] not in rag.vector_store
+    assert rag.retrieve_context_ids("alpha beta") == [chunk["id"]]
+
+    # Once expired, a chunk is embedded and stored again
+    clock.now += 10
+    calls = rag.embedding_model.calls
+    assert not rag.ingest(document)[0]["known"]
+    assert rag.embedding_model.calls == calls + 1
+    assert chunk["id"] in rag.vector_store
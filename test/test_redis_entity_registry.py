@@ -0,0 +1,141 @@
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # fakeredis runs Lua scripts through lupa
+
+from app.components.presidio.entity_registry import RedisEntityRegistry
+
+
+class FakeRedisEngine:
+    """The RedisEngine calls used by the registry, on a fakeredis server."""
+
+    def __init__(self, server):
+        self.client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        self.gets = 0
+        self._scripts = {}
+
+    def get(self, key):
+        self.gets += 1
+        return self.client.get(key)
+
+    def hgetall(self, key):
+        return self.client.hgetall(key)
+
+    def run_script(self, script, keys, args):
+        if script not in self._scripts:
+            self._scripts[script] = self.client.register_script(script)
+        return self._scripts[script](keys=keys, args=args)
+
+    def get_entity_registry_key(self, session_id):
+        return f"entity_registry:{session_id}"
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def registry(server, **kwargs):
+    return RedisEntityRegistry(FakeRedisEngine(server), session_id="s1", **kwargs)
+
+
+def test_merge_adds_aliases_and_promotes_longer_canonical(server):
+    worker = registry(server)
+    worker.create("PERSON_1", "PERSON", "Alice")
+    entity = worker.merge("PERSON_1", "Alice Smith")
+    assert entity.canonical == "Alice Smith"
+    assert entity.aliases == ("Alice", "Alice Smith")
+    assert worker.merge("PERSON_1", "Alice").canonical == "Alice Smith"
+
+
+def test_noop_merge_does_not_bump_the_version(server):
+    worker = registry(server)
+    worker.create("PERSON_1", "PERSON", "Alice")
+    worker.merge("PERSON_1", "Alice Smith")
+    version = worker.redis_engine.client.get(worker.version_key)
+    snapshot = worker.entities()
+    assert worker.merge("PERSON_1", "Alice Smith") is snapshot["PERSON_1"]
+    assert worker.merge("PERSON_1", "Alice") is snapshot["PERSON_1"]
+    assert worker.redis_engine.client.get(worker.version_key) == version
+    assert worker.entities() is snapshot
+
+
+def test_create_race_keeps_the_first_entity(server):
+    workers = [registry(server) for _ in range(8)]
+    barrier = threading.Barrier(len(workers))
+    results = []
+
+    def create(worker, i):
+        barrier.wait()
+        results.append(worker.create("PERSON_1", "PERSON", f"Name {i}"))
+
+    threads = [
+        threading.Thread(target=create, args=(worker, i))
+        for i, worker in enumerate(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Every worker sees the one entity that won, with a single alias
+    assert len({entity.canonical for entity in results}) == 1
+    assert all(len(entity.aliases) == 1 for entity in results)
+
+
+def test_concurrent_merges_from_workers_lose_no_aliases(server):
+    registry(server).create("PERSON_1", "PERSON", "A")
+    workers = [registry(server) for _ in range(4)]
+
+    def merge(worker, i):
+        for j in range(10):
+            worker.merge("PERSON_1", f"alias {i} {j}")
+
+    threads = [
+        threading.Thread(target=merge, args=(worker, i))
+        for i, worker in enumerate(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(registry(server).entities()["PERSON_1"].aliases) == 41
+
+
+def test_other_workers_see_changes_on_their_next_read(server):
+    writer, reader = registry(server), registry(server)
+    assert reader.entities() == {}
+    writer.create("PERSON_1", "PERSON", "Bob")
+    assert reader.entities()["PERSON_1"].canonical == "Bob"
+    writer.merge("PERSON_1", "Bob Jones")
+    assert reader.entities()["PERSON_1"].canonical == "Bob Jones"
+
+
+def test_request_checks_the_version_once(server):
+    writer, reader = registry(server), registry(server)
+    writer.create("PERSON_1", "PERSON", "Bob")
+    engine = reader.redis_engine
+    with reader.request():
+        for _ in range(5):
+            assert "PERSON_1" in reader.entities()
+        with reader.request():
+            reader.entities()
+        # Changes by other workers show up in the next request
+        writer.create("PERSON_2", "PERSON", "Carol")
+        assert "PERSON_2" not in reader.entities()
+    assert engine.gets == 1
+    assert "PERSON_2" in reader.entities()
+
+
+def test_session_expires_after_ttl(server):
+    worker = registry(server, ttl=1)
+    worker.create("PERSON_1", "PERSON", "Bob")
+    client = worker.redis_engine.client
+    assert 0 < client.ttl(worker.hash_key) <= 1
+    assert 0 < client.ttl(worker.version_key) <= 1
+    time.sleep(1.1)
+    assert client.exists(worker.hash_key) == 0
+    # An expired session reloads as empty instead of serving the stale cache
+    assert worker.entities() == {}
@@ -0,0 +1,62 @@
+import random
+import re
+
+import pytest
+
+from app.components.presidio.streaming_deanonymiser import StreamingDeanonymiser
+
+KEYS = {
+    "PERSON_ab12": "Alice Smith",
+    "PERSON_ab1234": "Bob",
+    "EMAIL_ADDRESS_9f": "alice@example.com",
+    "P_1": "Carol",
+}
+WORDS = list(KEYS) + [
+    "x",
+    "done",
+    "PERSON",
+    "ab12",
+    "_",
+    " ",
+    " ",
+    ".",
+    ",",
+    "\n",
+    "xPERSON_ab12",
+]
+
+
+def de_anonymise(text, key_to_canonical):
+    # Same replacement as PresidioEngine.de_anonymise_text on the whole text
+    for key, canonical in key_to_canonical.items():
+        text = re.sub(r"\b" + re.escape(key) + r"\b", canonical, text)
+    return text
+
+
+def stream(text, sizes):
+    deanonymiser = StreamingDeanonymiser(KEYS)
+    out, start = [], 0
+    for size in sizes:
+        out.append(deanonymiser.feed(text[start : start + size]))
+        start += size
+    out.append(deanonymiser.feed(text[start:]))
+    out.append(deanonymiser.flush())
+    return "".join(out)
+
+
+def test_key_after_word_character_in_previous_fragment_is_not_replaced():
+    deanonymiser = StreamingDeanonymiser({"PERSON_ab12": "Alice"})
+    out = deanonymiser.feed("x") + deanonymiser.feed("PERSON_ab12 done")
+    assert out + deanonymiser.flush() == "xPERSON_ab12 done"
+
+
+def test_longer_key_is_not_cut_at_a_shorter_one():
+    assert stream("hi PERSON_ab1234.", [3, 9, 1, 4]) == "hi Bob."
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_chunking_matches_whole_text(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice(WORDS) for _ in range(rng.randint(0, 40)))
+    sizes = [rng.randint(0, 8) for _ in range(rng.randint(0, len(text)))]
+    assert stream(text, sizes) == de_anonymise(text, KEYS)
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("presidio_analyzer")
+spacy = pytest.importorskip("spacy")
+
+from presidio_analyzer import AnalyzerEngine
+from presidio_analyzer.nlp_engine import SpacyNlpEngine
+
+from app.components.presidio.tiered_analyzer import TieredAnalyzer
+
+TEXT = (
+    "Jane Doe lives in Paris. My ssn is 536-90-4399. Order 12345678 shipped. "
+    "Email jane@example.com today."
+)
+
+
+@spacy.Language.component("test_lower_lemmas")
+def lower_lemmas(doc):
+    for token in doc:
+        token.lemma_ = token.lower_
+    return doc
+
+
+def make_analyzer(**kwargs):
+    # A blank pipeline with fixed NER, so the test needs no model download
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns(
+        [
+            {"label": "PERSON", "pattern": "Jane Doe"},
+            {"label": "GPE", "pattern": "Paris"},
+        ]
+    )
+    nlp.add_pipe("test_lower_lemmas")
+    nlp_engine = SpacyNlpEngine(models=[{"lang_code": "en", "model_name": "blank"}])
+    nlp_engine.nlp = {"en": nlp}
+    return AnalyzerEngine(nlp_engine=nlp_engine, supported_languages=["en"], **kwargs)
+
+
+def found(results):
+    return sorted(
+        (r.entity_type, TEXT[r.start : r.end], round(r.score, 6)) for r in results
+    )
+
+
+@pytest.mark.parametrize("threshold", [0, 0.3])
+def test_tiered_mode_matches_full_analysis(threshold):
+    analyzer = make_analyzer(default_score_threshold=threshold)
+
+    expected = found(analyzer.analyze(text=TEXT, language="en"))
+    results = found(TieredAnalyzer(analyzer).analyze(TEXT))
+
+    assert results == expected
+    # The SSN score is raised by its context word and PERSON comes from NER
+    assert ("US_SSN", "536-90-4399", 0.85) in results
+    assert ("PERSON", "Jane Doe", 0.85) in results
@@ -0,0 +1,209 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.components.rag import vector_store
+from app.components.rag.vector_store import VectorStore
+
+
+def unit(i, dim=8):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i % dim] = 1.0
+    return vector
+
+
+@pytest.fixture
+def store():
+    store = VectorStore(initial_capacity=2)
+    store.add_embedding(unit(0), "a", namespace="s1", metadata={"source": "pdf"})
+    store.add_embedding(unit(0) + 0.1 * unit(1), "b", namespace="s1")
+    store.add_embedding(
+        unit(0) + 0.2 * unit(1), "c", namespace="s2", metadata={"source": "csv"}
+    )
+    store.add_embedding(
+        unit(0) + 0.3 * unit(1), "d", namespace="s2", metadata={"source": "pdf"}
+    )
+    return store
+
+
+def ids(results):
+    return [doc_id for doc_id, _ in results]
+
+
+def test_search_is_ranked_by_cosine(store):
+    assert ids(store.search(unit(0), 4)) == ["a", "b", "c", "d"]
+
+
+def test_namespace_masks_rows(store):
+    assert ids(store.search(unit(0), 4, namespace="s2")) == ["c", "d"]
+    assert store.search(unit(0), 4, namespace="missing") == []
+
+
+def test_metadata_filters_mask_rows(store):
+    assert ids(store.search(unit(0), 4, filters={"source": "pdf"})) == ["a", "d"]
+    assert ids(store.search(unit(0), 4, filters={"source": ["csv", "pdf"]})) == [
+        "a",
+        "c",
+        "d",
+    ]
+    assert (
+        ids(store.search(unit(0), 4, namespace="s1", filters={"source": "csv"})) == []
+    )
+    assert store.search(unit(0), 4, filters={"missing": 1}) == []
+    assert store.score_ids(unit(0), ["a", "c", "x"], filters={"source": "csv"}) == {
+        "c": pytest.approx(1 / np.sqrt(1.04), rel=1e-5)
+    }
+
+
+def test_delete_tombstones_and_compaction_drops_rows(store):
+    version = store.version("s1")
+    assert store.delete("b")
+    assert not store.delete("b")
+    assert "b" not in store and len(store) == 3
+    assert store.version("s1") != version
+    assert ids(store.search(unit(0), 4)) == ["a", "c", "d"]
+    assert store.delete_namespace("s2") == 2
+    assert ids(store.search(unit(0), 4)) == ["a"]
+    assert store.compact() == 3
+    assert store.stats()["rows"] == 1
+    assert ids(store.search(unit(0), 4)) == ["a"]
+
+
+def test_compaction_keeps_writes_made_while_it_copies(store, monkeypatch):
+    store.delete("b")
+    copy = VectorStore._compacted
+
+    def compacted(self, blocks, keep):
+        # Runs without the lock: searches and writes go ahead meanwhile
+        assert ids(store.search(unit(0), 4)) == ["a", "c", "d"]
+        store.delete("c")
+        store.add_embedding(unit(2), "e", namespace="s3", metadata={"source": "csv"})
+        store.add_embedding(unit(4), "a", namespace="s1")
+        store.refresh("d", ttl=60)
+        return copy(self, blocks, keep)
+
+    monkeypatch.setattr(VectorStore, "_compacted", compacted)
+    assert store.compact() == 1
+    assert len(store) == 3 and store.stats()["tombstoned"] == 2
+    assert ids(store.search(unit(0), 4, min_score=0.5)) == ["d"]
+    assert ids(store.search(unit(2), 1, filters={"source": "csv"})) == ["e"]
+    assert ids(store.search(unit(4), 1, namespace="s1")) == ["a"]
+    assert "c" not in store and store.get_metadata("a") == {}
+    assert store.stats()["tombstoned"] == 2
+    monkeypatch.undo()
+    assert store.compact() == 2
+    assert store.stats()["rows"] == 3
+    assert ids(store.search(unit(2), 1, namespace="s3")) == ["e"]
+
+
+def test_readding_a_doc_id_replaces_its_row(store):
+    store.add_embedding(unit(3), "a", namespace="s1")
+    assert len(store) == 4
+    assert ids(store.search(unit(3), 1)) == ["a"]
+    assert store.get_metadata("a") == {}
+
+
+def test_ttl_expires_rows_and_refresh_extends_them():
+    store = VectorStore()
+    store.add_embedding(unit(0), "short", ttl=0.05)
+    store.add_embedding(unit(1), "kept", ttl=0.05)
+    store.add_embedding(unit(2), "forever")
+    assert store.refresh("kept", ttl=60)
+    time.sleep(0.1)
+    assert "short" not in store
+    assert "kept" in store and "forever" in store
+    assert set(ids(store.search(unit(0), 3))) == {"kept", "forever"}
+    assert store.expire() == 1
+    assert not store.refresh("short")
+    assert len(store) == 2
+
+
+def test_refresh_keeps_the_version_unless_it_revives_a_row():
+    store = VectorStore()
+    store.add_embedding(unit(0), "a", ttl=60)
+    store.add_embedding(unit(1), "b", ttl=0.05)
+    version = store.version()
+    assert store.refresh("a", ttl=120)
+    assert store.version() == version
+    time.sleep(0.1)
+    # b had dropped out of the results; bringing it back changes them
+    assert store.refresh("b", ttl=60)
+    assert store.version() != version
+
+
+def test_searches_score_without_the_lock(store, monkeypatch):
+    select = VectorStore._select
+
+    def unlocked_select(self, rows, scores, k, min_score):
+        # Writers and other searches can take the lock while this one scores
+        assert not self._lock.locked()
+        return select(self, rows, scores, k, min_score)
+
+    monkeypatch.setattr(VectorStore, "_select", unlocked_select)
+    assert ids(store.search(unit(0), 2)) == ["a", "b"]
+
+
+def test_concurrent_searches_do_not_share_a_score_buffer():
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(500, 16)).astype(np.float32)
+    store = VectorStore()
+    for i, row in enumerate(rows):
+        store.add_embedding(row, f"d{i}")
+    queries = rng.normal(size=(64, 16)).astype(np.float32)
+    expected = [store.search(query, 5) for query in queries]
+    barrier = threading.Barrier(8)
+
+    def run(offset):
+        barrier.wait()
+        return [store.search(queries[i], 5) for i in range(offset, 64, 8)]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(run, range(8)))
+    for offset, found in enumerate(results):
+        assert found == expected[offset::8]
+
+
+def random_stores(count, dim, **kwargs):
+    # Identical rows in an exact store and in one built with kwargs
+    rng = np.random.default_rng(1)
+    rows = rng.normal(size=(count, dim)).astype(np.float32)
+    stores = VectorStore(shards=1), VectorStore(**kwargs)
+    for store in stores:
+        for i, row in enumerate(rows):
+            store.add_embedding(row, f"d{i}", namespace=f"s{i % 3}")
+        for i in range(0, count, 7):
+            store.delete(f"d{i}")
+    return stores, rng.normal(size=(20, dim)).astype(np.float32)
+
+
+def test_sharded_search_matches_unsharded(monkeypatch):
+    monkeypatch.setattr(vector_store, "SHARD_MIN_ROWS", 50)
+    (exact, sharded), queries = random_stores(1000, 16, shards=4)
+    assert sharded._shard_count(1000) == 4 and exact._shard_count(1000) == 1
+
+    for namespace in (None, "s1"):
+        expected = exact.search_batch(queries, 10, namespace=namespace)
+        found = sharded.search_batch(queries, 10, namespace=namespace)
+        assert [ids(r) for r in found] == [ids(r) for r in expected]
+        for r, e in zip(found, expected):
+            assert [s for _, s in r] == pytest.approx([s for _, s in e], abs=1e-5)
+    assert ids(sharded.search(queries[0], 3)) == ids(exact.search(queries[0], 3))
+
+
+def test_quantized_search_recalls_the_exact_top_k(monkeypatch):
+    monkeypatch.setattr(vector_store, "QUANTIZE_MIN_ROWS", 100)
+    (exact, quantized), queries = random_stores(2000, 32, quantize=True, shards=1)
+
+    expected = exact.search_batch(queries, 10)
+    found = quantized.search_batch(queries, 10)
+    assert quantized.stats()["quantized"]
+    hits = sum(len(set(ids(r)) & set(ids(e))) for r, e in zip(found, expected))
+    assert hits / (10 * len(queries)) >= 0.95
+    # Candidates are rescored against the float rows: scores are exact
+    for query, results in zip(queries, found):
+        rescored = exact.score_ids(query, ids(results))
+        for doc_id, score in results:
+            assert score == pytest.approx(rescored[doc_id], abs=1e-5)